@@ -0,0 +1,217 @@
+"""
+Verification Admission Control
+Decides whether a click on the Verify button may start a session. A user holds one
+admission from the click until their session ends, so double-clicks never open a
+second session. Each guild has a cap on concurrent sessions and a token bucket on how
+fast new ones start; users over the cap join a waitlist and are invited back in order
+as slots free up. The cap can be lowered per guild, e.g. during a raid lockdown.
+Account-age rejections are cached briefly, so repeat clicks from too-new accounts cost
+a dict lookup.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from send_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ADMITTED = 'admitted'
+DEDUPLICATED = 'deduplicated'
+THROTTLED = 'throttled'
+WAITLISTED = 'waitlisted'
+
+
+class Admission:
+    """Outcome of a Verify click"""
+
+    __slots__ = ('outcome', 'retry_after', 'position', 'hold')
+
+    def __init__(self, outcome, retry_after=0.0, position=None, hold=None):
+        self.outcome = outcome
+        # Seconds until the guild's bucket has a token again (THROTTLED)
+        self.retry_after = retry_after
+        # 1-based place in the guild's waitlist (WAITLISTED, or DEDUPLICATED while waiting)
+        self.position = position
+        # The admission this click acquired (ADMITTED), for releasing only that one
+        self.hold = hold
+
+    @property
+    def admitted(self):
+        return self.outcome == ADMITTED
+
+
+class AdmissionController:
+    """Per-user and per-guild admission for verification sessions.
+
+    `on_invite(user, guild_id)` is called when a waitlisted user's turn comes; their
+    slot is held for `invite_seconds` for them to click again.
+    """
+
+    def __init__(self, on_invite, max_concurrent=50, start_burst=10, start_rate=1.0,
+                 invite_seconds=120, rejection_ttl=300, max_session_seconds=3600):
+        self.on_invite = on_invite
+        self.max_concurrent = max_concurrent
+        self.start_burst = start_burst
+        self.start_rate = start_rate
+        self.invite_seconds = invite_seconds
+        self.rejection_ttl = rejection_ttl
+        self.max_session_seconds = max_session_seconds
+        # user_id -> (guild_id, admitted_at)
+        self._active = {}
+        # guild_id -> sessions plus held invites counting against the cap
+        self._counts = {}
+        # guild_id -> cap overriding max_concurrent
+        self._limits = {}
+        self._buckets = {}
+        # guild_id -> OrderedDict(user_id -> user), oldest first
+        self._waitlists = {}
+        # user_id -> (guild_id, expires_at)
+        self._invites = {}
+        # (guild_id, user_id) -> (expires_at, message)
+        self._rejections = {}
+
+    def __contains__(self, user_id):
+        return user_id in self._active
+
+    def active_count(self, guild_id):
+        return self._counts.get(guild_id, 0)
+
+    def waitlist_length(self, guild_id):
+        return len(self._waitlists.get(guild_id, ()))
+
+    def limit(self, guild_id):
+        return self._limits.get(guild_id, self.max_concurrent)
+
+    def set_limit(self, guild_id, limit=None):
+        """Override a guild's cap on concurrent sessions; None restores max_concurrent.
+        Sessions already running are not affected."""
+        if limit is None:
+            self._limits.pop(guild_id, None)
+        else:
+            self._limits[guild_id] = limit
+        self._promote(guild_id)
+
+    def _position(self, guild_id, user_id):
+        waitlist = self._waitlists.get(guild_id)
+        if waitlist is None or user_id not in waitlist:
+            return None
+        for position, waiting_id in enumerate(waitlist, 1):
+            if waiting_id == user_id:
+                return position
+
+    def admit(self, user, guild_id):
+        """Claim a session slot for the user. Synchronous, so two clicks can't both pass."""
+        now = time.monotonic()
+        if user.id in self._active:
+            return Admission(DEDUPLICATED)
+        position = self._position(guild_id, user.id)
+        if position is not None:
+            return Admission(DEDUPLICATED, position=position)
+
+        invite = self._invites.pop(user.id, None)
+        if invite is not None and invite[0] == guild_id and invite[1] > now:
+            # The held slot is already counted
+            hold = self._active[user.id] = (guild_id, now)
+            return Admission(ADMITTED, hold=hold)
+        if invite is not None:
+            self._release_slot(invite[0])
+
+        if self._counts.get(guild_id, 0) >= self.limit(guild_id):
+            waitlist = self._waitlists.setdefault(guild_id, OrderedDict())
+            waitlist[user.id] = user
+            return Admission(WAITLISTED, position=len(waitlist))
+
+        bucket = self._buckets.get(guild_id)
+        if bucket is None:
+            bucket = self._buckets[guild_id] = TokenBucket(self.start_burst, self.start_burst / self.start_rate, now)
+        retry_after = bucket.delay(now)
+        if retry_after > 0:
+            return Admission(THROTTLED, retry_after=retry_after)
+        bucket.take(now)
+
+        hold = self._active[user.id] = (guild_id, now)
+        self._counts[guild_id] = self._counts.get(guild_id, 0) + 1
+        return Admission(ADMITTED, hold=hold)
+
+    def restore(self, user_id, guild_id):
+        """Count a session resumed after a restart; bypasses the cap and the bucket"""
+        if user_id not in self._active:
+            self._active[user_id] = (guild_id, time.monotonic())
+            self._counts[guild_id] = self._counts.get(guild_id, 0) + 1
+
+    def release(self, user_id, hold=None):
+        """End the user's admission, if any, and invite the next waitlisted user. With `hold`
+        (Admission.hold), only if the user's admission is still that one."""
+        if hold is not None and self._active.get(user_id) is not hold:
+            return
+        admission = self._active.pop(user_id, None)
+        if admission is not None:
+            self._release_slot(admission[0])
+
+    def _release_slot(self, guild_id):
+        count = self._counts.get(guild_id, 0) - 1
+        if count > 0:
+            self._counts[guild_id] = count
+        else:
+            self._counts.pop(guild_id, None)
+        self._promote(guild_id)
+
+    def _promote(self, guild_id):
+        """Hold free slots for the users at the head of the waitlist"""
+        waitlist = self._waitlists.get(guild_id)
+        while waitlist and self._counts.get(guild_id, 0) < self.limit(guild_id):
+            user_id, user = waitlist.popitem(last=False)
+            self._invites[user_id] = (guild_id, time.monotonic() + self.invite_seconds)
+            self._counts[guild_id] = self._counts.get(guild_id, 0) + 1
+            try:
+                self.on_invite(user, guild_id)
+            except Exception as e:
+                logger.warning(f"Could not invite {user} from the waitlist: {e}")
+        if not waitlist:
+            self._waitlists.pop(guild_id, None)
+
+    def cached_rejection(self, guild_id, user_id):
+        """The message a recent rejection was answered with, if it hasn't expired"""
+        rejection = self._rejections.get((guild_id, user_id))
+        if rejection is None:
+            return None
+        if rejection[0] <= time.monotonic():
+            del self._rejections[(guild_id, user_id)]
+            return None
+        return rejection[1]
+
+    def remember_rejection(self, guild_id, user_id, message):
+        if self.rejection_ttl:
+            self._rejections[(guild_id, user_id)] = (time.monotonic() + self.rejection_ttl, message)
+
+    def forget_rejections(self, guild_id):
+        """Drop a guild's cached rejections, e.g. after its minimum account age was lowered"""
+        for key in [key for key in self._rejections if key[0] == guild_id]:
+            del self._rejections[key]
+
+    def sweep(self):
+        """Drop expired invites and rejections, and admissions that outlived any session"""
+        now = time.monotonic()
+        for user_id, (guild_id, expires_at) in list(self._invites.items()):
+            if expires_at <= now:
+                del self._invites[user_id]
+                self._release_slot(guild_id)
+        stale = [user_id for user_id, (_, admitted_at) in self._active.items()
+                 if now - admitted_at > self.max_session_seconds]
+        for user_id in stale:
+            logger.warning(f"Releasing admission for {user_id} held for over {self.max_session_seconds}s")
+            self.release(user_id)
+        for key, (expires_at, _) in list(self._rejections.items()):
+            if expires_at <= now:
+                del self._rejections[key]
+
+    async def run_sweeper(self, interval=15):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Admission sweep failed: {e}")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Gateway Event Benchmark
+Measures the CPU the bot spends per 10,000 gateway events, with and without the "speed"
+runtime profile (see runtime_profile.py).
+
+Each profile runs in a fresh process, since the event loop and JSON codec are chosen at
+startup. The bot from main.py is loaded with a guild of cached members, and a stream of
+typical guild traffic (messages, edits, typing, reactions, member updates) is compressed
+the way Discord sends it and fed to discord.py's DiscordWebSocket.received_message. That
+covers decompression, JSON decoding, the state parsers and the bot's own listeners. The
+"stock" baseline uses asyncio and the standard json module, whatever is installed.
+
+Usage:
+    python bench/gateway_bench.py [--events 100000] [--rounds 3] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+# Also puts the repository on sys.path for importing main
+from load_bench import (BOT_USER_ID, GUILD_ID, REVIEW_CHANNEL_ID, VERIFIED_ROLE_ID, guild_payload, member_payload,
+                        user_payload)
+
+STOCK = 'stock'
+PROFILES = (STOCK, 'speed')
+GENERAL_CHANNEL_ID = GUILD_ID + 6
+FIRST_MEMBER_ID = GUILD_ID + 1000
+
+# (event, weight) for a busy community guild
+EVENT_MIX = (
+    ('MESSAGE_CREATE', 50),
+    ('TYPING_START', 20),
+    ('MESSAGE_REACTION_ADD', 15),
+    ('GUILD_MEMBER_UPDATE', 10),
+    ('MESSAGE_UPDATE', 5),
+)
+WORDS = ("verify", "server", "hello", "anyone", "role", "thanks", "question", "rules", "channel", "welcome")
+
+
+def timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(seconds))
+
+
+def message_data(rng, message_id, author_id, edited=False):
+    member = member_payload(author_id)
+    user = member.pop('user')
+    return {
+        'id': str(message_id),
+        'channel_id': str(GENERAL_CHANNEL_ID),
+        'guild_id': str(GUILD_ID),
+        'author': user,
+        'member': member,
+        'content': " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30))),
+        'timestamp': timestamp(1700000000),
+        'edited_timestamp': timestamp(1700000060) if edited else None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0,
+        'flags': 0,
+        'components': [],
+        'nonce': str(message_id),
+    }
+
+
+def event_data(rng, event, sequence, members):
+    user_id = FIRST_MEMBER_ID + rng.randrange(members)
+    message_id = GUILD_ID + 10 ** 6 + sequence
+    if event == 'MESSAGE_CREATE':
+        return message_data(rng, message_id, user_id)
+    if event == 'MESSAGE_UPDATE':
+        return message_data(rng, message_id - 1, user_id, edited=True)
+    if event == 'TYPING_START':
+        return {'channel_id': str(GENERAL_CHANNEL_ID), 'guild_id': str(GUILD_ID), 'user_id': str(user_id),
+                'timestamp': 1700000000, 'member': member_payload(user_id)}
+    if event == 'MESSAGE_REACTION_ADD':
+        return {'user_id': str(user_id), 'channel_id': str(GENERAL_CHANNEL_ID), 'message_id': str(message_id - 1),
+                'guild_id': str(GUILD_ID), 'emoji': {'id': None, 'name': '👍'}, 'member': member_payload(user_id),
+                'type': 0, 'burst': False}
+    member = member_payload(user_id)
+    member.pop('permissions')
+    member['nick'] = rng.choice(WORDS)
+    return {**member, 'guild_id': str(GUILD_ID)}
+
+
+def gateway_frames(count, members, seed, compression):
+    """Gateway dispatch frames, compressed as one stream like Discord's"""
+    rng = random.Random(seed)
+    events, weights = zip(*EVENT_MIX)
+    if compression == 'zlib-stream':
+        compressor = zlib.compressobj()
+        compress = lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    else:
+        try:
+            import zstandard
+            compressor = zstandard.ZstdCompressor().compressobj()
+            compress = lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        except ImportError:
+            from compression import zstd
+            compressor = zstd.ZstdCompressor()
+            compress = lambda data: compressor.compress(data, zstd.ZstdCompressor.FLUSH_BLOCK)
+
+    frames = []
+    for sequence in range(1, count + 1):
+        event = rng.choices(events, weights)[0]
+        payload = {'op': 0, 't': event, 's': sequence, 'd': event_data(rng, event, sequence, members)}
+        frames.append(compress(json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')))
+    return frames
+
+
+async def replay(main, count, members, seed):
+    import discord
+    from discord.gateway import DiscordWebSocket
+
+    bot = main.bot
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_USER_ID, bot=True))
+    guild = guild_payload()
+    guild['channels'].append({**guild['channels'][0], 'id': str(GENERAL_CHANNEL_ID), 'name': 'general', 'position': 2})
+    guild['members'] = [member_payload(FIRST_MEMBER_ID + i) for i in range(members)]
+    guild['member_count'] = members
+    state._add_guild_from_data(guild)
+
+    ws = DiscordWebSocket(None, loop=asyncio.get_running_loop())
+    ws._connection = state
+    ws._discord_parsers = state.parsers
+    ws._dispatch = bot.dispatch
+    ws.shard_id = 0
+
+    frames = gateway_frames(count, members, seed, ws._decompressor.COMPRESSION_TYPE)
+    wire_bytes = sum(len(frame) for frame in frames)
+    background = len(asyncio.all_tasks())
+
+    async def settle():
+        # Let the listener tasks each event dispatched run to completion
+        while len(asyncio.all_tasks()) > background:
+            await asyncio.sleep(0)
+
+    started_cpu = time.process_time()
+    started = time.perf_counter()
+    for index, frame in enumerate(frames):
+        await ws.received_message(frame)
+        if index % 64 == 63:
+            await settle()
+    await settle()
+    cpu = time.process_time() - started_cpu
+    wall = time.perf_counter() - started
+
+    return {
+        'runtime': main.runtime.describe(),
+        'events': count,
+        'wire_bytes_per_event': round(wire_bytes / count, 1),
+        'cpu_ms_per_10k_events': round(cpu / count * 10_000 * 1000, 1),
+        'events_per_second': round(count / wall),
+    }
+
+
+def run_worker(args):
+    if args.worker == STOCK:
+        from discord import utils
+        utils._from_json = json.loads
+        utils._to_json = lambda obj: json.dumps(obj, separators=(',', ':'), ensure_ascii=True)
+        os.environ['RUNTIME_PROFILE'] = 'default'
+    else:
+        os.environ['RUNTIME_PROFILE'] = args.worker
+    import main
+
+    result = asyncio.run(replay(main, args.events, args.members, args.seed))
+    with open(args.worker_output, 'w') as f:
+        json.dump(result, f)
+
+
+def run_profile(profile, args, workdir):
+    """Run one profile `rounds` times in fresh processes; keep the round with the least CPU"""
+    rounds = []
+    output = os.path.join(workdir, f'{profile}.json')
+    for _ in range(args.rounds):
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', profile, '--worker-output', output,
+             '--events', str(args.events), '--members', str(args.members), '--seed', str(args.seed)],
+            cwd=workdir, check=True
+        )
+        with open(output) as f:
+            rounds.append(json.load(f))
+    return min(rounds, key=lambda result: result['cpu_ms_per_10k_events'])
+
+
+def report(results):
+    stock = results[STOCK]['cpu_ms_per_10k_events']
+    print(f"{'profile':<8}{'CPU ms / 10k events':>21}{'events/s':>11}{'bytes/event':>13}  runtime")
+    for profile, result in results.items():
+        change = "" if profile == STOCK else f" ({(result['cpu_ms_per_10k_events'] / stock - 1) * 100:+.0f}%)"
+        print(f"{profile:<8}{str(result['cpu_ms_per_10k_events']) + change:>21}{result['events_per_second']:>11}"
+              f"{result['wire_bytes_per_event']:>13}  {result['runtime']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--members', type=int, default=1000, help="cached guild members the events come from")
+    parser.add_argument('--rounds', type=int, default=3, help="runs per profile; the lowest CPU is reported")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--worker', choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    # The bot reads config.json and writes its database and logs relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='gateway-bench-')
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump({
+            'min_account_age_days': 7,
+            'review_channel_id': str(REVIEW_CHANNEL_ID),
+            'verified_role_id': str(VERIFIED_ROLE_ID),
+            'config_watch_interval_seconds': 0,
+        }, f)
+    os.environ['METRICS_PORT'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    results = {profile: run_profile(profile, args, workdir) for profile in PROFILES}
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
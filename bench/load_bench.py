@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Verification Load Benchmark
+Drives the bot's verification flow with thousands of simulated users, without a Discord
+token or network access.
+
+The bot from main.py is started with a fake REST layer in place of discord.py's HTTP
+client and interaction webhook adapter, and screenshot downloads get a small generated
+image instead of going to Discord's CDN. Gateway events (button clicks, DM replies,
+moderator decisions) are injected through discord.py's own gateway parsers, so they take
+the same path through the library as live traffic. Each simulated user clicks the
+verify button, answers the DM questionnaire with a configurable think time, and waits
+for a moderator, who approves or rejects the request from the review channel.
+
+Reported: p50/p99 time from each button click to its interaction response (Discord
+fails the interaction after 3 seconds), latency of each interaction handler and of the
+whole verification,
+REST calls per verification (by route), event-loop lag and peak RSS. Results can be
+written as JSON and compared against an earlier run to catch regressions.
+
+Usage:
+    python bench/load_bench.py [--users 2000] [--json results.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+GUILD_ID = 1100000000000000000
+VERIFY_CHANNEL_ID = GUILD_ID + 1
+REVIEW_CHANNEL_ID = GUILD_ID + 2
+VERIFIED_ROLE_ID = GUILD_ID + 3
+BOT_USER_ID = GUILD_ID + 4
+MODERATOR_ID = GUILD_ID + 5
+DM_CHANNEL_OFFSET = 7
+
+QUESTION_PATTERN = re.compile(r"\*\*(\d)\.\*\*")
+UNLIMITED = 10 ** 9
+
+# Metrics compared against a baseline; all of them are "lower is better"
+TRACKED_METRICS = (
+    ('ack_latency_ms', 'verify', 'p99'),
+    ('ack_latency_ms', 'approve', 'p99'),
+    ('ack_latency_ms', 'reject', 'p99'),
+    ('handler_latency_ms', 'verify', 'p99'),
+    ('handler_latency_ms', 'approve', 'p99'),
+    ('handler_latency_ms', 'reject', 'p99'),
+    ('verification_seconds', 'p99'),
+    ('rest_calls_per_verification',),
+    ('loop_lag_ms', 'p99'),
+    ('peak_rss_mib',),
+)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(values, scale=1.0):
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 0.50) * scale, 3) if values else None,
+        'p99': round(percentile(values, 0.99) * scale, 3) if values else None,
+        'max': round(max(values) * scale, 3) if values else None,
+    }
+
+
+def user_payload(user_id, bot=False):
+    return {
+        'id': str(user_id),
+        'username': f'user{user_id}',
+        'discriminator': '0',
+        'global_name': None,
+        'avatar': None,
+        'bot': bot,
+    }
+
+
+def member_payload(user_id):
+    return {
+        'user': user_payload(user_id),
+        'nick': None,
+        'roles': [],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'premium_since': None,
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+        'permissions': str(1 << 28),  # manage_roles
+    }
+
+
+def guild_payload():
+    channel = {'type': 0, 'position': 0, 'permission_overwrites': [], 'nsfw': False, 'parent_id': None}
+    role = {'color': 0, 'hoist': False, 'position': 0, 'permissions': '0', 'managed': False, 'mentionable': False}
+    return {
+        'id': str(GUILD_ID),
+        'name': 'Benchmark Guild',
+        'owner_id': str(MODERATOR_ID),
+        'member_count': 0,
+        'roles': [
+            {**role, 'id': str(GUILD_ID), 'name': '@everyone'},
+            {**role, 'id': str(VERIFIED_ROLE_ID), 'name': 'Verified', 'position': 1},
+        ],
+        'channels': [
+            {**channel, 'id': str(VERIFY_CHANNEL_ID), 'name': 'verify'},
+            {**channel, 'id': str(REVIEW_CHANNEL_ID), 'name': 'verification-review', 'position': 1},
+        ],
+        'emojis': [],
+        'stickers': [],
+        'features': [],
+    }
+
+
+def button_kind(custom_id):
+    kind = custom_id.split('_')[0]
+    return 'verify' if kind == 'nsfw' else kind
+
+
+class FakeCdnResponse:
+    def __init__(self, body):
+        self.status = 200
+        self.content_type = 'image/png'
+        self.content_length = len(body)
+        self.content = self
+        self._body = body
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self._body), size):
+            yield self._body[start:start + size]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeCdn:
+    """Serves a small image per attachment URL in place of Discord's CDN, the same one for the same URL"""
+
+    def get(self, url):
+        seed = hashlib.sha256(url.encode()).digest()
+        try:
+            from PIL import Image
+        except ImportError:
+            return FakeCdnResponse(seed * 64)
+        image = Image.frombytes('L', (32, 32), (seed * 32)[:1024]).resize((256, 256))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return FakeCdnResponse(buffer.getvalue())
+
+    async def close(self):
+        pass
+
+
+class FakeDiscord:
+    """Stands in for Discord's REST API and generates the gateway events users would cause"""
+
+    def __init__(self, bot, rest_latency):
+        self.bot = bot
+        self.state = bot._connection
+        self.rest_latency = rest_latency
+        self.calls = Counter()
+        self.inboxes = {}
+        self.review_posts = asyncio.Queue()
+        self.messages = {}
+        self._route_patterns = {}
+        self._interaction_channels = {}
+        # interaction ID -> (button kind, click time), until the interaction is responded to
+        self._clicks = {}
+        self.ack_latency = {'verify': [], 'approve': [], 'reject': []}
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self._ids = itertools.count(int(time.time() * 1000 - 1420070400000) << 22)
+        self._timestamp = now.isoformat()
+
+    def install(self):
+        from discord.webhook.async_ import async_context
+
+        self.bot.http.request = self.http_request
+        # Interaction responses go through the webhook adapter, not the bot's HTTP client
+        async_context.get().request = self.webhook_request
+
+    def next_id(self):
+        return next(self._ids)
+
+    def _route_params(self, route):
+        pattern = self._route_patterns.get(route.path)
+        if pattern is None:
+            pattern = re.compile(re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", route.path) + "$")
+            self._route_patterns[route.path] = pattern
+        return pattern.search(route.url).groupdict()
+
+    def message_payload(self, channel_id, payload):
+        data = {
+            'id': str(self.next_id()),
+            'channel_id': str(channel_id),
+            'author': user_payload(BOT_USER_ID, bot=True),
+            'content': payload.get('content') or '',
+            'timestamp': self._timestamp,
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': payload.get('embeds') or [],
+            'pinned': False,
+            'type': 0,
+            'flags': 0,
+            'components': payload.get('components') or [],
+        }
+        if channel_id in (VERIFY_CHANNEL_ID, REVIEW_CHANNEL_ID):
+            data['guild_id'] = str(GUILD_ID)
+        return data
+
+    async def http_request(self, route, *, files=None, form=None, **kwargs):
+        self.calls[route.key] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        params = self._route_params(route)
+        payload = kwargs.get('json') or {}
+        if form:
+            payload = json.loads(next(part['value'] for part in form if part['name'] == 'payload_json'))
+
+        if route.key == 'POST /users/@me/channels':
+            user_id = int(payload['recipient_id'])
+            return {'id': str(user_id + DM_CHANNEL_OFFSET), 'type': 1, 'recipients': [user_payload(user_id)],
+                    'last_message_id': None}
+        if route.key == 'POST /channels/{channel_id}/messages':
+            channel_id = int(params['channel_id'])
+            message = self.message_payload(channel_id, payload)
+            if channel_id == REVIEW_CHANNEL_ID:
+                self.messages[message['id']] = message
+                self.review_posts.put_nowait(message)
+            elif channel_id - DM_CHANNEL_OFFSET in self.inboxes:
+                self.inboxes[channel_id - DM_CHANNEL_OFFSET].put_nowait(message['content'])
+            return message
+        if route.key == 'GET /guilds/{guild_id}/members/{member_id}':
+            return member_payload(int(params['member_id']))
+        if route.key == 'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}':
+            return None
+        if route.key == 'GET /channels/{channel_id}/messages/{message_id}':
+            return self.messages[params['message_id']]
+        if route.key == 'PATCH /channels/{channel_id}/messages/{message_id}':
+            return {**self.messages[params['message_id']], **payload}
+        raise NotImplementedError(f"Fake REST layer has no handler for {route.key}")
+
+    async def webhook_request(self, route, session, *, payload=None, multipart=None, **kwargs):
+        self.calls[f"{route.method} {route.path}"] += 1
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        if route.path.endswith('/callback'):
+            kind, clicked = self._clicks.pop(int(route.webhook_id), (None, None))
+            if kind is not None:
+                self.ack_latency[kind].append(time.perf_counter() - clicked - self.rest_latency)
+            return {'interaction': {'id': str(route.webhook_id), 'type': 3}}
+        channel_id = self._interaction_channels.get(route.webhook_token, REVIEW_CHANNEL_ID)
+        return self.message_payload(channel_id, payload or {})
+
+    def click(self, user_id, channel_id, custom_id, message=None):
+        """Inject an INTERACTION_CREATE for a button press"""
+        interaction_id = self.next_id()
+        token = f"token{interaction_id}"
+        self._interaction_channels[token] = channel_id
+        self._clicks[interaction_id] = (button_kind(custom_id), time.perf_counter())
+        data = {
+            'id': str(interaction_id),
+            'application_id': str(BOT_USER_ID),
+            'type': 3,
+            'token': token,
+            'version': 1,
+            'guild_id': str(GUILD_ID),
+            'channel': {'id': str(channel_id), 'type': 0, 'guild_id': str(GUILD_ID)},
+            'channel_id': str(channel_id),
+            'member': member_payload(user_id),
+            'data': {'custom_id': custom_id, 'component_type': 2},
+            'locale': 'en-US',
+            'attachment_size_limit': 10 * 2 ** 20,
+            'entitlements': [],
+        }
+        if message is not None:
+            data['message'] = message
+        self.state.parsers['INTERACTION_CREATE'](data)
+
+    def reply(self, user_id, content, attachment=False):
+        """Inject a MESSAGE_CREATE for a DM from the user"""
+        data = self.message_payload(user_id + DM_CHANNEL_OFFSET, {'content': content})
+        data['author'] = user_payload(user_id)
+        if attachment:
+            attachment_id = self.next_id()
+            data['attachments'] = [{
+                'id': str(attachment_id),
+                'filename': 'id.png',
+                'size': 250_000,
+                'url': f"https://cdn.discordapp.com/attachments/{user_id}/{attachment_id}/id.png",
+                'proxy_url': f"https://media.discordapp.net/attachments/{user_id}/{attachment_id}/id.png",
+            }]
+        self.state.parsers['MESSAGE_CREATE'](data)
+
+
+class LoadBench:
+    def __init__(self, args):
+        self.args = args
+        self.handler_latency = {'verify': [], 'approve': [], 'reject': []}
+        self.verification_seconds = []
+        self.loop_lag = []
+        self.completed = 0
+        self.failed = 0
+
+    def think(self, mean_ms):
+        return random.uniform(0, 2 * mean_ms) / 1000
+
+    async def sample_loop_lag(self, interval=0.01):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, loop.time() - expected))
+
+    async def user_journey(self, fake, user_id, verify_message):
+        inbox = fake.inboxes[user_id] = asyncio.Queue()
+        answers = {1: f"user{user_id}", 2: "25", 3: "yes", 4: "yes"}
+        started = time.perf_counter()
+        fake.click(user_id, VERIFY_CHANNEL_ID, 'nsfw_verify_button', verify_message)
+
+        try:
+            while True:
+                content = await asyncio.wait_for(inbox.get(), timeout=self.args.timeout)
+                if "Verification Approved" in content or "Verification Rejected" in content:
+                    break
+                match = QUESTION_PATTERN.search(content)
+                if match is None:
+                    continue
+                await asyncio.sleep(self.think(self.args.think_ms))
+                step = int(match.group(1))
+                if step in answers:
+                    fake.reply(user_id, answers[step])
+                elif random.random() < self.args.screenshot_ratio:
+                    fake.reply(user_id, "", attachment=True)
+                else:
+                    fake.reply(user_id, "skip")
+        except asyncio.TimeoutError:
+            self.failed += 1
+            return
+
+        self.completed += 1
+        self.verification_seconds.append(time.perf_counter() - started)
+
+    async def moderator(self, fake):
+        while True:
+            message = await fake.review_posts.get()
+            custom_ids = [component['custom_id'] for row in message['components'] for component in row['components']]
+            await asyncio.sleep(self.think(self.args.moderator_think_ms))
+            prefix = 'reject_' if random.random() < self.args.reject_ratio else 'approve_'
+            custom_id = next(custom_id for custom_id in custom_ids if custom_id.startswith(prefix))
+            fake.click(MODERATOR_ID, REVIEW_CHANNEL_ID, custom_id, message)
+
+    async def run(self):
+        import discord
+        import main
+        from send_scheduler import DEFAULT_ROUTE_LIMITS, SendScheduler
+
+        if not self.args.production_limits:
+            # Measure the bot's own overhead rather than the pacing of Discord's rate limits
+            main.scheduler = SendScheduler(
+                workers=main.scheduler.worker_count,
+                global_limit=(UNLIMITED, 1.0),
+                route_limits={kind: (UNLIMITED, 1.0) for kind in DEFAULT_ROUTE_LIMITS}
+            )
+            # Every simulated user is admitted straight away rather than throttled or waitlisted
+            main.admission.max_concurrent = UNLIMITED
+            main.admission.start_burst = UNLIMITED
+            main.admission.start_rate = UNLIMITED
+
+        bot = main.bot
+        await bot._async_setup_hook()
+        state = bot._connection
+        state.user = discord.ClientUser(state=state, data=user_payload(BOT_USER_ID, bot=True))
+        fake = FakeDiscord(bot, self.args.rest_latency_ms / 1000)
+        fake.install()
+        # Screenshot downloads would otherwise go out to the real CDN
+        main.screenshot_store._session = FakeCdn()
+        await bot.setup_hook()
+        state._add_guild_from_data(guild_payload())
+
+        handler = main.run_component_handler
+
+        async def timed_handler(name, interaction, callback):
+            started = time.perf_counter()
+            await handler(name, interaction, callback)
+            self.handler_latency[name].append(time.perf_counter() - started)
+
+        main.run_component_handler = timed_handler
+
+        embed, view = await main.create_verification_embed(main.guild_config.for_guild(bot.get_guild(GUILD_ID)))
+        verify_message = fake.message_payload(VERIFY_CHANNEL_ID, {'embeds': [embed.to_dict()], 'components': view.to_components()})
+
+        lag_sampler = asyncio.create_task(self.sample_loop_lag())
+        moderators = [asyncio.create_task(self.moderator(fake)) for _ in range(self.args.moderators)]
+
+        first_user_id = discord.utils.time_snowflake(datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        journeys = []
+        started = time.perf_counter()
+        for i in range(self.args.users):
+            user_id = first_user_id + i * 1000
+            journeys.append(asyncio.create_task(self.user_journey(fake, user_id, verify_message)))
+            if self.args.ramp_seconds:
+                await asyncio.sleep(self.args.ramp_seconds / self.args.users)
+        await asyncio.gather(*journeys)
+        duration = time.perf_counter() - started
+
+        for task in moderators:
+            task.cancel()
+        # A user's journey ends at the approval DM; the review post edits are still queued
+        deadline = time.perf_counter() + self.args.drain_seconds
+        while not (main.review_worker.idle and main.scheduler.idle) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        lag_sampler.cancel()
+        await main.scheduler.close()
+        await main.db.flush()
+
+        rest_calls = sum(fake.calls.values())
+        return {
+            'commit': self.commit(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'params': vars(self.args),
+            'duration_seconds': round(duration, 2),
+            'verifications_completed': self.completed,
+            'verifications_failed': self.failed,
+            'ack_latency_ms': {kind: summarize(values, 1000) for kind, values in fake.ack_latency.items()},
+            'handler_latency_ms': {kind: summarize(values, 1000) for kind, values in self.handler_latency.items()},
+            'verification_seconds': summarize(self.verification_seconds),
+            'rest_calls': rest_calls,
+            'rest_calls_per_verification': round(rest_calls / max(1, self.completed), 2),
+            'rest_calls_by_route': dict(fake.calls.most_common()),
+            'loop_lag_ms': summarize(self.loop_lag, 1000),
+            'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+def lookup(results, path):
+    for key in path:
+        results = results.get(key) if isinstance(results, dict) else None
+    return results
+
+
+def compare(results, baseline, tolerance, tracked=TRACKED_METRICS):
+    """Print tracked metrics next to the baseline. Returns the names of regressed metrics."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%}):")
+    for path in tracked:
+        name = '.'.join(path)
+        new, old = lookup(results, path), lookup(baseline, path)
+        if new is None or old is None:
+            continue
+        regressed = new > old * (1 + tolerance) and new - old > 0.001
+        change = (new - old) / old if old else 0.0
+        print(f"  {name:<36}{old:>10}{new:>10}  {change:+.1%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def report(results):
+    print(f"{results['verifications_completed']} verifications completed "
+          f"({results['verifications_failed']} failed) in {results['duration_seconds']}s")
+    print(f"{'':<18}{'count':>8}{'p50':>10}{'p99':>10}{'max':>10}")
+    for kind, stats in results['ack_latency_ms'].items():
+        print(f"{kind + ' ack ms':<18}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    for kind, stats in results['handler_latency_ms'].items():
+        print(f"{kind + ' handler ms':<18}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    stats = results['verification_seconds']
+    print(f"{'verification s':<18}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    stats = results['loop_lag_ms']
+    print(f"{'loop lag ms':<18}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    print(f"REST calls per verification: {results['rest_calls_per_verification']}")
+    for route, count in results['rest_calls_by_route'].items():
+        print(f"  {count:>8}  {route}")
+    print(f"Peak RSS: {results['peak_rss_mib']} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--moderators', type=int, default=5)
+    parser.add_argument('--think-ms', type=float, default=200, help="mean time a user takes to answer a question")
+    parser.add_argument('--moderator-think-ms', type=float, default=100, help="mean time a moderator takes per request")
+    parser.add_argument('--rest-latency-ms', type=float, default=20, help="simulated latency of each REST call")
+    parser.add_argument('--ramp-seconds', type=float, default=5, help="spread the users' first clicks over this long")
+    parser.add_argument('--screenshot-ratio', type=float, default=0.5)
+    parser.add_argument('--reject-ratio', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=120, help="give up on a user after this long without a DM")
+    parser.add_argument('--drain-seconds', type=float, default=30,
+                        help="wait this long for queued review post edits at the end")
+    parser.add_argument('--production-limits', action='store_true',
+                        help="keep the send scheduler's real rate limits (the run then takes much longer)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against results from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression against the baseline")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # The bot reads config.json and writes its database and logs relative to the working directory
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='load-bench-')
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump({
+            'min_account_age_days': 7,
+            'review_channel_id': str(REVIEW_CHANNEL_ID),
+            'verified_role_id': str(VERIFIED_ROLE_ID),
+            'config_watch_interval_seconds': 0,
+            # Thousands of simulated clicks would look like a raid and lock verification down
+            'raid_detection': False,
+        }, f)
+    os.chdir(workdir)
+    os.environ['METRICS_PORT'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    results = asyncio.run(LoadBench(args).run())
+    report(results)
+
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(os.path.join(invocation_dir, args.baseline)) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Member Cache Memory Benchmark
+Measures resident memory per 10k guild members under the "default" and "lean" cache
+profiles, without connecting to Discord.
+
+Each profile runs in a fresh subprocess. The subprocess builds a discord.py client
+configured the way main.py configures it, creates a synthetic guild, and feeds member
+payloads through the same GUILD_MEMBER_ADD parser the gateway uses. In the lean profile
+it also fills the bot's MemberCache to capacity, which is the worst case.
+
+Usage:
+    python bench/memory_bench.py [--members 100000] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("VmRSS not available; this benchmark needs Linux /proc")
+
+
+def member_payload(guild_id, user_id):
+    return {
+        'guild_id': str(guild_id),
+        'user': {
+            'id': str(user_id),
+            'username': f'user{user_id}',
+            'discriminator': '0',
+            'global_name': f'User {user_id}',
+            'avatar': 'a' * 32,
+        },
+        'nick': None,
+        'roles': [str(guild_id + 1), str(guild_id + 2)],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'premium_since': None,
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def measure(profile, member_count):
+    import discord
+    from member_cache import MemberCache
+
+    intents = discord.Intents.default()
+    intents.members = True
+    options = {}
+    if profile == 'lean':
+        intents.message_content = False
+        options = {
+            'member_cache_flags': discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+            'max_messages': None,
+        }
+    else:
+        intents.message_content = True
+
+    client = discord.Client(intents=intents, **options)
+    state = client._connection
+    guild_id = 1_000_000_000_000_000_000
+    guild = state._add_guild_from_data({
+        'id': str(guild_id),
+        'name': 'Benchmark Guild',
+        'owner_id': '1',
+        'member_count': member_count,
+        'roles': [],
+        'channels': [],
+        'emojis': [],
+        'stickers': [],
+        'features': [],
+    })
+    member_cache = MemberCache()
+
+    gc.collect()
+    before = rss_bytes()
+
+    for offset in range(member_count):
+        state.parse_guild_member_add(member_payload(guild_id, guild_id + 10 + offset))
+
+    if profile == 'lean':
+        for offset in range(member_cache.max_size):
+            member = discord.Member(data=member_payload(guild_id, guild_id + 10 + offset), guild=guild, state=state)
+            member_cache.put(member)
+
+    gc.collect()
+    after = rss_bytes()
+
+    return {
+        'profile': profile,
+        'members': member_count,
+        'cached_members': len(guild._members) + len(member_cache),
+        'rss_delta_bytes': after - before,
+        'rss_per_10k_members_bytes': (after - before) * 10_000 // member_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=100_000)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(measure(args.profile, args.members)))
+        return
+
+    results = []
+    for profile in ('default', 'lean'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--profile', profile, '--members', str(args.members)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'profile':<10}{'members':>10}{'cached':>10}{'RSS delta':>14}{'per 10k':>12}")
+    for r in results:
+        print(f"{r['profile']:<10}{r['members']:>10}{r['cached_members']:>10}"
+              f"{r['rss_delta_bytes'] / 2**20:>11.1f} MiB{r['rss_per_10k_members_bytes'] / 2**20:>8.2f} MiB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
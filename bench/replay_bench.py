@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Traffic Replay
+Replays a traffic capture recorded by the bot (`traffic_capture` in config.json) against
+the bot from main.py and the load benchmark's fake REST layer, so a production load
+pattern can be reproduced and profiled without a Discord token or network access.
+
+The capture's recorded configuration is used as config.json. READY and the guilds
+that follow it are loaded first, then every other event is fed through discord.py's
+gateway parsers at its recorded time, scaled by --speed (1 = real time, 10 = ten times
+faster, 0 = as fast as the bot keeps up). REST calls are answered by the fake; routes it
+doesn't know get an empty reply and are listed in the report. Screenshot downloads get
+a small generated image.
+
+Reported: events replayed by type, p50/p99 time from each interaction to its response,
+latency of each component handler, REST calls by route, event-loop lag and peak RSS.
+--profile writes cProfile stats of the replay and prints the functions that took the most
+time themselves; profiling slows the bot down, so compare latencies between runs without it.
+Results can be written as JSON and compared against an earlier run, as with load_bench.py.
+
+Usage:
+    python bench/replay_bench.py data/captures/capture-20260101-120000.jsonl.gz [--speed 10] [--profile replay.prof]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import datetime
+import itertools
+import json
+import os
+import pstats
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+# Also puts the repository on sys.path for importing main
+from load_bench import UNLIMITED, FakeCdn, LoadBench, button_kind, compare, summarize, user_payload
+from startup_bench import StartupFakeDiscord
+
+from traffic_capture import read_capture
+
+# Metrics compared against a baseline; all of them are "lower is better"
+TRACKED_METRICS = (
+    ('ack_latency_ms', 'verify', 'p99'),
+    ('ack_latency_ms', 'approve', 'p99'),
+    ('ack_latency_ms', 'reject', 'p99'),
+    ('handler_latency_ms', 'verify', 'p99'),
+    ('handler_latency_ms', 'approve', 'p99'),
+    ('handler_latency_ms', 'reject', 'p99'),
+    ('loop_lag_ms', 'p99'),
+    ('peak_rss_mib',),
+)
+
+# Rewritten for the replay
+REPLAY_CONFIG = {
+    'config_watch_interval_seconds': 0,
+    'traffic_capture': False,
+}
+
+
+def interaction_kind(data):
+    """Label for an interaction: the button kind, 'modal' or '/command'"""
+    if data.get('type') == 2:
+        return f"/{data['data'].get('name')}"
+    if data.get('type') == 5:
+        return 'modal'
+    return button_kind(data.get('data', {}).get('custom_id', ''))
+
+
+class ReplayFakeDiscord(StartupFakeDiscord):
+    """The benchmarks' fake REST layer, for whatever guilds and channels the capture has"""
+
+    def __init__(self, bot, rest_latency):
+        super().__init__(bot, rest_latency)
+        self.ack_latency = defaultdict(list)
+        self.unhandled = Counter()
+
+    def message_payload(self, channel_id, payload):
+        data = super().message_payload(channel_id, payload)
+        if self.state.user is not None:
+            data['author'] = user_payload(self.state.user.id, bot=True)
+        channel = self.bot.get_channel(channel_id)
+        if getattr(channel, 'guild', None) is not None:
+            data['guild_id'] = str(channel.guild.id)
+        return data
+
+    def remember(self, message):
+        """Keep a message from the capture, so the bot can fetch and edit it"""
+        if message and 'id' in message:
+            self.messages[message['id']] = message
+
+    async def http_request(self, route, **kwargs):
+        if route.key == 'POST /channels/{channel_id}/messages':
+            message = await super().http_request(route, **kwargs)
+            self.remember(message)
+            return message
+        if route.key == 'GET /channels/{channel_id}/messages/{message_id}':
+            params = self._route_params(route)
+            self.calls[route.key] += 1
+            await asyncio.sleep(self.rest_latency)
+            return self.messages.get(params['message_id']) or self.message_payload(int(params['channel_id']), {})
+        if route.key == 'PATCH /channels/{channel_id}/messages/{message_id}':
+            params = self._route_params(route)
+            self.calls[route.key] += 1
+            await asyncio.sleep(self.rest_latency)
+            message = self.messages.get(params['message_id']) or self.message_payload(int(params['channel_id']), {})
+            message = self.messages[params['message_id']] = {**message, **(kwargs.get('json') or {})}
+            return message
+        try:
+            return await super().http_request(route, **kwargs)
+        except NotImplementedError:
+            # Counted by the base class already
+            self.unhandled[route.key] += 1
+            return None
+
+    def interaction(self, data):
+        """Inject a captured INTERACTION_CREATE, timing it until the bot responds"""
+        # Tokens are redacted in captures; give each interaction its own
+        token = f"token{data['id']}"
+        data['token'] = token
+        self._interaction_channels[token] = int(data.get('channel_id') or 0)
+        self._clicks[int(data['id'])] = (interaction_kind(data), time.perf_counter())
+        self.remember(data.get('message'))
+        self.state.parsers['INTERACTION_CREATE'](data)
+
+    @property
+    def in_flight(self):
+        return len(self._clicks)
+
+
+class Replay:
+    def __init__(self, args, header, events):
+        self.args = args
+        self.header = header
+        self.events = events
+        self.replayed = Counter()
+        self.errors = Counter()
+        self.handler_latency = defaultdict(list)
+        self.loop_lag = []
+        self.behind = []
+        self.handlers_running = 0
+
+    async def sample_loop_lag(self, interval=0.01):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, loop.time() - expected))
+
+    def ready(self, fake, data):
+        """Set up the bot user and the guilds READY announced"""
+        import discord
+
+        state = fake.state
+        state.user = discord.ClientUser(state=state, data=data['user'])
+        state.application_id = int(data.get('application', {}).get('id') or data['user']['id'])
+        for guild in data.get('guilds', []):
+            state._add_guild_from_data(guild)
+
+    def feed(self, fake, event, data):
+        state = fake.state
+        self.replayed[event] += 1
+        try:
+            if event == 'INTERACTION_CREATE':
+                fake.interaction(data)
+            elif event == 'MESSAGE_CREATE':
+                state.parsers[event](data)
+                fake.remember(data)
+            else:
+                state.parsers[event](data)
+        except Exception as e:
+            self.errors[f"{event}: {type(e).__name__}"] += 1
+
+    async def play(self, fake):
+        """Feed the capture at its recorded pace. Returns the replay's duration in seconds."""
+        import main
+
+        events = iter(self.events)
+        loading = None
+        for elapsed, event, data in events:
+            if event == 'READY':
+                self.ready(fake, data)
+                loading = {guild['id'] for guild in data.get('guilds', [])}
+                self.replayed[event] += 1
+                break
+            if event != 'RESUMED':
+                raise SystemExit("The capture doesn't start with READY; record one with READY and GUILD_CREATE included")
+        if loading is None:
+            raise SystemExit("The capture has no events")
+
+        # The guilds READY announced arrive next; the bot is ready once they all have
+        pending = None
+        for elapsed, event, data in events:
+            if event == 'GUILD_CREATE' and data.get('id') in loading:
+                loading.discard(data['id'])
+                fake.state._add_guild_from_data(data)
+                self.replayed[event] += 1
+                if loading:
+                    continue
+            else:
+                pending = (elapsed, event, data)
+            break
+        fake.bot.dispatch('ready')
+        await asyncio.sleep(0)
+
+        offset = pending[0] if pending else 0.0
+        started = time.perf_counter()
+        for elapsed, event, data in itertools.chain([pending] if pending else [], events):
+            if self.args.speed:
+                delay = (elapsed - offset) / self.args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.behind.append(-delay)
+                    await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(0)
+            self.feed(fake, event, data)
+
+        # Let the interactions that are still being handled, and the sends they queued, finish
+        deadline = time.perf_counter() + self.args.drain_seconds
+        while time.perf_counter() < deadline and (
+                fake.in_flight or self.handlers_running or not (main.review_worker.idle and main.scheduler.idle)):
+            await asyncio.sleep(0.01)
+        return time.perf_counter() - started
+
+    async def run(self):
+        import main
+        from send_scheduler import DEFAULT_ROUTE_LIMITS, SendScheduler
+
+        if not self.args.production_limits:
+            # Measure the bot's own overhead rather than the pacing of Discord's rate limits
+            main.scheduler = SendScheduler(
+                workers=main.scheduler.worker_count,
+                global_limit=(UNLIMITED, 1.0),
+                route_limits={kind: (UNLIMITED, 1.0) for kind in DEFAULT_ROUTE_LIMITS}
+            )
+            main.admission.max_concurrent = UNLIMITED
+            main.admission.start_burst = UNLIMITED
+            main.admission.start_rate = UNLIMITED
+
+        bot = main.bot
+        await bot._async_setup_hook()
+        fake = ReplayFakeDiscord(bot, self.args.rest_latency_ms / 1000)
+        fake.install()
+        main.screenshot_store._session = FakeCdn()
+        await bot.setup_hook()
+
+        handler = main.run_component_handler
+
+        async def timed_handler(name, interaction, callback):
+            started = time.perf_counter()
+            self.handlers_running += 1
+            try:
+                await handler(name, interaction, callback)
+            finally:
+                self.handlers_running -= 1
+            self.handler_latency[name].append(time.perf_counter() - started)
+
+        async def warm_member_cache():
+            # No gateway to chunk over; the capture's GUILD_CREATEs hold the members it had
+            pass
+
+        main.run_component_handler = timed_handler
+        main.warm_member_cache = warm_member_cache
+
+        lag_sampler = asyncio.create_task(self.sample_loop_lag())
+        profiler = cProfile.Profile() if self.args.profile else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            duration = await self.play(fake)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        lag_sampler.cancel()
+        await main.scheduler.close()
+        await main.db.flush()
+
+        if profiler is not None:
+            profiler.dump_stats(self.args.profile)
+            pstats.Stats(profiler).sort_stats('tottime').print_stats(self.args.profile_top)
+
+        return {
+            'commit': LoadBench.commit(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'params': {key: value for key, value in vars(self.args).items() if key != 'capture'},
+            'capture': os.path.basename(self.args.capture),
+            'duration_seconds': round(duration, 2),
+            'events': dict(self.replayed.most_common()),
+            'event_errors': dict(self.errors.most_common()),
+            'unanswered_interactions': fake.in_flight,
+            'behind_schedule_ms': summarize(self.behind, 1000),
+            'ack_latency_ms': {kind: summarize(values, 1000) for kind, values in sorted(fake.ack_latency.items())},
+            'handler_latency_ms': {kind: summarize(values, 1000) for kind, values in sorted(self.handler_latency.items())},
+            'rest_calls': sum(fake.calls.values()),
+            'rest_calls_by_route': dict(fake.calls.most_common()),
+            'unhandled_routes': dict(fake.unhandled.most_common()),
+            'loop_lag_ms': summarize(self.loop_lag, 1000),
+            'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+def report(results):
+    print(f"Replayed {sum(results['events'].values())} events from {results['capture']} "
+          f"in {results['duration_seconds']}s")
+    for event, count in results['events'].items():
+        print(f"  {count:>8}  {event}")
+    for event, count in results['event_errors'].items():
+        print(f"  {count:>8}  failed: {event}")
+    behind = results['behind_schedule_ms']
+    if behind['count']:
+        print(f"{behind['count']} events fed late (p99 {behind['p99']} ms behind schedule)")
+    if results['unanswered_interactions']:
+        print(f"{results['unanswered_interactions']} interactions got no response")
+    print(f"{'':<24}{'count':>8}{'p50':>10}{'p99':>10}{'max':>10}")
+    for label, table in (('ack ms', results['ack_latency_ms']), ('handler ms', results['handler_latency_ms'])):
+        for kind, stats in table.items():
+            print(f"{kind + ' ' + label:<24}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    stats = results['loop_lag_ms']
+    print(f"{'loop lag ms':<24}{stats['count']:>8}{stats['p50'] or 0:>10}{stats['p99'] or 0:>10}{stats['max'] or 0:>10}")
+    print(f"REST calls: {results['rest_calls']}")
+    for route, count in results['rest_calls_by_route'].items():
+        print(f"  {count:>8}  {route}{'  (no fake handler)' if route in results['unhandled_routes'] else ''}")
+    print(f"Peak RSS: {results['peak_rss_mib']} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help="a capture-*.jsonl.gz file")
+    parser.add_argument('--speed', type=float, default=1, help="replay speed; 0 feeds events as fast as the bot keeps up")
+    parser.add_argument('--rest-latency-ms', type=float, default=20, help="simulated latency of each REST call")
+    parser.add_argument('--drain-seconds', type=float, default=10, help="wait this long for outstanding responses and sends at the end")
+    parser.add_argument('--production-limits', action='store_true',
+                        help="keep the send scheduler's rate limits, admission control and raid detection")
+    parser.add_argument('--profile', help="write cProfile stats of the replay to this file")
+    parser.add_argument('--profile-top', type=int, default=30, help="calls to print from the profile")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against results from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    invocation_dir = os.getcwd()
+    args.capture = os.path.abspath(args.capture)
+    if args.profile:
+        args.profile = os.path.abspath(args.profile)
+    header, events = read_capture(args.capture)
+
+    # The bot reads config.json and writes its database and logs relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='replay-bench-')
+    config = {**header.get('config', {}), **REPLAY_CONFIG}
+    if not args.production_limits:
+        # A sped-up replay squeezes joins and clicks into less time and would look like a raid
+        config['raid_detection'] = False
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    os.chdir(workdir)
+    os.environ['METRICS_PORT'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    results = asyncio.run(Replay(args, header, events).run())
+    report(results)
+
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(os.path.join(invocation_dir, args.baseline)) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, TRACKED_METRICS)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
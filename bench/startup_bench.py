@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how long a freshly started bot process takes to answer its first interaction,
+and fails if that regresses.
+
+Each round starts a new Python process, so interpreter startup and every import are
+counted. The process loads main.py, runs the bot's setup hook against the fake REST
+layer from load_bench.py, delivers the guild and READY, then clicks the Verify button
+once and waits for the interaction response. Logging in and the gateway handshake are
+not simulated; --rest-latency-ms adds a delay to each REST call instead. Reported per
+phase (imports, config, login, setup, ready, first interaction), as time since the
+process was spawned, plus how long the deferred startup work took after that.
+
+Exits with status 1 when the median time to the first interaction is over --budget-ms,
+or more than --tolerance above a --baseline from an earlier run.
+
+Usage:
+    python bench/startup_bench.py [--rounds 5] [--budget-ms 2000] [--json results.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Also puts the repository on sys.path for importing main
+from load_bench import (BOT_USER_ID, GUILD_ID, REVIEW_CHANNEL_ID, VERIFIED_ROLE_ID, VERIFY_CHANNEL_ID, FakeDiscord,
+                        LoadBench, guild_payload, user_payload)
+
+FIRST_INTERACTION = 'first_interaction'
+
+
+class StartupFakeDiscord(FakeDiscord):
+    """The load benchmark's fake REST layer, plus the command sync the bot does after startup"""
+
+    async def http_request(self, route, **kwargs):
+        if route.key in ('PUT /applications/{application_id}/commands',
+                         'PUT /applications/{application_id}/guilds/{guild_id}/commands'):
+            self.calls[route.key] += 1
+            await asyncio.sleep(self.rest_latency)
+            return []
+        return await super().http_request(route, **kwargs)
+
+
+async def cold_start(spawned, rest_latency, timeout):
+    """Bring the bot up and serve one Verify click. Returns phase -> seconds since spawn."""
+    import main
+
+    import discord
+
+    bot = main.bot
+    startup = main.startup
+    offset = time.time() - spawned - (time.monotonic() - startup.started)
+
+    async def warm_member_cache():
+        # No gateway to chunk over; stands in for one chunk request
+        await asyncio.sleep(rest_latency)
+
+    main.warm_member_cache = warm_member_cache
+
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_USER_ID, bot=True))
+    # Normally set by READY; the deferred command sync needs it
+    state.application_id = BOT_USER_ID
+    fake = StartupFakeDiscord(bot, rest_latency)
+    fake.install()
+    await bot.setup_hook()
+    state._add_guild_from_data(guild_payload())
+    bot.dispatch('ready')
+    await asyncio.sleep(0)
+
+    embed, view = await main.create_verification_embed(main.guild_config.for_guild(bot.get_guild(GUILD_ID)))
+    verify_message = fake.message_payload(VERIFY_CHANNEL_ID, {'embeds': [embed.to_dict()], 'components': view.to_components()})
+    user_id = discord.utils.time_snowflake(datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+    fake.inboxes[user_id] = asyncio.Queue()
+    fake.click(user_id, VERIFY_CHANNEL_ID, 'nsfw_verify_button', verify_message)
+
+    deadline = time.monotonic() + timeout
+    while not fake.ack_latency['verify']:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"the Verify click was not answered within {timeout}s")
+        await asyncio.sleep(0.001)
+    responded = time.monotonic()
+
+    while 'warm' not in startup.phases and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    # Phase times are relative to main.py's first line; shift them to the spawn
+    phases = {phase: round((elapsed + offset) * 1000, 1) for phase, elapsed in startup.phases.items()}
+    phases[FIRST_INTERACTION] = round((responded - startup.started + offset) * 1000, 1)
+    return {
+        'phases_ms': phases,
+        'interpreter_ms': round(offset * 1000, 1),
+        'deferred_ms': round((startup.phases['warm'] - startup.phases[FIRST_INTERACTION]) * 1000, 1)
+                       if 'warm' in startup.phases and FIRST_INTERACTION in startup.phases else None,
+    }
+
+
+def run_worker(args):
+    result = asyncio.run(cold_start(args.spawned, args.rest_latency_ms / 1000, args.timeout))
+    with open(args.worker_output, 'w') as f:
+        json.dump(result, f)
+    # Don't wait for the questionnaire the click started
+    os._exit(0)
+
+
+def run_round(args, workdir):
+    output = os.path.join(workdir, 'round.json')
+    spawned = time.time()
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--worker-output', output, '--spawned', repr(spawned),
+         '--rest-latency-ms', str(args.rest_latency_ms), '--timeout', str(args.timeout)],
+        cwd=workdir, check=True
+    )
+    with open(output) as f:
+        return json.load(f)
+
+
+def median_phases(rounds):
+    phases = {}
+    for result in rounds:
+        for phase, elapsed in result['phases_ms'].items():
+            phases.setdefault(phase, []).append(elapsed)
+    return {phase: round(statistics.median(values), 1) for phase, values in phases.items()}
+
+
+def report(results):
+    print(f"{'phase':<20}{'ms since spawn':>16}")
+    for phase, elapsed in sorted(results['phases_ms'].items(), key=lambda item: item[1]):
+        print(f"{phase:<20}{elapsed:>16}")
+    print(f"Interpreter start before main.py: {results['interpreter_ms']} ms")
+    if results['deferred_ms'] is not None:
+        print(f"Deferred startup work finished {results['deferred_ms']} ms after the first interaction")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5, help="fresh processes to start; medians are reported")
+    parser.add_argument('--rest-latency-ms', type=float, default=20, help="simulated latency of each REST call")
+    parser.add_argument('--budget-ms', type=float, default=2000, help="fail above this median time to the first interaction")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against results from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression against the baseline")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-output', help=argparse.SUPPRESS)
+    parser.add_argument('--spawned', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    # The bot reads config.json and writes its database and logs relative to the working directory
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump({
+            'min_account_age_days': 7,
+            'review_channel_id': str(REVIEW_CHANNEL_ID),
+            'verified_role_id': str(VERIFIED_ROLE_ID),
+            'config_watch_interval_seconds': 0,
+        }, f)
+    os.environ['METRICS_PORT'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    rounds = [run_round(args, workdir) for _ in range(args.rounds)]
+    deferred = [result['deferred_ms'] for result in rounds if result['deferred_ms'] is not None]
+    results = {
+        'commit': LoadBench.commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'params': {key: value for key, value in vars(args).items() if not key.startswith('worker') and key != 'spawned'},
+        'phases_ms': median_phases(rounds),
+        'interpreter_ms': round(statistics.median(result['interpreter_ms'] for result in rounds), 1),
+        'deferred_ms': round(statistics.median(deferred), 1) if deferred else None,
+    }
+    report(results)
+
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    first = results['phases_ms'][FIRST_INTERACTION]
+    failed = False
+    if first > args.budget_ms:
+        print(f"\nREGRESSION: first interaction after {first} ms, over the {args.budget_ms:g} ms budget")
+        failed = True
+    if args.baseline:
+        with open(os.path.join(invocation_dir, args.baseline)) as f:
+            baseline = json.load(f)
+        old = baseline['phases_ms'][FIRST_INTERACTION]
+        change = (first - old) / old if old else 0.0
+        regressed = first > old * (1 + args.tolerance)
+        print(f"\nFirst interaction: {old} ms in {baseline.get('commit') or 'baseline'}, {first} ms now "
+              f"({change:+.1%}){'  REGRESSION' if regressed else ''}")
+        failed = failed or regressed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
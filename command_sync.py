@@ -0,0 +1,97 @@
+"""
+Incremental Slash-Command Sync
+Hashes the command tree (names, descriptions, parameters) and only uploads it to Discord
+when the hash differs from the last successful sync. on_ready fires on every reconnect
+and the runner restarts the bot after crashes, so syncing unconditionally would keep
+re-uploading an unchanged tree and run into the application-command rate limit.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class CommandSyncer:
+    """Syncs a CommandTree per scope (global or one guild) only when it has changed"""
+
+    def __init__(self, tree, state_path):
+        self.tree = tree
+        self.state_path = state_path
+        self._state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable command sync state {self.state_path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def signatures(self, guild=None):
+        """Per-command hash of everything Discord stores for the commands in a scope"""
+        signatures = {}
+        for command in self.tree.get_commands(guild=guild):
+            payload = command.to_dict(self.tree)
+            # Slash commands and context menus can share a name, so key on the type too
+            signatures[f"{payload.get('type', 1)}:{command.name}"] = _digest(payload)
+        return signatures
+
+    def diff(self, guild=None):
+        """Commands added, changed and removed since the last sync of this scope"""
+        current = self.signatures(guild)
+        previous = self._state.get(self._scope(guild), {}).get('commands', {})
+        return {
+            'added': sorted(name for name in current if name not in previous),
+            'changed': sorted(name for name in current if name in previous and current[name] != previous[name]),
+            'removed': sorted(name for name in previous if name not in current),
+        }
+
+    async def sync(self, guild=None, force=False):
+        """Sync one scope if its hash changed (or `force`). Returns (synced, diff)."""
+        scope = self._scope(guild)
+        current = self.signatures(guild)
+        tree_hash = _digest(current)
+        changes = self.diff(guild)
+
+        if not force and self._state.get(scope, {}).get('hash') == tree_hash:
+            logger.info(f"Command tree for {scope} unchanged ({tree_hash[:12]}); skipping sync")
+            return False, changes
+
+        synced = await self.tree.sync(guild=guild)
+        self._state[scope] = {'hash': tree_hash, 'commands': current}
+        await asyncio.to_thread(self._save)
+        logger.info(f"Synced {len(synced)} commands for {scope} ({tree_hash[:12]}): {changes}")
+        return True, changes
+
+    @staticmethod
+    def _scope(guild):
+        return 'global' if guild is None else f"guild:{guild.id}"
+
+
+def describe_changes(changes):
+    """One line per kind of change, for the /sync response"""
+    lines = []
+    for key, label in (('added', "➕ Added"), ('changed', "✏️ Changed"), ('removed', "➖ Removed")):
+        if changes[key]:
+            names = ", ".join(f"`{name.split(':', 1)[1]}`" for name in changes[key])
+            lines.append(f"{label}: {names}")
+    return "\n".join(lines) or "No changes since the last sync."
@@ -0,0 +1,158 @@
+"""
+Deadline Scheduler
+One timer for everything the bot has to do at a set time: reminding a member that their
+verification is about to run out, taking the verified role away when it does, and the
+nightly role reconciliation per guild.
+
+Deadlines are keyed by (kind, guild_id, user_id); scheduling a key again moves it. They
+sit in a min-heap, so finding the next one is O(1) and adding one is O(log n), and a
+single task sleeps until the earliest is due. Moved and cancelled deadlines are left in
+the heap and skipped when they surface. Every deadline is also written to SQLite, and a
+fired one is only deleted after its handler succeeds, so none are lost to a restart.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deadlines (
+    kind TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    due_at REAL NOT NULL,
+    PRIMARY KEY (kind, guild_id, user_id)
+) WITHOUT ROWID;
+"""
+
+# Deadline kinds
+REMIND = 'remind'
+EXPIRE = 'expire'
+RECONCILE = 'reconcile'
+
+
+class DeadlineScheduler:
+    """Persistent min-heap of deadlines, fired by one background task.
+
+    `handler(kind, guild_id, user_id)` is awaited for each due deadline, at most
+    `concurrency` at a time. If it raises, the deadline is retried `retry_delay` seconds later.
+    """
+
+    def __init__(self, db, handler, concurrency=8, retry_delay=300):
+        self.db = db
+        self.handler = handler
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        # (due_at, kind, guild_id, user_id); may hold moved or cancelled entries
+        self._heap = []
+        # (kind, guild_id, user_id) -> current due_at
+        self._due = {}
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+        self._runner = None
+        db.ensure_schema(SCHEMA)
+
+    def __len__(self):
+        return len(self._due)
+
+    def load(self, owns_guild=lambda guild_id: True):
+        """Read the saved deadlines. Blocking; call during startup only."""
+        rows = self.db.fetchall_sync("SELECT kind, guild_id, user_id, due_at FROM deadlines")
+        for kind, guild_id, user_id, due_at in rows:
+            if owns_guild(guild_id):
+                self._due[(kind, guild_id, user_id)] = due_at
+        self._heap = [(due_at, *key) for key, due_at in self._due.items()]
+        heapq.heapify(self._heap)
+        logger.info(f"Loaded {len(self._due)} deadlines")
+
+    def get(self, kind, guild_id, user_id):
+        """When a deadline is due, or None"""
+        return self._due.get((kind, guild_id, user_id))
+
+    def schedule(self, kind, guild_id, user_id, due_at):
+        """Add a deadline, or move an existing one"""
+        key = (kind, guild_id, user_id)
+        if self._due.get(key) == due_at:
+            return
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, *key))
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            # Mostly superseded entries; rebuild from the live deadlines
+            self._heap = [(due, *live) for live, due in self._due.items()]
+            heapq.heapify(self._heap)
+        self.db.execute(
+            "INSERT OR REPLACE INTO deadlines (kind, guild_id, user_id, due_at) VALUES (?, ?, ?, ?)",
+            (kind, guild_id, user_id, due_at)
+        )
+        if self._heap[0][0] == due_at:
+            self._wakeup.set()
+
+    def cancel(self, kind, guild_id, user_id):
+        if self._due.pop((kind, guild_id, user_id), None) is not None:
+            self._delete((kind, guild_id, user_id))
+
+    def cancel_guild(self, guild_id):
+        """Cancel every deadline in a guild, e.g. after the bot left it"""
+        for key in [key for key in self._due if key[1] == guild_id]:
+            self.cancel(*key)
+
+    def _delete(self, key):
+        self.db.execute("DELETE FROM deadlines WHERE kind = ? AND guild_id = ? AND user_id = ?", key)
+
+    def _pop_due(self, now):
+        """Key of the earliest deadline due by `now`, or None"""
+        while self._heap and self._heap[0][0] <= now:
+            due_at, *key = heapq.heappop(self._heap)
+            key = tuple(key)
+            # Skip entries for deadlines that were moved or cancelled since
+            if self._due.get(key) == due_at:
+                del self._due[key]
+                return key
+        return None
+
+    async def _fire(self, key, slots):
+        try:
+            await self.handler(*key)
+        except Exception as e:
+            logger.warning(f"Deadline {key[0]} for user {key[2]} in guild {key[1]} failed, retrying in {self.retry_delay}s: {e}")
+            if key not in self._due:
+                self.schedule(*key, time.time() + self.retry_delay)
+        else:
+            # The handler may have scheduled the key again (the nightly reconciliation does)
+            if key not in self._due:
+                self._delete(key)
+        finally:
+            slots.release()
+
+    def start(self):
+        """Start firing deadlines; later calls do nothing"""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self.run())
+
+    async def run(self, max_sleep=3600):
+        """Fire deadlines as they come due; runs until cancelled"""
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            while True:
+                # Take a slot before popping, so a deadline moved meanwhile isn't fired
+                await slots.acquire()
+                key = self._pop_due(time.time())
+                if key is None:
+                    slots.release()
+                    break
+                task = asyncio.create_task(self._fire(key, slots))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            # Wall-clock deadlines; wake up now and then in case the clock jumped
+            timeout = max_sleep
+            if self._heap:
+                timeout = min(max_sleep, max(0.0, self._heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,187 @@
+"""
+Event-Loop Diagnostics
+Instrumentation for finding out why the bot is slow:
+
+- SlowCallbackMonitor times every callback the event loop runs (each task step is one)
+  and records the ones over a threshold, without asyncio's costly debug mode.
+- LoopLagMonitor measures how late a periodic timer fires, i.e. how long ready work
+  waits for the loop.
+- HandlerTimer times slash commands and button handlers and remembers the slowest
+  recent calls.
+- SamplingProfiler samples the event-loop thread's stack from a background thread and
+  writes the counts in the folded format read by flamegraph.pl and speedscope.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+
+class SlowCallbackMonitor:
+    """Records event-loop callbacks that run longer than `threshold` seconds"""
+
+    def __init__(self, threshold=0.1, on_slow=None, history=50):
+        self.threshold = threshold
+        self.on_slow = on_slow
+        # (seconds, description, wall time), most recent last
+        self.recent = deque(maxlen=history)
+        self.count = 0
+        self._original_run = None
+
+    def install(self):
+        """Wrap asyncio's Handle._run; covers every asyncio loop in the process.
+
+        Call from the running loop. Returns False on loops that don't run callbacks through
+        asyncio's Handle, such as uvloop.
+        """
+        if not isinstance(asyncio.get_running_loop(), asyncio.BaseEventLoop):
+            return False
+        if self._original_run is not None:
+            return True
+        original_run = self._original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def _run(handle):
+            started = time.perf_counter()
+            original_run(handle)
+            elapsed = time.perf_counter() - started
+            if elapsed >= monitor.threshold:
+                monitor._record(handle, elapsed)
+
+        asyncio.events.Handle._run = _run
+        return True
+
+    def uninstall(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def _record(self, handle, elapsed):
+        description = describe_handle(handle)
+        self.count += 1
+        self.recent.append((elapsed, description, time.time()))
+        logger.warning(f"Slow event-loop callback ({elapsed * 1000:.0f} ms): {description}")
+        if self.on_slow is not None:
+            self.on_slow(elapsed)
+
+
+def describe_handle(handle):
+    """Short description of what a loop callback was running"""
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        frame = getattr(coro, 'cr_frame', None)
+        where = f" at {os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}" if frame is not None else ""
+        return f"task {task.get_name()} ({getattr(coro, '__qualname__', coro)}){where}"
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping timer"""
+
+    def __init__(self, interval=0.5, on_sample=None, history=120):
+        self.interval = interval
+        self.on_sample = on_sample
+        self.samples = deque(maxlen=history)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            if self.on_sample is not None:
+                self.on_sample(lag)
+
+    def summary(self):
+        """(latest, max) lag in seconds over the recent samples"""
+        if not self.samples:
+            return 0.0, 0.0
+        return self.samples[-1], max(self.samples)
+
+
+class HandlerTimer:
+    """Times handlers and keeps the recent calls for finding the slowest"""
+
+    def __init__(self, observe=None, history=500):
+        self.observe = observe
+        # (seconds, handler name, wall time), most recent last
+        self.recent = deque(maxlen=history)
+
+    def record(self, name, elapsed):
+        self.recent.append((elapsed, name, time.time()))
+        if self.observe is not None:
+            self.observe(elapsed, handler=name)
+
+    def timed(self, name):
+        """Decorator for a coroutine handler; the signature is kept for discord.py's introspection"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def slowest(self, count=5):
+        return sorted(self.recent, reverse=True)[:count]
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval into folded stack counts"""
+
+    def __init__(self, directory, interval=0.005):
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def _sample(self, thread_id, duration):
+        stacks = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    def _write(self, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    async def profile(self, duration):
+        """Sample the calling event loop's thread for `duration` seconds. Returns (path, samples)."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("a profile is already running")
+        try:
+            stacks = await asyncio.to_thread(self._sample, threading.get_ident(), duration)
+            path = await asyncio.to_thread(self._write, stacks)
+        finally:
+            self._lock.release()
+        logger.info(f"Wrote {sum(stacks.values())} stack samples to {path}")
+        return path, sum(stacks.values())
@@ -0,0 +1,139 @@
+"""
+DM Session Router
+Delivers direct messages to the verification session waiting on them, keyed by user ID.
+
+Replaces one bot.wait_for('message') listener per questionnaire step: instead of every
+active session's check running on every message the bot sees, each DM costs a single
+dict lookup and guild messages are dropped before anything else runs.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TimeoutScheduler:
+    """Expires session waits in deadline order using a single loop timer"""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._handle = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, deadline, future):
+        """Fail `future` with asyncio.TimeoutError once the loop clock passes `deadline`"""
+        heapq.heappush(self._heap, (deadline, next(self._counter), future))
+        if self._handle is None or deadline < self._handle.when():
+            self._arm(deadline)
+
+    def _arm(self, when):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = asyncio.get_running_loop().call_at(when, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        now = asyncio.get_running_loop().time()
+        heap = self._heap
+
+        while heap and (heap[0][0] <= now or heap[0][2].done()):
+            _, _, future = heapq.heappop(heap)
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError())
+
+        if heap:
+            self._arm(heap[0][0])
+
+
+class DMSession:
+    """Inbox for one user's questionnaire replies"""
+
+    __slots__ = ('user_id', 'pending', 'waiter')
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.pending = deque(maxlen=max_pending)
+        self.waiter = None
+
+    def deliver(self, message):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(message)
+        else:
+            self.pending.append(message)
+
+
+class DMRouter:
+    """Routes incoming DMs to open verification sessions in O(1)"""
+
+    def __init__(self, max_pending=5):
+        self.max_pending = max_pending
+        self._sessions = {}
+        self._timeouts = TimeoutScheduler()
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def waiting(self):
+        """Sessions currently waiting on a reply"""
+        return sum(1 for session in self._sessions.values() if session.waiter is not None and not session.waiter.done())
+
+    def open(self, user_id):
+        """Open an inbox for `user_id`. Returns None if the user already has one."""
+        if user_id in self._sessions:
+            return None
+        session = DMSession(user_id, self.max_pending)
+        self._sessions[user_id] = session
+        return session
+
+    def close(self, user_id):
+        """Close the user's inbox, cancelling any pending wait"""
+        session = self._sessions.pop(user_id, None)
+        if session is not None and session.waiter is not None and not session.waiter.done():
+            session.waiter.cancel()
+
+    async def on_message(self, message):
+        """Listener for on_message; ignores anything that isn't a DM to an open session"""
+        if message.guild is not None or message.author.bot:
+            return
+
+        session = self._sessions.get(message.author.id)
+        if session is not None:
+            session.deliver(message)
+
+    async def wait_for_message(self, user_id, timeout, check=None):
+        """Wait for the next DM from `user_id` that passes `check`.
+
+        Raises asyncio.TimeoutError if none arrives within `timeout` seconds and
+        KeyError if the user has no open session.
+        """
+        session = self._sessions[user_id]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            while session.pending:
+                message = session.pending.popleft()
+                if check is None or check(message):
+                    return message
+
+            waiter = loop.create_future()
+            session.waiter = waiter
+            self._timeouts.schedule(deadline, waiter)
+            try:
+                message = await waiter
+            finally:
+                session.waiter = None
+
+            if check is None or check(message):
+                return message
@@ -0,0 +1,178 @@
+"""
+Verification Funnel
+Per-guild counters for every verification step: how many users clicked, started,
+answered the questions, submitted and were approved or rejected, where the rest dropped
+off and why, and how long each step and the moderator's decision took.
+
+Counts are added to hourly and daily rollups in memory and flushed to SQLite every few
+seconds as upserts, so a raw event is never stored. Durations are counted into fixed
+buckets, which is enough to estimate a median. A summary for any window reads at most
+one rollup row per name and bucket, however much traffic the window saw.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS funnel_rollups (
+    guild_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, resolution, bucket, name)
+) WITHOUT ROWID;
+"""
+
+HOUR = 3600
+DAY = 86400
+
+# Funnel stages, in order
+CLICKED = 'clicked'
+STARTED = 'started'
+ANSWERED = 'answered'
+SUBMITTED = 'submitted'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+
+# Timing name for submission to moderator decision
+REVIEW = 'review'
+
+# Upper bounds in seconds of the duration buckets; the last bucket is open-ended
+DURATION_BOUNDS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600, 12 * 3600, DAY, 3 * DAY)
+
+
+def duration_bucket(seconds):
+    for index, bound in enumerate(DURATION_BOUNDS):
+        if seconds <= bound:
+            return index
+    return len(DURATION_BOUNDS)
+
+
+def estimate_median(counts):
+    """Median of bucketed durations, interpolated within its bucket. None without data."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    target = total / 2
+    seen = 0
+    for index in range(len(DURATION_BOUNDS) + 1):
+        count = counts.get(index, 0)
+        if count and seen + count >= target:
+            lower = DURATION_BOUNDS[index - 1] if index else 0
+            if index == len(DURATION_BOUNDS):
+                return lower
+            return lower + (DURATION_BOUNDS[index] - lower) * (target - seen) / count
+        seen += count
+    return None
+
+
+class FunnelSummary:
+    """Funnel counts for one guild over a window"""
+
+    __slots__ = ('since', 'stages', 'dropoffs', 'medians', 'timed')
+
+    def __init__(self, since, stages, dropoffs, medians, timed):
+        self.since = since
+        # stage -> count
+        self.stages = stages
+        # (step, reason) -> count
+        self.dropoffs = dropoffs
+        # step -> median seconds, and step -> number of timings behind it
+        self.medians = medians
+        self.timed = timed
+
+    def conversion(self, stage, previous):
+        """Share of `previous` that reached `stage`, or None"""
+        before = self.stages.get(previous, 0)
+        return self.stages.get(stage, 0) / before if before else None
+
+
+class FunnelStats:
+    """Rolling per-guild funnel counters with hourly and daily rollups, backed by SQLite"""
+
+    def __init__(self, db, hourly_retention_days=7, daily_retention_days=400):
+        self.db = db
+        self.retention = {HOUR: hourly_retention_days * DAY, DAY: daily_retention_days * DAY}
+        # (guild_id, resolution, bucket, name) -> count not yet written
+        self._pending = Counter()
+        db.ensure_schema(SCHEMA)
+
+    def _add(self, guild_id, name, count=1):
+        now = time.time()
+        for resolution in (HOUR, DAY):
+            self._pending[(guild_id, resolution, int(now // resolution * resolution), name)] += count
+
+    def stage(self, guild_id, stage):
+        self._add(guild_id, f"stage:{stage}")
+
+    def drop(self, guild_id, step, reason):
+        self._add(guild_id, f"drop:{step}:{reason}")
+
+    def duration(self, guild_id, step, seconds):
+        self._add(guild_id, f"time:{step}:{duration_bucket(seconds)}")
+
+    def flush(self):
+        """Queue the pending counts as upserts. Returns immediately."""
+        pending, self._pending = self._pending, Counter()
+        for (guild_id, resolution, bucket, name), count in pending.items():
+            self.db.execute(
+                "INSERT INTO funnel_rollups (guild_id, resolution, bucket, name, value) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, resolution, bucket, name) DO UPDATE SET value = value + excluded.value",
+                (guild_id, resolution, bucket, name, count)
+            )
+
+    async def summary(self, guild_id, window):
+        """FunnelSummary for the last `window` seconds, widened to whole hours (up to two
+        days) or whole days"""
+        resolution = HOUR if window <= 2 * DAY else DAY
+        since = int((time.time() - window) // resolution * resolution)
+        self.flush()
+        await self.db.flush()
+        rows = await self.db.fetchall(
+            "SELECT name, SUM(value) FROM funnel_rollups WHERE guild_id = ? AND resolution = ? AND bucket >= ? "
+            "GROUP BY name",
+            (guild_id, resolution, since)
+        )
+
+        stages = {}
+        dropoffs = Counter()
+        durations = {}
+        for name, value in rows:
+            kind, _, rest = name.partition(':')
+            if kind == 'stage':
+                stages[rest] = value
+            elif kind == 'drop':
+                step, _, reason = rest.rpartition(':')
+                dropoffs[(step, reason)] += value
+            elif kind == 'time':
+                step, _, bucket = rest.rpartition(':')
+                durations.setdefault(step, {})[int(bucket)] = value
+        medians = {step: estimate_median(counts) for step, counts in durations.items()}
+        timed = {step: sum(counts.values()) for step, counts in durations.items()}
+        return FunnelSummary(since, stages, dropoffs, medians, timed)
+
+    def sweep(self):
+        """Drop rollups older than their resolution's retention"""
+        now = time.time()
+        for resolution, retention in self.retention.items():
+            self.db.execute(
+                "DELETE FROM funnel_rollups WHERE resolution = ? AND bucket < ?",
+                (resolution, now - retention)
+            )
+
+    async def run_flusher(self, interval=10, sweep_interval=3600):
+        last_sweep = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.flush()
+                if time.monotonic() - last_sweep >= sweep_interval:
+                    self.sweep()
+                    last_sweep = time.monotonic()
+            except Exception as e:
+                logger.error(f"Funnel flush failed: {e}")
@@ -0,0 +1,178 @@
+"""
+Gateway Session Resume
+Keeps each shard's gateway session (session ID, resume URL, last sequence number) in a
+small JSON file, written periodically and on shutdown. After a quick restart the shards
+RESUME those sessions instead of making a fresh IDENTIFY. A RESUME doesn't count
+against the daily identify limit, skips guild chunking and doesn't re-fire on_ready.
+If Discord refuses the RESUME, discord.py falls back to IDENTIFY on its own.
+
+A RESUME only replays the events missed while the bot was down, so guilds aren't sent
+again. Before resuming, the guilds the shard served are loaded over REST instead.
+That costs two requests per guild, so deployments with more guilds than
+`max_guilds` always IDENTIFY.
+
+This hooks into discord.py's sharding internals (AutoShardedClient.launch_shard and
+its private shard table), which are stable across 2.x but not public API.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+import yarl
+from discord.ext import commands
+from discord.gateway import DiscordWebSocket
+from discord.shard import Shard
+
+logger = logging.getLogger(__name__)
+
+# Closing with 1000 or 1001 ends the session; any other code leaves it resumable
+RESUMABLE_CLOSE_CODE = 4000
+
+
+class GatewaySessionStore:
+    """Saves shard sessions to disk and hands them back once after a restart"""
+
+    def __init__(self, path, max_age=120, max_guilds=100):
+        self.path = path
+        self.max_age = max_age
+        self.max_guilds = max_guilds
+        self._saved = None
+
+    def load(self):
+        """Read sessions saved by the previous run. Blocking; call during startup only."""
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable gateway session file {self.path}: {e}")
+            return
+
+        age = time.time() - saved.get('saved_at', 0)
+        if age > self.max_age:
+            logger.info(f"Saved gateway sessions are {age:.0f}s old; identifying instead of resuming")
+            return
+        guild_count = sum(len(shard['guild_ids']) for shard in saved['shards'].values())
+        if guild_count > self.max_guilds:
+            logger.info(f"Saved gateway sessions cover {guild_count} guilds; identifying instead of resuming")
+            return
+        self._saved = saved
+
+    def take(self, shard_id, shard_count):
+        """A shard's saved session, if it can be resumed. Each session is only handed out once."""
+        if self._saved is None or self._saved.get('shard_count') != shard_count:
+            return None
+        return self._saved['shards'].pop(str(shard_id), None)
+
+    @staticmethod
+    def capture(bot):
+        shards = {}
+        for shard_id, shard in bot.shard_connections().items():
+            ws = shard.ws
+            if ws is None or ws.session_id is None or ws.sequence is None:
+                continue
+            shards[str(shard_id)] = {
+                'session_id': ws.session_id,
+                'sequence': ws.sequence,
+                'resume_url': str(ws.gateway),
+                'guild_ids': [guild.id for guild in bot.guilds if guild.shard_id == shard_id],
+            }
+        return {'saved_at': time.time(), 'shard_count': bot.shard_count, 'shards': shards}
+
+    def _write(self, snapshot):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    async def save(self, bot):
+        snapshot = self.capture(bot)
+        if snapshot['shards']:
+            await asyncio.to_thread(self._write, snapshot)
+
+    async def run_saver(self, bot, interval=5.0):
+        """Save the sessions every `interval` seconds so a crash can resume too"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save(bot)
+            except Exception as e:
+                logger.warning(f"Could not save gateway sessions: {e}")
+
+    async def close_resumable(self, bot):
+        """Disconnect every shard without ending its session, then save the final sequence numbers"""
+        for shard in bot.shard_connections().values():
+            # Stop the shard's reader first so the disconnect isn't treated as a dropped connection
+            shard._cancel_task()
+            if shard.ws is not None:
+                await shard.ws.close(code=RESUMABLE_CLOSE_CODE)
+        await self.save(bot)
+        logger.info(f"Saved gateway sessions to {self.path} for a quick resume")
+
+
+class ResumableBot(commands.AutoShardedBot):
+    """AutoShardedBot whose shards resume sessions from a GatewaySessionStore when they can"""
+
+    def __init__(self, *args, session_store, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_store = session_store
+        self.resumed_shards = set()
+
+    def shard_connections(self):
+        """{shard_id: Shard} for the running shards"""
+        return dict(self._AutoShardedClient__shards)
+
+    async def _load_guilds(self, guild_ids):
+        """Put guilds into the cache over REST, standing in for the GUILD_CREATEs a RESUME doesn't send"""
+        async def load(guild_id):
+            data, channels = await asyncio.gather(
+                self.http.get_guild(guild_id, with_counts=True),
+                self.http.get_all_guild_channels(guild_id)
+            )
+            data['channels'] = channels
+            data['member_count'] = data.get('approximate_member_count')
+            self._connection._add_guild_from_data(data)
+
+        await asyncio.gather(*(load(guild_id) for guild_id in guild_ids))
+
+    async def launch_shard(self, gateway, shard_id, *, initial=False):
+        saved = self.session_store.take(shard_id, self.shard_count)
+        if saved is None:
+            return await super().launch_shard(gateway, shard_id, initial=initial)
+
+        try:
+            await self._load_guilds(saved['guild_ids'])
+            ws = await asyncio.wait_for(
+                DiscordWebSocket.from_client(
+                    self,
+                    initial=initial,
+                    gateway=yarl.URL(saved['resume_url']),
+                    shard_id=shard_id,
+                    session=saved['session_id'],
+                    sequence=saved['sequence'],
+                    resume=True
+                ),
+                timeout=self.shard_connect_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Could not resume shard {shard_id}, identifying instead: {e}")
+            return await super().launch_shard(gateway, shard_id, initial=initial)
+
+        self._AutoShardedClient__shards[shard_id] = shard = Shard(ws, self, self._AutoShardedClient__queue.put_nowait)
+        shard.launch()
+        self.resumed_shards.add(shard_id)
+        logger.info(f"Shard {shard_id} resuming session from sequence {saved['sequence']}")
+
+    async def launch_shards(self):
+        await super().launch_shards()
+        if self.resumed_shards:
+            # No READY arrives for resumed shards, so mark the client ready here
+            self._connection.call_handlers('ready')
+            self.dispatch('sessions_resumed', sorted(self.resumed_shards))
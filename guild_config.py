@@ -0,0 +1,218 @@
+"""
+Per-Guild Configuration
+Verification settings (review channel, verified role, minimum account age, flow,
+which earlier decisions restore the verified role, how long a verification lasts, how
+role holders are reconciled and how raids are handled) per guild, read from the "guilds" section of config.json with the top-level values as
+defaults. Each guild's settings are parsed once into a GuildSettings record that also
+caches the channel and role objects, so handlers don't re-parse IDs on every request.
+
+The file can be reloaded while the bot runs (/reload, or automatically when it changes).
+A reload parses the whole file first and then swaps the new settings in with a single
+assignment, so a bad edit leaves the old configuration in place. Bot-wide settings
+(database path, cache profile, ...) are only read at startup.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+GUILD_KEYS = ('review_channel_id', 'verified_role_id', 'min_account_age_days', 'verification_flow',
+              'restore_verified_on_rejoin', 'trust_verifications_from', 'verification_valid_days',
+              'reverification_reminder_days', 'reconcile_verified_role', 'raid_detection',
+              'lockdown_min_account_age_days')
+VERIFICATION_FLOWS = ('dm', 'modal')
+# What the nightly reconciliation does with holders of the verified role who have no approval
+RECONCILE_MODES = ('off', 'report', 'remove')
+REQUIRED_KEYS = ('min_account_age_days', 'review_channel_id', 'verified_role_id')
+
+
+def extract_id(id_string):
+    """Extract ID from mention format or return as-is if already an ID"""
+    if isinstance(id_string, str):
+        # Remove role mention format <@&123456789> -> 123456789
+        if id_string.startswith('<@&') and id_string.endswith('>'):
+            return id_string[3:-1]
+        # Remove channel mention format <#123456789> -> 123456789
+        elif id_string.startswith('<#') and id_string.endswith('>'):
+            return id_string[2:-1]
+        # Remove user mention format <@123456789> -> 123456789
+        elif id_string.startswith('<@') and id_string.endswith('>'):
+            return id_string[2:-1]
+    return str(id_string)
+
+
+def parse_id(value):
+    """Parse a configured ID into an int; None if it is missing or still a placeholder"""
+    if value is None:
+        return None
+    value = extract_id(value)
+    return int(value) if value.isdigit() else None
+
+
+def parse_trusted(value):
+    """Parse trust_verifications_from: 'all', or a list of guild IDs"""
+    if value == 'all':
+        return 'all'
+    if not isinstance(value, list) or any(parse_id(guild_id) is None for guild_id in value):
+        raise ValueError(f"trust_verifications_from must be \"all\" or a list of guild IDs, not {value!r}")
+    return frozenset(parse_id(guild_id) for guild_id in value)
+
+
+class GuildSettings:
+    """One guild's resolved settings, with cached channel and role handles"""
+
+    __slots__ = ('guild_id', 'review_channel_id', 'verified_role_id', 'min_account_age_days',
+                 'verification_flow', 'restore_verified_on_rejoin', 'trusted_guilds', 'valid_days',
+                 'reminder_days', 'reconcile', 'raid_detection', 'lockdown_min_account_age_days', 'review_channel',
+                 'verified_role')
+
+    def __init__(self, guild_id, values):
+        self.guild_id = guild_id
+        self.review_channel_id = parse_id(values.get('review_channel_id'))
+        self.verified_role_id = parse_id(values.get('verified_role_id'))
+        self.min_account_age_days = int(values.get('min_account_age_days', 0))
+        self.verification_flow = values.get('verification_flow', 'dm')
+        self.restore_verified_on_rejoin = bool(values.get('restore_verified_on_rejoin', True))
+        # Guilds whose approvals also count here; 'all' for every guild the bot has decided in
+        self.trusted_guilds = parse_trusted(values.get('trust_verifications_from', []))
+        # 0 keeps the verified role for good
+        self.valid_days = int(values.get('verification_valid_days', 0))
+        self.reminder_days = int(values.get('reverification_reminder_days', 7))
+        self.reconcile = values.get('reconcile_verified_role', 'report')
+        self.raid_detection = bool(values.get('raid_detection', True))
+        self.lockdown_min_account_age_days = int(values.get('lockdown_min_account_age_days', 30))
+        self.review_channel = None
+        self.verified_role = None
+
+    @property
+    def configured(self):
+        return self.review_channel_id is not None and self.verified_role_id is not None
+
+    def account_age_floor(self, locked):
+        """Minimum account age in days, raised while the guild is in raid lockdown"""
+        if locked:
+            return max(self.min_account_age_days, self.lockdown_min_account_age_days)
+        return self.min_account_age_days
+
+    def bind(self, guild):
+        """Look up any channel or role handle not cached yet"""
+        if self.review_channel is None and self.review_channel_id is not None:
+            self.review_channel = guild.get_channel(self.review_channel_id)
+        if self.verified_role is None and self.verified_role_id is not None:
+            self.verified_role = guild.get_role(self.verified_role_id)
+        return self
+
+
+class GuildConfig:
+    """Loads config.json and hands out per-guild settings"""
+
+    def __init__(self, path):
+        self.path = path
+        self.raw = {}
+        self.mtime = None
+        self.reloads = 0
+        # (defaults, {guild_id: values}, {guild_id: GuildSettings}), replaced as a whole on reload
+        self._state = ({}, {}, {})
+
+    def _read(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'r') as f:
+            raw = json.load(f)
+        defaults, guilds = self._parse(raw)
+        return raw, mtime, defaults, guilds
+
+    @staticmethod
+    def _parse(raw):
+        defaults = {key: raw[key] for key in GUILD_KEYS if key in raw}
+        guilds = {}
+        for guild_id, overrides in raw.get('guilds', {}).items():
+            if parse_id(guild_id) is None:
+                raise ValueError(f"Invalid guild ID in 'guilds': {guild_id!r}")
+            unknown = sorted(set(overrides) - set(GUILD_KEYS))
+            if unknown:
+                raise ValueError(f"Unknown settings for guild {guild_id}: {unknown}")
+            guilds[parse_id(guild_id)] = {**defaults, **overrides}
+
+        # A key may be left out of the defaults when every listed guild sets it
+        missing = [key for key in REQUIRED_KEYS
+                   if key not in defaults and not (guilds and all(key in values for values in guilds.values()))]
+        if missing:
+            raise ValueError(f"Missing required configuration keys: {missing}")
+
+        for values in (defaults, *guilds.values()):
+            for key in ('min_account_age_days', 'verification_valid_days', 'reverification_reminder_days',
+                        'lockdown_min_account_age_days'):
+                try:
+                    int(values.get(key, 0))
+                except (TypeError, ValueError):
+                    raise ValueError(f"{key} must be a number, not {values[key]!r}")
+            if values.get('verification_flow', 'dm') not in VERIFICATION_FLOWS:
+                raise ValueError(f"verification_flow must be one of {', '.join(VERIFICATION_FLOWS)}, "
+                                 f"not {values['verification_flow']!r}")
+            if values.get('reconcile_verified_role', 'report') not in RECONCILE_MODES:
+                raise ValueError(f"reconcile_verified_role must be one of {', '.join(RECONCILE_MODES)}, "
+                                 f"not {values['reconcile_verified_role']!r}")
+            parse_trusted(values.get('trust_verifications_from', []))
+        return defaults, guilds
+
+    def load(self):
+        """Read the file. Blocking; call during startup only. Returns the raw config."""
+        raw, mtime, defaults, guilds = self._read()
+        self._swap(raw, mtime, defaults, guilds)
+        return raw
+
+    async def reload(self):
+        """Re-read the file and swap in the new settings. Raises if the file is invalid."""
+        raw, mtime, defaults, guilds = await asyncio.to_thread(self._read)
+        self._swap(raw, mtime, defaults, guilds)
+        self.reloads += 1
+        logger.info(f"Reloaded {self.path}: defaults plus {len(guilds)} guild override(s)")
+        return raw
+
+    def _swap(self, raw, mtime, defaults, guilds):
+        self.raw = raw
+        self.mtime = mtime
+        self._state = (defaults, guilds, {})
+
+    def for_guild(self, guild):
+        """Settings for a guild, resolved on first use and cached until the next reload.
+        Outside a guild (in DMs) the defaults, without channel or role handles."""
+        defaults, guilds, resolved = self._state
+        if guild is None:
+            return GuildSettings(None, defaults)
+        settings = resolved.get(guild.id)
+        if settings is None:
+            settings = resolved[guild.id] = GuildSettings(guild.id, guilds.get(guild.id, defaults))
+        return settings.bind(guild)
+
+    def resolve_all(self, guilds):
+        """Resolve settings and handles for every guild up front"""
+        for guild in guilds:
+            self.for_guild(guild)
+
+    def forget(self, guild_id):
+        """Drop a guild's cached handles, e.g. after its channel or role was deleted"""
+        self._state[2].pop(guild_id, None)
+
+    async def watch(self, interval=5.0, on_reload=None):
+        """Reload whenever the file's modification time changes"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                continue
+            if mtime == self.mtime:
+                continue
+            try:
+                await self.reload()
+            except (OSError, ValueError) as e:
+                # Keep the current settings and don't retry until the file changes again
+                self.mtime = mtime
+                logger.error(f"Not reloading {self.path}: {e}")
+                continue
+            if on_reload is not None:
+                on_reload()
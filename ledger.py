@@ -0,0 +1,136 @@
+"""
+Decision Ledger
+Append-only record of every verification decision, in SQLite with an index on
+(user_id, guild_id). Rows are only ever inserted, through the database's batched
+writer. A user's whole history across guilds is one indexed query. That history
+serves /lookup, and it lets the bot give the verified role back to a member who
+rejoins, or who was verified in a trusted guild, without another questionnaire. When an
+approval runs out, the expiry is recorded as a decision too, so it isn't restored.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    decision TEXT NOT NULL,
+    moderator_id INTEGER,
+    source TEXT NOT NULL,
+    decided_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS decisions_user_guild ON decisions (user_id, guild_id, decided_at);
+CREATE INDEX IF NOT EXISTS decisions_guild ON decisions (guild_id, decided_at);
+CREATE TABLE IF NOT EXISTS backfills (
+    guild_id INTEGER PRIMARY KEY,
+    backfilled_at REAL NOT NULL
+);
+"""
+
+APPROVED = 'approved'
+REJECTED = 'rejected'
+# The approval ran out after verification_valid_days
+EXPIRED = 'expired'
+
+# Where a decision came from
+SOURCE_REVIEW = 'review'
+SOURCE_REJOIN = 'rejoin'
+SOURCE_TRUSTED = 'trusted'
+SOURCE_EXPIRY = 'expiry'
+# Held the verified role before the ledger recorded anything for them
+SOURCE_BACKFILL = 'backfill'
+
+
+class Decision:
+    """One ledger row"""
+
+    __slots__ = ('user_id', 'guild_id', 'decision', 'moderator_id', 'source', 'decided_at')
+
+    def __init__(self, user_id, guild_id, decision, moderator_id, source, decided_at):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.decision = decision
+        self.moderator_id = moderator_id
+        self.source = source
+        self.decided_at = decided_at
+
+
+class DecisionLedger:
+    """Append-only decision history, backed by SQLite"""
+
+    def __init__(self, db):
+        self.db = db
+        db.ensure_schema(SCHEMA)
+
+    def record(self, user_id, guild_id, decision, moderator_id=None, source=SOURCE_REVIEW, decided_at=None):
+        """Append a decision. Returns immediately; the row lands with the writer's next batch.
+
+        `decided_at` defaults to now; a restored approval passes the original's time.
+        """
+        self.db.execute(
+            "INSERT INTO decisions (user_id, guild_id, decision, moderator_id, source, decided_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, guild_id, decision, moderator_id, source, time.time() if decided_at is None else decided_at)
+        )
+
+    async def backfilled(self, guild_id):
+        """Whether the guild's role holders from before the ledger have been recorded"""
+        return bool(await self.db.fetchall("SELECT 1 FROM backfills WHERE guild_id = ?", (guild_id,)))
+
+    def backfill(self, guild_id, user_ids):
+        """Record an approval for each member who held the verified role before the ledger existed"""
+        now = time.time()
+        for user_id in user_ids:
+            self.record(user_id, guild_id, APPROVED, source=SOURCE_BACKFILL, decided_at=now)
+        self.db.execute("INSERT OR IGNORE INTO backfills (guild_id, backfilled_at) VALUES (?, ?)", (guild_id, now))
+
+    async def history(self, user_id, limit=None):
+        """A user's decisions in every guild, oldest first"""
+        sql = ("SELECT user_id, guild_id, decision, moderator_id, source, decided_at FROM decisions "
+               "WHERE user_id = ? ORDER BY decided_at DESC, id DESC")
+        params = (user_id,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        rows = await self.db.fetchall(sql, params)
+        return [Decision(*row) for row in reversed(rows)]
+
+    async def latest_in_guild(self, guild_id):
+        """{user_id: their most recent Decision} for everyone decided on in a guild"""
+        rows = await self.db.fetchall(
+            "SELECT user_id, guild_id, decision, moderator_id, source, decided_at FROM decisions "
+            "WHERE guild_id = ? ORDER BY decided_at, id",
+            (guild_id,)
+        )
+        return {row[0]: Decision(*row) for row in rows}
+
+    @staticmethod
+    def latest(decisions):
+        """{guild_id: the most recent Decision} for a history"""
+        return {decision.guild_id: decision for decision in decisions}
+
+    async def standing(self, user_id, guild_id, trusted_guilds=(), valid_days=0):
+        """The decision that entitles a user to the verified role in a guild, or None.
+
+        The guild's own latest decision wins; a rejection there is never overridden. With
+        no decision in the guild, an approval in one of `trusted_guilds` counts (the string
+        'all' trusts every other guild). With `valid_days`, an approval older than that
+        has run out and doesn't count.
+        """
+        latest = self.latest(await self.history(user_id))
+        valid_after = time.time() - valid_days * 86400 if valid_days else None
+
+        def entitles(decision):
+            return decision.decision == APPROVED and (valid_after is None or decision.decided_at > valid_after)
+
+        own = latest.get(guild_id)
+        if own is not None:
+            return own if entitles(own) else None
+        for other_id, decision in latest.items():
+            if entitles(decision) and (trusted_guilds == 'all' or other_id in trusted_guilds):
+                return decision
+        return None
@@ -0,0 +1,151 @@
+"""
+Logging Setup
+Non-blocking logging pipeline shared by the bot and its runner.
+
+Records are handed to a bounded queue and written by a QueueListener thread, so a
+logger call on the event loop never waits on disk. When the queue backs up, DEBUG
+records are sampled and then dropped instead of applying backpressure.
+
+Environment variables:
+    LOG_FORMAT        "text" (default) or "json" for newline-delimited JSON
+    LOG_LEVEL         root log level, default INFO
+    LOG_MAX_BYTES     rotate the log file once it reaches this size (default 10 MiB)
+    LOG_ROTATE_WHEN   also rotate on this schedule: "midnight" (default), "H", or "none"
+    LOG_BACKUP_COUNT  rotated files to keep (default 7)
+    LOG_CONSOLE       "0" to log to the file only (the supervisor in run_bot.py sets this)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from datetime import datetime, timezone
+
+# Context fields that handlers attach through `extra=` and the JSON formatter emits
+CONTEXT_FIELDS = ('user_id', 'guild_id', 'custom_id', 'step')
+
+_ROTATE_INTERVALS = {
+    'H': 3600,
+    'midnight': 86400,
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file exceeds max_bytes or the rotation interval elapses, whichever is first"""
+
+    def __init__(self, filename, max_bytes, backup_count, when='midnight'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.when = when
+        self.rollover_at = self._next_rollover(time.time())
+
+    def _next_rollover(self, now):
+        interval = _ROTATE_INTERVALS.get(self.when)
+        if interval is None:
+            return None
+        if self.when == 'midnight':
+            midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+            return midnight.timestamp() + interval
+        return now - (now % interval) + interval
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that sheds low-priority records instead of blocking when the queue backs up"""
+
+    def __init__(self, log_queue, sample_every=10):
+        super().__init__(log_queue)
+        self.high_watermark = log_queue.maxsize // 2
+        self.sample_every = sample_every
+        self._debug_seen = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if record.levelno <= logging.DEBUG and self.queue.qsize() >= self.high_watermark:
+            # Backed up: keep one DEBUG record in every `sample_every`
+            self._debug_seen += 1
+            if self._debug_seen % self.sample_every:
+                self.dropped += 1
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(log_file, fmt, queue_size=10000):
+    """Route all logging through a background writer thread. Returns the QueueListener."""
+    if os.environ.get('LOG_FORMAT', 'text').lower() == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(fmt)
+
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = SizeAndTimeRotatingFileHandler(
+        log_file,
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 7)),
+        when=os.environ.get('LOG_ROTATE_WHEN', 'midnight')
+    )
+    handlers = [file_handler]
+    # Under the supervisor the log file is the only copy; stdout just catches crashes
+    if os.environ.get('LOG_CONSOLE', '1') != '0':
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def log_context(user=None, guild=None, custom_id=None, step=None):
+    """Build the `extra=` mapping for a log call from the objects a handler has to hand"""
+    return {
+        'user_id': user.id if user is not None else None,
+        'guild_id': guild.id if guild is not None else None,
+        'custom_id': custom_id,
+        'step': step,
+    }
@@ -1,26 +1,69 @@
+import time
+
+# Startup is timed from here, so the imports below count towards it
+process_started = time.monotonic()
+
 import discord
-from discord.ext import commands
-from discord.ui import Button, View
+from discord.ui import Button, DynamicItem, Modal, TextInput, View
+import io
 import json
 import os
 import logging
 import asyncio
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('discord_bot.log'),
-        logging.StreamHandler()
-    ]
+import signal
+from collections import Counter
+from typing import Optional
+
+import metrics
+from admission import DEDUPLICATED, THROTTLED, WAITLISTED, AdmissionController
+from command_sync import CommandSyncer, describe_changes
+from deadlines import EXPIRE, RECONCILE, REMIND, DeadlineScheduler
+from diagnostics import HandlerTimer, LoopLagMonitor, SamplingProfiler, SlowCallbackMonitor
+from dm_router import DMRouter
+from funnel import ANSWERED, CLICKED, REVIEW, STARTED, SUBMITTED, FunnelStats
+from gateway_resume import GatewaySessionStore, ResumableBot
+from guild_config import GuildConfig, extract_id
+from ledger import EXPIRED, SOURCE_EXPIRY, SOURCE_REJOIN, SOURCE_TRUSTED, DecisionLedger
+from log_setup import log_context, setup_logging
+from member_cache import MemberCache
+from review_queue import APPROVED, REJECTED, ReviewEntry, ReviewQueue, ReviewWorker
+import runtime_profile
+from screenshot_store import ScreenshotError, ScreenshotStore, start_image_pool
+from metrics import MetricsServer
+from raid_detector import LOCKDOWN, SIGNALS, RaidDetector
+from reconcile import RoleReconciler
+from send_scheduler import PRIORITY_COSMETIC, PRIORITY_MODERATION, SendScheduler
+from session_store import SessionStore
+from startup import CONFIG, FIRST_INTERACTION, IMPORTS, LOGIN, READY, SETUP, StartupTimeline
+from storage import Database
+from traffic_capture import TrafficRecorder
+
+# Cluster mode: the launcher in run_bot.py hands each process a range of shards
+cluster_id = os.environ.get('CLUSTER_ID')
+
+# Screenshot image workers are forked now, while the process still has a single thread;
+# the log writer below is the first thread it starts
+image_pool = start_image_pool()
+
+# Set up logging; records are written by a background thread, never on the event loop
+setup_logging(
+    f'discord_bot.cluster{cluster_id}.log' if cluster_id else 'discord_bot.log',
+    '%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# Phase timings from process start to the first interaction; work not needed to serve is deferred
+startup = StartupTimeline(process_started, on_mark=lambda phase, seconds: metrics.startup_phase_seconds.set(seconds, phase=phase))
+startup.mark(IMPORTS)
+
+# RUNTIME_PROFILE=speed runs on uvloop and orjson when they are installed; must precede the event loop
+runtime = runtime_profile.apply(os.environ.get('RUNTIME_PROFILE', runtime_profile.DEFAULT))
+logger.info(f"Runtime profile: {runtime.describe()}")
+
 # Load configuration with error handling
+guild_config = GuildConfig('config.json')
 try:
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+    config = guild_config.load()
     logger.info("Configuration loaded successfully")
 except FileNotFoundError:
     logger.error("config.json file not found. Please create it with the required settings.")
@@ -28,41 +71,418 @@ except FileNotFoundError:
 except json.JSONDecodeError as e:
     logger.error(f"Error parsing config.json: {e}")
     exit(1)
-
-# Validate required config keys
-required_keys = ['min_account_age_days', 'review_channel_id', 'verified_role_id']
-missing_keys = [key for key in required_keys if key not in config]
-if missing_keys:
-    logger.error(f"Missing required configuration keys: {missing_keys}")
+except ValueError as e:
+    logger.error(f"Invalid config.json: {e}")
     exit(1)
+startup.mark(CONFIG)
+
+# "lean" keeps no member cache and skips member chunking; members are fetched when needed
+lean_cache = config.get('cache_profile', 'default') == 'lean'
 
 intents = discord.Intents.default()
 intents.members = True
-intents.message_content = True
+# DMs always include message content, so the lean profile only loses the `!` prefix commands
+intents.message_content = not lean_cache
+
+def parse_shard_ids(value):
+    """Parse a SHARD_IDS value such as "0-3,8" into a list of shard IDs"""
+    shard_ids = []
+    for part in value.split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids
+
+# Without SHARD_COUNT/SHARD_IDS the bot runs every shard Discord recommends in this process
+shard_count = int(os.environ['SHARD_COUNT']) if os.environ.get('SHARD_COUNT') else None
+shard_ids = parse_shard_ids(os.environ['SHARD_IDS']) if os.environ.get('SHARD_IDS') else None
+
+# Discord delivers every DM to shard 0, so a cluster without it never sees DM replies: its
+# servers verify with the modal form, without the screenshot upload
+receives_dms = shard_ids is None or 0 in shard_ids
+if not receives_dms:
+    logger.warning("Shard 0 runs in another cluster, so DMs don't reach this one; servers here use the modal flow without screenshots")
+
+def verification_flow(settings):
+    """The flow a guild's verifications actually run: only a process with shard 0 can hold a DM questionnaire"""
+    return settings.verification_flow if receives_dms else 'modal'
+
+# Members are never chunked before READY; the default profile warms its member cache once serving
+if lean_cache:
+    cache_options = {
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False,
+        'max_messages': None,
+    }
+else:
+    cache_options = {'chunk_guilds_at_startup': False}
+
+# Gateway sessions saved by the previous run, so a quick restart can RESUME instead of IDENTIFY
+gateway_sessions = GatewaySessionStore(
+    config.get('gateway_session_path', f'data/gateway_session.cluster{cluster_id}.json' if cluster_id else 'data/gateway_session.json'),
+    max_age=config.get('gateway_resume_max_age_seconds', 120),
+    max_guilds=config.get('gateway_resume_max_guilds', 100)
+)
+# A traffic capture has to start with READY and every guild, which a resumed session never sends
+if not config.get('traffic_capture', False):
+    gateway_sessions.load()
+
+bot = ResumableBot(
+    command_prefix="!",
+    intents=intents,
+    shard_count=shard_count,
+    shard_ids=shard_ids,
+    session_store=gateway_sessions,
+    **cache_options
+)
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Opt-in recording of the gateway traffic, anonymised, for replaying with bench/replay_bench.py
+traffic_recorder = None
+if config.get('traffic_capture', False):
+    traffic_recorder = TrafficRecorder(
+        os.path.join(
+            config.get('traffic_capture_dir', 'data/captures'),
+            f"capture-{time.strftime('%Y%m%d-%H%M%S')}{f'.cluster{cluster_id}' if cluster_id else ''}.jsonl.gz"
+        ),
+        config=config,
+        events=config.get('traffic_capture_events'),
+        max_bytes=config.get('traffic_capture_max_mb', 512) * 1024 * 1024
+    )
+    traffic_recorder.install(bot._connection)
+
+def owns_guild(guild_id):
+    """Whether this process runs the shard that serves `guild_id`"""
+    if shard_ids is None:
+        return True
+    return (guild_id >> 22) % shard_count in shard_ids
 
 verify_button_id = "nsfw_verify_button"
 
+# Questionnaire replies are routed to their session by user ID
+dm_router = DMRouter()
+bot.add_listener(dm_router.on_message, 'on_message')
+
+# Questionnaire progress is checkpointed so verifications survive restarts
+db = Database(config.get('database_path', 'data/bot_data.db'))
+db.start()
+session_store = SessionStore(db)
+pending_resumes = []
+
+# All bot-initiated REST calls go through one rate-limit-aware queue
+scheduler = SendScheduler(workers=config.get('send_workers'))
+
+# Submissions awaiting a moderator, and the worker that applies bulk decisions
+review_queue = ReviewQueue(db)
+
+# Every decision ever made, so verified members who rejoin get their role back straight away
+ledger = DecisionLedger(db)
+
+# Funnel analytics for /verifystats: per-guild step counts rolled up hourly and daily
+funnel = FunnelStats(
+    db,
+    hourly_retention_days=config.get('funnel_hourly_retention_days', 7),
+    daily_retention_days=config.get('funnel_daily_retention_days', 400)
+)
+
+# Local copies of verification screenshots; downloads started as soon as a user uploads one
+screenshot_store = ScreenshotStore(
+    db,
+    config.get('screenshot_dir', 'data/screenshots'),
+    max_dimension=config.get('screenshot_max_dimension', 1024),
+    retention_days=config.get('screenshot_retention_days', 30),
+    pool=image_pool
+)
+screenshot_jobs = {}
+
+# The command tree is only re-uploaded when its hash changes
+command_syncer = CommandSyncer(bot.tree, config.get('command_sync_state_path', 'data/command_sync.json'))
+
+# Members being verified or reviewed; the only members the lean profile keeps
+members = MemberCache(
+    max_size=config.get('member_cache_size', 1024),
+    ttl=config.get('member_cache_ttl_seconds', 900)
+)
+members.install(bot._connection)
+
+# Questionnaires run as background tasks so the click handler returns as soon as it has responded
+questionnaire_tasks = set()
+
+# Set on SIGTERM: new verifications are turned away while open ones finish
+draining = False
+shutdown_drain_seconds = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', 60))
+
+# Liveness file for the supervisor in run_bot.py; only touched while the event loop is responsive
+heartbeat_file = os.environ.get('HEARTBEAT_FILE')
+heartbeat_interval = float(os.environ.get('HEARTBEAT_INTERVAL', 10))
+
+def gateway_health():
+    """Report per-shard gateway connectivity and heartbeat age for /health"""
+    healthy = bot.is_ready() and not bot.is_closed() and bool(bot.shards)
+    shards = {}
+    for shard_id, shard in bot.shards.items():
+        keep_alive = getattr(shard._parent.ws, '_keep_alive', None)
+        connected = not shard.is_closed()
+        heartbeat_age = time.perf_counter() - keep_alive._last_ack if keep_alive else None
+        shard_healthy = connected and heartbeat_age is not None and heartbeat_age < keep_alive.interval * 2 + 10
+        healthy = healthy and shard_healthy
+        shards[str(shard_id)] = {
+            'connected': connected,
+            'latency_ms': round(shard.latency * 1000) if connected else None,
+            'heartbeat_age_seconds': round(heartbeat_age, 1) if heartbeat_age is not None else None,
+        }
+
+    details = {
+        'cluster_id': cluster_id,
+        'gateway_connected': healthy,
+        'shards': shards,
+        'guilds': len(bot.guilds),
+        'active_sessions': len(session_store),
+    }
+    return healthy, details
+
+metrics.install_rate_limit_counter()
+metrics.active_sessions.function = lambda: len(session_store)
+metrics.gateway_latency.function = lambda: {(str(shard_id),): shard.latency for shard_id, shard in bot.shards.items()}
+metrics.send_queue_depth.function = lambda: scheduler.depth
+metrics.guilds_in_lockdown.function = lambda: len(raid.locked_guilds())
+# Instrumentation behind /debug: slow loop callbacks, loop lag, handler timings and an on-demand profiler
+handler_timer = HandlerTimer(metrics.interaction_handler_seconds.observe)
+slow_callbacks = SlowCallbackMonitor(
+    config.get('slow_callback_ms', 100) / 1000,
+    on_slow=lambda elapsed: metrics.slow_callbacks.inc()
+)
+loop_lag = LoopLagMonitor(config.get('loop_lag_interval_seconds', 0.5), on_sample=metrics.event_loop_lag.observe)
+profiler = SamplingProfiler(config.get('profile_dir', 'data/profiles'))
+
+metrics_port = int(os.environ.get('METRICS_PORT', 8080))
+metrics_server = MetricsServer(gateway_health, port=metrics_port)
+
 @bot.event
-async def on_ready():
+async def setup_hook():
+    # Runs once the token has been accepted, before the gateway connects
+    startup.mark(LOGIN)
+    scheduler.start()
+    bot.add_dynamic_items(VerifyButton, ReviewDecisionButton)
+    if metrics_port:
+        await metrics_server.start()
+    pending_resumes.extend(session_store.load(config.get('session_resume_max_idle_minutes', 30) * 60, owns_guild))
+    for session in pending_resumes:
+        admission.restore(session.user_id, session.guild_id)
+    bot.admission_sweeper = asyncio.create_task(admission.run_sweeper())
+    bot.funnel_flusher = asyncio.create_task(funnel.run_flusher())
+    bot.raid_monitor = asyncio.create_task(raid.run_monitor())
+    review_queue.load(owns_guild)
+    review_worker.start()
+    # Only needed once a screenshot comes in, minutes after its verification starts
+    startup.defer("screenshot index", screenshot_store.load)
+    deadlines.load(owns_guild)
+    bot.screenshot_sweeper = asyncio.create_task(screenshot_store.run_sweeper())
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(drain_and_close()))
+    except NotImplementedError:
+        logger.warning("SIGTERM handling is not supported on this platform; shutdown will not drain")
+    if heartbeat_file:
+        bot.heartbeat_task = asyncio.create_task(write_heartbeats(heartbeat_file, heartbeat_interval))
+    if slow_callbacks.threshold and not slow_callbacks.install():
+        logger.warning(f"Slow callback detection is not available on the {runtime.event_loop} event loop")
+    bot.loop_lag_task = asyncio.create_task(loop_lag.run())
+    bot.gateway_saver = asyncio.create_task(
+        gateway_sessions.run_saver(bot, config.get('gateway_session_save_interval_seconds', 5))
+    )
+    watch_interval = config.get('config_watch_interval_seconds', 5)
+    if watch_interval:
+        # Keep a reference so the watcher isn't garbage collected
+        bot.config_watcher = asyncio.create_task(
+            guild_config.watch(watch_interval, on_reload=apply_guild_settings)
+        )
+    startup.mark(SETUP)
+
+def write_heartbeat(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(f"{os.getpid()} {time.time()}\n")
+    os.replace(tmp_path, path)
+
+async def write_heartbeats(path, interval):
+    """Refresh the heartbeat file every `interval` seconds"""
+    while True:
+        try:
+            await asyncio.to_thread(write_heartbeat, path)
+        except OSError as e:
+            logger.warning(f"Could not write heartbeat file {path}: {e}")
+        await asyncio.sleep(interval)
+
+async def drain_and_close():
+    """Stop accepting verifications, give open ones and queued requests time to finish, then log out"""
+    global draining
+    if draining:
+        return
+    draining = True
+    logger.info(f"🛑 SIGTERM received; draining {len(questionnaire_tasks)} open sessions and {scheduler.depth} queued requests (up to {shutdown_drain_seconds:g}s)")
+
+    deadline = time.monotonic() + shutdown_drain_seconds
+    while questionnaire_tasks or not scheduler.idle or not review_worker.idle:
+        if time.monotonic() >= deadline:
+            # Unfinished sessions keep their checkpoint and resume after the restart
+            logger.warning(f"Drain timed out with {len(questionnaire_tasks)} open sessions and {scheduler.depth} queued requests")
+            break
+        await asyncio.sleep(0.5)
+    else:
+        logger.info("✅ Drain complete")
+
+    await screenshot_store.close()
+    try:
+        await gateway_sessions.close_resumable(bot)
+    except Exception as e:
+        logger.warning(f"Could not save gateway sessions for a quick resume: {e}")
+    await bot.close()
+
+def apply_guild_settings():
+    """Resolve every guild's settings, (re)schedule their nightly role reconciliation and
+    lift lockdowns where raid detection was turned off"""
+    guild_config.resolve_all(bot.guilds)
+    for guild in bot.guilds:
+        settings = guild_config.for_guild(guild)
+        if not settings.raid_detection:
+            raid.lift(guild.id, "raid detection turned off")
+        if settings.verified_role_id is None or settings.reconcile == 'off':
+            deadlines.cancel(RECONCILE, guild.id, 0)
+        elif deadlines.get(RECONCILE, guild.id, 0) is None:
+            deadlines.schedule(RECONCILE, guild.id, 0, next_reconcile_time(guild.id))
+
+def start_serving():
+    """Set up per-guild state once the guild cache is filled, by READY or by a resumed session"""
     logger.info(f'Bot logged in as {bot.user} (ID: {bot.user.id})')
     logger.info(f'Bot is in {len(bot.guilds)} guilds')
+    apply_guild_settings()
+    # Deadlines need the guild cache, so they only start firing now
+    deadlines.start()
+    if startup.mark(READY):
+        # Deferred startup work begins with the first interaction, or after this long without one
+        bot.startup_release = asyncio.create_task(startup.release_after(config.get('startup_defer_seconds', 5)))
+
+    # on_ready fires again on reconnect, so resume checkpointed sessions only once
+    if pending_resumes:
+        sessions = pending_resumes[:]
+        pending_resumes.clear()
+        asyncio.create_task(resume_sessions(sessions))
 
-    # Sync slash commands on startup
+@bot.event
+async def on_sessions_resumed(shard_ids):
+    # A resumed session keeps the commands synced by the run that identified, so only set up state
+    logger.info(f"Resumed gateway sessions for shards {shard_ids} in {time.monotonic() - process_started:.1f}s")
+    start_serving()
+
+async def record_first_interaction(interaction):
+    bot.remove_listener(record_first_interaction, 'on_interaction')
+    connect = "resumed" if bot.resumed_shards else "identified"
+    elapsed = time.monotonic() - process_started
+    metrics.startup_first_interaction_seconds.set(elapsed, connect=connect)
+    logger.info(f"First interaction handled {elapsed:.1f}s after startup ({connect})")
+    startup.mark(FIRST_INTERACTION)
+    startup.release()
+
+bot.add_listener(record_first_interaction, 'on_interaction')
+
+async def sync_commands():
+    """Sync slash commands, but only upload the tree if it changed.
+    In cluster mode the first cluster owns syncing."""
+    if cluster_id not in (None, '0'):
+        return
     try:
-        synced = await bot.tree.sync()
-        logger.info(f'Synced {len(synced)} slash commands')
+        await command_syncer.sync()
+        for dev_guild_id in config.get('dev_guild_ids', []):
+            dev_guild = discord.Object(id=int(extract_id(dev_guild_id)))
+            bot.tree.copy_global_to(guild=dev_guild)
+            await command_syncer.sync(guild=dev_guild)
     except Exception as e:
         logger.error(f'Failed to sync slash commands: {e}')
 
-async def create_verification_embed():
+async def warm_member_cache():
+    """Fill the member cache one guild at a time, now that it isn't chunked before READY"""
+    for guild in bot.guilds:
+        if bot.is_closed():
+            return
+        if not guild.chunked:
+            await guild.chunk()
+    logger.info(f"Member cache warmed for {len(bot.guilds)} guilds")
+
+@bot.event
+async def on_ready():
+    start_serving()
+
+    # Neither is needed to answer interactions; both wait until the bot is serving.
+    # The commands Discord already has keep working meanwhile.
+    startup.defer("command sync", sync_commands)
+    if not lean_cache:
+        startup.defer("member cache warm-up", warm_member_cache)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    guild_config.forget(channel.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_config.forget(role.guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    deadlines.cancel_guild(guild.id)
+    raid.forget(guild.id)
+
+@bot.event
+async def on_member_join(member):
+    """Count the join for raid detection, and give the verified role straight back to members
+    the ledger already vouches for"""
+    if member.bot:
+        return
+    guild = member.guild
+    settings = guild_config.for_guild(guild)
+    if settings.raid_detection:
+        raid.record_join(guild.id, member.id, member.created_at.timestamp())
+    role = settings.verified_role
+    if role is None or not (settings.restore_verified_on_rejoin or settings.trusted_guilds):
+        return
+
+    # An approval that has run out since isn't restored
+    decision = await ledger.standing(member.id, guild.id, settings.trusted_guilds, settings.valid_days)
+    if decision is None:
+        return
+    rejoined = decision.guild_id == guild.id
+    if rejoined and not settings.restore_verified_on_rejoin:
+        return
+
+    source = SOURCE_REJOIN if rejoined else SOURCE_TRUSTED
+    try:
+        await retry_transient(lambda: scheduler.run(
+            f"roles:{guild.id}",
+            lambda: member.add_roles(role, reason="NSFW verification restored from an earlier approval")
+        ))
+    except discord.HTTPException as e:
+        logger.error(f"Could not restore the verified role for {member}: {e}", extra=log_context(member, guild, step=source))
+        return
+
+    # Recorded at the original approval's time, so leaving and rejoining never pushes the expiry back
+    ledger.record(member.id, guild.id, "approved", source=source, decided_at=decision.decided_at)
+    # The restored role runs out when the original approval would have
+    schedule_expiry(guild, member.id, decision.decided_at)
+    metrics.verified_role_restored.inc(source=source)
+    logger.info(
+        f"Restored verified role for {member} from an approval in guild {decision.guild_id}",
+        extra=log_context(member, guild, step=source)
+    )
+    notification = scheduler.send(member,
+        f"✅ **Welcome back to {guild.name}!**\n\n"
+        "You were already verified, so your NSFW access has been restored. No need to verify again."
+    )
+    notification.add_done_callback(log_background_failure(f"DM the restored verification to {member}"))
+
+async def create_verification_embed(settings):
     """Create the verification embed and view"""
     embed = discord.Embed(
         title="🔞 NSFW Verification Required",
         description="To access NSFW sections, click the button below to verify your age and consent.\n\n"
                    "**Requirements:**\n"
-                   f"• Account must be at least {config['min_account_age_days']} days old\n"
+                   f"• Account must be at least {settings.min_account_age_days} days old\n"
                    "• Must be 18+ years old\n"
                    "• Age verification screenshot (optional)",
         color=0xff69b4
@@ -70,19 +490,16 @@ async def create_verification_embed():
     embed.set_footer(text="This verification process is required for legal compliance.")
 
     view = View(timeout=None)  # Persistent view
-    view.add_item(Button(
-        label="🔞 Verify Me", 
-        style=discord.ButtonStyle.primary, 
-        custom_id=verify_button_id
-    ))
+    view.add_item(VerifyButton())
 
     return embed, view
 
 @bot.command()
+@handler_timer.timed("!postverify")
 async def postverify(ctx):
     """Post the NSFW verification embed with button (prefix command)"""
     try:
-        embed, view = await create_verification_embed()
+        embed, view = await create_verification_embed(guild_config.for_guild(ctx.guild))
         await ctx.send(embed=embed, view=view)
         logger.info(f"Verification embed posted by {ctx.author} in {ctx.channel} (prefix command)")
 
@@ -93,10 +510,11 @@ async def postverify(ctx):
 # Slash Commands
 @bot.tree.command(name="postverify", description="Post the NSFW verification embed with button")
 @discord.app_commands.describe()
+@handler_timer.timed("/postverify")
 async def slash_postverify(interaction: discord.Interaction):
     """Post the NSFW verification embed with button (slash command)"""
     try:
-        embed, view = await create_verification_embed()
+        embed, view = await create_verification_embed(guild_config.for_guild(interaction.guild))
         await interaction.response.send_message(embed=embed, view=view)
         logger.info(f"Verification embed posted by {interaction.user} in {interaction.channel} (slash command)")
 
@@ -105,6 +523,7 @@ async def slash_postverify(interaction: discord.Interaction):
         await interaction.response.send_message("An error occurred while posting the verification embed.", ephemeral=True)
 
 @bot.tree.command(name="botstats", description="Show bot statistics and health information")
+@handler_timer.timed("/botstats")
 async def slash_botstats(interaction: discord.Interaction):
     """Show bot statistics"""
     try:
@@ -116,13 +535,33 @@ async def slash_botstats(interaction: discord.Interaction):
             timestamp=discord.utils.utcnow()
         )
 
-        embed.add_field(name="🏓 Latency", value=f"{round(bot.latency * 1000)}ms", inline=True)
+        embed.add_field(name="🏓 Latency", value=f"{round(bot.latency * 1000)}ms avg", inline=True)
         embed.add_field(name="🏠 Servers", value=str(len(bot.guilds)), inline=True)
         embed.add_field(name="👥 Users", value=str(len(bot.users)), inline=True)
         embed.add_field(name="⏰ Bot Created", value=bot.user.created_at.strftime("%Y-%m-%d"), inline=True)
         embed.add_field(name="🔧 Commands", value="Prefix: `!` | Slash: `/`", inline=True)
         embed.add_field(name="📊 Status", value="🟢 Online", inline=True)
 
+        guilds_per_shard = {}
+        for guild in bot.guilds:
+            guilds_per_shard[guild.shard_id] = guilds_per_shard.get(guild.shard_id, 0) + 1
+        shard_lines = [
+            f"`{shard_id:>3}` {round(shard.latency * 1000)}ms · {guilds_per_shard.get(shard_id, 0)} servers"
+            for shard_id, shard in sorted(bot.shards.items())
+        ]
+        if len(shard_lines) > 20:
+            shard_lines = shard_lines[:20] + [f"…and {len(shard_lines) - 20} more shards"]
+        cluster_label = f" (cluster {cluster_id})" if cluster_id else ""
+        embed.add_field(name=f"🧩 Shards{cluster_label}", value="\n".join(shard_lines) or "Not connected", inline=False)
+
+        queue_stats = scheduler.stats()
+        embed.add_field(
+            name="📬 Send Queue",
+            value=f"{queue_stats['depth']} queued | p95 wait {queue_stats['wait_p95'] * 1000:.0f}ms\n"
+                  f"{queue_stats['merged']} acks merged | {queue_stats['dropped']} dropped",
+            inline=False
+        )
+
         embed.set_thumbnail(url=bot.user.display_avatar.url)
         embed.set_footer(text=f"Bot ID: {bot.user.id}")
 
@@ -134,6 +573,7 @@ async def slash_botstats(interaction: discord.Interaction):
         await interaction.response.send_message("An error occurred while fetching bot statistics.", ephemeral=True)
 
 @bot.tree.command(name="help", description="Show available commands and bot information")
+@handler_timer.timed("/help")
 async def slash_help(interaction: discord.Interaction):
     """Show help information"""
     try:
@@ -146,7 +586,14 @@ async def slash_help(interaction: discord.Interaction):
         embed.add_field(
             name="🔞 Verification Commands",
             value="`/postverify` - Post the verification embed\n"
-                  "`!postverify` - Same as above (prefix version)",
+                  "`!postverify` - Same as above (prefix version)\n"
+                  "`/queue` - Review pending requests in bulk (Manage Roles)\n"
+                  "`/lookup` - Show a user's verification history (Manage Roles)\n"
+                  "`/verifystats` - Show where users drop out of verification (Admin)\n"
+                  "`/reconcile` - Check who holds the verified role without an approval (Admin)\n"
+                  "`/raid` - Show or change the raid lockdown (Admin)\n"
+                  "`/reload` - Reload config.json without restarting (Admin)\n"
+                  "`/debug` - Show live diagnostics (Admin)",
             inline=False
         )
 
@@ -170,7 +617,7 @@ async def slash_help(interaction: discord.Interaction):
 
         embed.add_field(
             name="⚙️ Configuration",
-            value=f"• Minimum account age: {config['min_account_age_days']} days\n"
+            value=f"• Minimum account age: {guild_config.for_guild(interaction.guild).min_account_age_days} days\n"
                   "• Age requirement: 18+ years\n"
                   "• Verification method: Screenshot optional",
             inline=False
@@ -186,10 +633,13 @@ async def slash_help(interaction: discord.Interaction):
         await interaction.response.send_message("An error occurred while showing help.", ephemeral=True)
 
 @bot.tree.command(name="ping", description="Check bot response time")
+@handler_timer.timed("/ping")
 async def slash_ping(interaction: discord.Interaction):
     """Check bot latency"""
     try:
-        latency = round(bot.latency * 1000)
+        # Report the latency of the shard serving this server rather than the average
+        shard = bot.get_shard(interaction.guild.shard_id) if interaction.guild else None
+        latency = round((shard.latency if shard else bot.latency) * 1000)
 
         if latency < 100:
             status = "🟢 Excellent"
@@ -216,8 +666,12 @@ async def slash_ping(interaction: discord.Interaction):
 
 # Admin-only slash commands
 @bot.tree.command(name="sync", description="Sync slash commands (Admin only)")
-@discord.app_commands.describe()
-async def slash_sync(interaction: discord.Interaction):
+@discord.app_commands.describe(
+    force="Upload the commands even if nothing changed since the last sync",
+    this_server="Sync a copy of the commands to this server only (updates instantly, for testing)"
+)
+@handler_timer.timed("/sync")
+async def slash_sync(interaction: discord.Interaction, force: bool = False, this_server: bool = False):
     """Sync slash commands - Admin only"""
     try:
         # Check if user has administrator permissions
@@ -225,54 +679,600 @@ async def slash_sync(interaction: discord.Interaction):
             await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
             return
 
-        synced = await bot.tree.sync()
-        await interaction.response.send_message(f"✅ Synced {len(synced)} slash commands!", ephemeral=True)
-        logger.info(f"Slash commands synced by {interaction.user} - {len(synced)} commands")
+        # Uploading the tree can take a few seconds
+        await interaction.response.defer(ephemeral=True)
+
+        guild = None
+        if this_server:
+            guild = interaction.guild
+            bot.tree.copy_global_to(guild=guild)
+
+        synced, changes = await command_syncer.sync(guild=guild, force=force)
+        scope = "this server" if this_server else "all servers"
+        if synced:
+            status = f"✅ Synced slash commands for {scope}."
+        else:
+            status = f"⏭️ Commands for {scope} are unchanged, so nothing was uploaded. Use `force` to sync anyway."
+        await interaction.followup.send(f"{status}\n{describe_changes(changes)}", ephemeral=True)
+        logger.info(f"Slash command sync for {scope} requested by {interaction.user} - synced: {synced}, force: {force}")
 
     except Exception as e:
         logger.error(f"Error syncing commands: {e}")
-        await interaction.response.send_message("An error occurred while syncing commands.", ephemeral=True)
+        if interaction.response.is_done():
+            await interaction.followup.send("An error occurred while syncing commands.", ephemeral=True)
+        else:
+            await interaction.response.send_message("An error occurred while syncing commands.", ephemeral=True)
 
-@bot.event
-async def on_interaction(interaction):
-    """Handle all button interactions"""
-    if interaction.type != discord.InteractionType.component:
-        return
+@bot.tree.command(name="reload", description="Reload config.json without restarting (Admin only)")
+@handler_timer.timed("/reload")
+async def slash_reload(interaction: discord.Interaction):
+    """Reload the per-guild configuration - Admin only"""
+    try:
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
+            return
 
-    custom_id = interaction.data.get("custom_id", "")
+        try:
+            await guild_config.reload()
+        except (OSError, ValueError) as e:
+            await interaction.response.send_message(f"❌ config.json was not reloaded; the current settings stay in place.\n`{e}`", ephemeral=True)
+            return
 
+        apply_guild_settings()
+        settings = guild_config.for_guild(interaction.guild)
+        await interaction.response.send_message(
+            "✅ Configuration reloaded.\n"
+            f"• Review channel: {settings.review_channel.mention if settings.review_channel else '❌ not found'}\n"
+            f"• Verified role: {settings.verified_role.mention if settings.verified_role else '❌ not found'}\n"
+            f"• Minimum account age: {settings.min_account_age_days} days\n"
+            f"• Flow: {verification_flow(settings)}",
+            ephemeral=True
+        )
+        logger.info(f"Configuration reloaded by {interaction.user}")
+
+    except Exception as e:
+        logger.error(f"Error reloading configuration: {e}")
+        await interaction.response.send_message("An error occurred while reloading the configuration.", ephemeral=True)
+
+@bot.tree.command(name="queue", description="Review pending verification requests (Moderators only)")
+@discord.app_commands.describe(
+    screenshot="Only show requests with (or without) a screenshot",
+    min_account_age_days="Only show accounts at least this many days old",
+    max_account_age_days="Only show accounts at most this many days old"
+)
+@handler_timer.timed("/queue")
+async def slash_queue(interaction: discord.Interaction, screenshot: Optional[bool] = None,
+                      min_account_age_days: Optional[int] = None, max_account_age_days: Optional[int] = None):
+    """Show the pending review queue with bulk approve/reject - Moderators only"""
     try:
-        if custom_id == verify_button_id:
-            await handle_verification_start(interaction)
-        elif custom_id.startswith("approve_"):
-            await handle_approval(interaction, custom_id)
-        elif custom_id.startswith("reject_"):
-            await handle_rejection(interaction, custom_id)
+        if not interaction.user.guild_permissions.manage_roles:
+            await interaction.response.send_message("❌ You need Manage Roles permissions to use this command.", ephemeral=True)
+            return
+
+        view = ReviewQueueView(interaction.user, interaction.guild, {
+            'screenshot': screenshot,
+            'min_account_age_days': min_account_age_days,
+            'max_account_age_days': max_account_age_days,
+        })
+        await interaction.response.send_message(embed=view.render(), view=view, ephemeral=True)
+
     except Exception as e:
-        logger.error(f"Error handling interaction {custom_id}: {e}")
-        try:
-            await interaction.response.send_message(
-                "An error occurred while processing your request. Please try again later.", 
-                ephemeral=True
+        logger.error(f"Error with queue command: {e}")
+        await interaction.response.send_message("An error occurred while loading the review queue.", ephemeral=True)
+
+@bot.tree.command(name="lookup", description="Show a user's verification history (Moderators only)")
+@discord.app_commands.describe(user="The user to look up")
+@handler_timer.timed("/lookup")
+async def slash_lookup(interaction: discord.Interaction, user: discord.User):
+    """Show a user's decisions across all servers - Moderators only"""
+    try:
+        if not interaction.user.guild_permissions.manage_roles:
+            await interaction.response.send_message("❌ You need Manage Roles permissions to use this command.", ephemeral=True)
+            return
+
+        decisions = await ledger.history(user.id, limit=25)
+        embed = discord.Embed(title=f"📜 Verification History: {user}", color=0x3498db)
+        embed.set_thumbnail(url=user.display_avatar.url)
+
+        lines = []
+        for decision in reversed(decisions):
+            guild = bot.get_guild(decision.guild_id)
+            where = "this server" if decision.guild_id == interaction.guild.id else (guild.name if guild else f"server {decision.guild_id}")
+            by = f" by <@{decision.moderator_id}>" if decision.moderator_id else f" ({decision.source})"
+            icon = {"approved": "✅", EXPIRED: "⌛"}.get(decision.decision, "❌")
+            lines.append(f"{icon} {decision.decision.capitalize()} in {where}{by} <t:{int(decision.decided_at)}:R>")
+        embed.description = "\n".join(lines) if lines else "No verification decisions recorded."
+
+        entry = review_queue.get(interaction.guild.id, user.id)
+        if entry is not None:
+            embed.add_field(name="⏳ Pending", value=f"[Review request]({entry.jump_url}) submitted <t:{int(entry.submitted_at)}:R>", inline=False)
+        embed.set_footer(text=f"Most recent first, up to 25 | Account created {user.created_at:%Y-%m-%d}")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error with lookup command: {e}")
+        await interaction.response.send_message("An error occurred while looking up the user.", ephemeral=True)
+
+@bot.tree.command(name="reconcile", description="Check who holds the verified role without an approval (Admin only)")
+@handler_timer.timed("/reconcile")
+async def slash_reconcile(interaction: discord.Interaction):
+    """Run this server's verified role reconciliation now - Admin only"""
+    try:
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
+            return
+
+        settings = guild_config.for_guild(interaction.guild)
+        if settings.verified_role_id is None:
+            await interaction.response.send_message("❌ No verified role is configured for this server.", ephemeral=True)
+            return
+        if settings.reconcile == 'off':
+            await interaction.response.send_message("❌ Reconciliation is turned off for this server (`reconcile_verified_role`).", ephemeral=True)
+            return
+
+        # Walking a large member list takes a while
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        report = await run_reconciliation(interaction.guild)
+        embed = discord.Embed(title="🔍 Verified Role Reconciliation", description=report.describe(), color=0x3498db)
+        if report.unentitled:
+            shown = " ".join(f"<@{user_id}>" for user_id in report.unentitled[:30])
+            more = f" and {len(report.unentitled) - 30} more" if len(report.unentitled) > 30 else ""
+            embed.add_field(name="⚠️ Holding the Role Without an Approval", value=shown + more, inline=False)
+        if settings.reconcile == 'report' and report.unentitled:
+            embed.set_footer(text="Report only; set reconcile_verified_role to \"remove\" to take these roles away")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        logger.info(f"Reconciliation requested by {interaction.user}: {report.describe()}")
+
+    except Exception as e:
+        logger.error(f"Error with reconcile command: {e}")
+        if interaction.response.is_done():
+            await interaction.followup.send("An error occurred while reconciling the verified role.", ephemeral=True)
+        else:
+            await interaction.response.send_message("An error occurred while reconciling the verified role.", ephemeral=True)
+
+@bot.tree.command(name="raid", description="Show or change this server's raid lockdown (Admin only)")
+@discord.app_commands.describe(action="What to do (default: show the status)")
+@discord.app_commands.choices(action=[
+    discord.app_commands.Choice(name="Show status", value="status"),
+    discord.app_commands.Choice(name="Lock down now", value="lock"),
+    discord.app_commands.Choice(name="Lift the lockdown", value="lift"),
+])
+@handler_timer.timed("/raid")
+async def slash_raid(interaction: discord.Interaction, action: Optional[discord.app_commands.Choice[str]] = None):
+    """Show the raid detector's signals and recent lockdowns, or lock down or lift by hand - Admin only"""
+    try:
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
+            return
+
+        guild = interaction.guild
+        action = action.value if action else "status"
+        if action == "lock":
+            if not raid.lock(guild.id, f"locked by {interaction.user}"):
+                await interaction.response.send_message("🚨 This server is already locked down by hand.", ephemeral=True)
+                return
+            logger.info(f"Raid lockdown set by {interaction.user}", extra=log_context(interaction.user, guild, step='raid'))
+        elif action == "lift":
+            if not raid.lift(guild.id, f"lifted by {interaction.user}"):
+                await interaction.response.send_message("✅ This server is not locked down.", ephemeral=True)
+                return
+            logger.info(f"Raid lockdown lifted by {interaction.user}", extra=log_context(interaction.user, guild, step='raid'))
+
+        status = raid.status(guild.id)
+        settings = guild_config.for_guild(guild)
+        if status.locked:
+            embed = discord.Embed(
+                title="🚨 Raid Lockdown",
+                description=f"Since <t:{int(status.since)}:R>{' (held by hand until lifted)' if status.manual else ''}: {status.reason}",
+                color=0xe74c3c
             )
-        except:
+        else:
+            embed = discord.Embed(title="✅ No Raid Lockdown", description="Verification is running normally.", color=0x2ecc71)
+        if not settings.raid_detection:
+            embed.description += "\nAutomatic detection is turned off for this server (`raid_detection`)."
+
+        names = {"joins": "Joins", "clicks": "Verify clicks", "cluster": "Accounts created together"}
+        embed.add_field(
+            name=f"📈 Last {raid.window}s",
+            value="\n".join(
+                f"{names[name]}: {status.signals[name]} / {status.thresholds[name] or 'off'}" for name in SIGNALS
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="🔒 During a Lockdown",
+            value=f"Minimum account age {settings.account_age_floor(True)} days, screenshot required, "
+                  f"at most {lockdown_max_concurrent} verifications at a time "
+                  f"({admission.active_count(guild.id)} running, {admission.waitlist_length(guild.id)} waiting now)",
+            inline=False
+        )
+        history = raid.history(guild.id)[:5]
+        if history:
+            embed.add_field(
+                name="🕑 Recent Changes",
+                value="\n".join(
+                    f"<t:{int(t.at)}:R> {'🚨 locked' if t.state == LOCKDOWN else '✅ lifted'}: {t.reason}" for t in history
+                )[:1024],
+                inline=False
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error with raid command: {e}")
+        await interaction.response.send_message("An error occurred while checking the raid lockdown.", ephemeral=True)
+
+def format_duration(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f}s"
+    if seconds < 5400:
+        return f"{seconds / 60:.1f} min"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.1f} h"
+    return f"{seconds / 86400:.1f} d"
+
+@bot.tree.command(name="verifystats", description="Show where users drop out of verification (Admin only)")
+@discord.app_commands.describe(window="How far back to look (default: last 7 days)")
+@discord.app_commands.choices(window=[
+    discord.app_commands.Choice(name="Last hour", value=3600),
+    discord.app_commands.Choice(name="Last 24 hours", value=86400),
+    discord.app_commands.Choice(name="Last 7 days", value=7 * 86400),
+    discord.app_commands.Choice(name="Last 30 days", value=30 * 86400),
+    discord.app_commands.Choice(name="Last 90 days", value=90 * 86400),
+])
+@handler_timer.timed("/verifystats")
+async def slash_verifystats(interaction: discord.Interaction, window: Optional[discord.app_commands.Choice[int]] = None):
+    """Show funnel conversion, drop-offs, time per step and moderator turnaround - Admin only"""
+    try:
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
+            return
+
+        summary = await funnel.summary(interaction.guild.id, window.value if window else 7 * 86400)
+        embed = discord.Embed(
+            title="📈 Verification Funnel",
+            description=f"Since <t:{summary.since}:f> ({window.name.lower() if window else 'last 7 days'})",
+            color=0x3498db
+        )
+
+        def stage_line(label, stage, previous=None):
+            line = f"{label}: **{summary.stages.get(stage, 0)}**"
+            rate = summary.conversion(stage, previous) if previous else None
+            return line + (f" ({rate:.0%})" if rate is not None else "")
+
+        embed.add_field(
+            name="🔻 Funnel",
+            value="\n".join([
+                stage_line("Clicked Verify", CLICKED),
+                stage_line("Started", STARTED, CLICKED),
+                stage_line("Answered the questions", ANSWERED, STARTED),
+                stage_line("Submitted for review", SUBMITTED, ANSWERED),
+                stage_line("Approved", APPROVED, SUBMITTED),
+                stage_line("Rejected", REJECTED, SUBMITTED),
+            ]),
+            inline=False
+        )
+        embed.add_field(
+            name="🚪 Top Drop-offs",
+            value="\n".join(f"`{step}` {reason.replace('_', ' ')}: **{count}**"
+                            for (step, reason), count in summary.dropoffs.most_common(6)) or "none",
+            inline=False
+        )
+        steps = [step for step in ("question_1", "question_2", "question_3", "question_4", "screenshot") if summary.medians.get(step) is not None]
+        embed.add_field(
+            name="⏱️ Median Time per Step",
+            value="\n".join(f"`{step}` {format_duration(summary.medians[step])} ({summary.timed[step]} answers)" for step in steps) or "none",
+            inline=False
+        )
+        turnaround = summary.medians.get(REVIEW)
+        embed.add_field(
+            name="🛡️ Moderator Turnaround",
+            value=f"Median {format_duration(turnaround)} over {summary.timed[REVIEW]} decisions" if turnaround is not None else "No decisions yet",
+            inline=False
+        )
+        embed.set_footer(text="Times are estimated from bucketed counts")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error with verifystats command: {e}")
+        if interaction.response.is_done():
+            await interaction.followup.send("An error occurred while collecting verification statistics.", ephemeral=True)
+        else:
+            await interaction.response.send_message("An error occurred while collecting verification statistics.", ephemeral=True)
+
+@bot.tree.command(name="debug", description="Show live diagnostics (Admin only)")
+@discord.app_commands.describe(profile_seconds="Also profile the event loop for this many seconds (1-60) and attach the result")
+@handler_timer.timed("/debug")
+async def slash_debug(interaction: discord.Interaction, profile_seconds: Optional[discord.app_commands.Range[int, 1, 60]] = None):
+    """Show task counts, waiters, sessions per step and slow handlers - Admin only"""
+    try:
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ You need Administrator permissions to use this command.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="🩺 Diagnostics", color=0x3498db)
+
+        tasks = asyncio.all_tasks()
+        task_names = Counter(getattr(task.get_coro(), '__qualname__', 'unknown') for task in tasks)
+        embed.add_field(
+            name=f"⚙️ Tasks ({len(tasks)})",
+            value="\n".join(f"`{name}` × {count}" for name, count in task_names.most_common(6)),
+            inline=False
+        )
+
+        listeners = {event: len(waiters) for event, waiters in bot._listeners.items() if waiters}
+        embed.add_field(
+            name="⏳ Waiters",
+            value=f"DM replies: {dm_router.waiting} of {len(dm_router)} inboxes\n"
+                  f"wait_for: {', '.join(f'{event} × {count}' for event, count in listeners.items()) or 'none'}\n"
+                  f"Send queue: {scheduler.depth} | Review worker: {review_worker.depth}",
+            inline=False
+        )
+
+        steps = Counter(step_label(session.step) for session in session_store)
+        embed.add_field(
+            name=f"📝 Sessions ({len(session_store)})",
+            value=", ".join(f"{step}: {count}" for step, count in sorted(steps.items())) or "none",
+            inline=False
+        )
+
+        lag, max_lag = loop_lag.summary()
+        slow = [f"{elapsed * 1000:.0f} ms `{description[:60]}`" for elapsed, description, _ in list(slow_callbacks.recent)[-3:]]
+        embed.add_field(
+            name="🔁 Event Loop",
+            value=f"Runtime: {runtime.describe()}\n"
+                  f"Lag: {lag * 1000:.1f} ms now, {max_lag * 1000:.1f} ms max (last {len(loop_lag.samples)} samples)\n"
+                  f"Slow callbacks: {slow_callbacks.count}" + "".join(f"\n• {line}" for line in slow),
+            inline=False
+        )
+
+        embed.add_field(name="🚀 Startup", value=startup.describe() or "not timed", inline=False)
+
+        slowest = handler_timer.slowest(5)
+        embed.add_field(
+            name="🐢 Slowest Recent Handlers",
+            value="\n".join(f"`{name}` {elapsed * 1000:.0f} ms <t:{int(at)}:R>" for elapsed, name, at in slowest) or "none",
+            inline=False
+        )
+
+        if profile_seconds is None:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            path, samples = await profiler.profile(profile_seconds)
+        except RuntimeError as e:
+            await interaction.followup.send(f"❌ Could not profile: {e}", embed=embed, ephemeral=True)
+            return
+        embed.set_footer(text=f"{samples} stack samples over {profile_seconds}s; open with speedscope or flamegraph.pl")
+        await interaction.followup.send(embed=embed, file=discord.File(path), ephemeral=True)
+        logger.info(f"Debug profile of {profile_seconds}s requested by {interaction.user}, written to {path}")
+
+    except Exception as e:
+        logger.error(f"Error with debug command: {e}")
+        if interaction.response.is_done():
+            await interaction.followup.send("An error occurred while collecting diagnostics.", ephemeral=True)
+        else:
+            await interaction.response.send_message("An error occurred while collecting diagnostics.", ephemeral=True)
+
+async def run_component_handler(name, interaction, handler):
+    """Run a button handler, recording its latency and telling the user if it fails"""
+    started = time.perf_counter()
+    try:
+        await handler(interaction)
+        handler_timer.record(name, time.perf_counter() - started)
+    except Exception as e:
+        custom_id = interaction.data.get("custom_id", "")
+        logger.error(f"Error handling interaction {custom_id}: {e}", extra=log_context(user=interaction.user, guild=interaction.guild, custom_id=custom_id))
+        message = "An error occurred while processing your request. Please try again later."
+        try:
+            if interaction.response.is_done():
+                await interaction.followup.send(message, ephemeral=True)
+            else:
+                await interaction.response.send_message(message, ephemeral=True)
+        except discord.HTTPException:
             pass
 
+class VerifyButton(DynamicItem[Button], template=verify_button_id):
+    """The persistent Verify Me button on verification embeds"""
+
+    def __init__(self):
+        super().__init__(Button(label="🔞 Verify Me", style=discord.ButtonStyle.primary, custom_id=verify_button_id))
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls()
+
+    async def callback(self, interaction):
+        await run_component_handler("verify", interaction, handle_verification_start)
+
+class ReviewDecisionButton(DynamicItem[Button], template=r"(?P<action>approve|reject)_(?P<user_id>[0-9]+)"):
+    """Approve or Reject button on a review post; the custom ID carries the user being reviewed"""
+
+    def __init__(self, approved, user_id):
+        super().__init__(Button(
+            label="✅ Approve" if approved else "❌ Reject",
+            style=discord.ButtonStyle.success if approved else discord.ButtonStyle.danger,
+            custom_id=f"{'approve' if approved else 'reject'}_{user_id}"
+        ))
+        self.approved = approved
+        self.user_id = user_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"] == "approve", int(match["user_id"]))
+
+    async def callback(self, interaction):
+        await run_component_handler(
+            "approve" if self.approved else "reject",
+            interaction,
+            lambda interaction: handle_review_decision(interaction, self.user_id, self.approved)
+        )
+
+def invite_from_waitlist(user, guild_id):
+    """DM a waitlisted user that a verification slot is being held for them"""
+    guild = bot.get_guild(guild_id)
+    future = scheduler.send(user,
+        f"✅ **It's your turn to verify{f' in {guild.name}' if guild else ''}!**\n\n"
+        f"A verification slot is being held for you. Click the Verify button again within "
+        f"{admission.invite_seconds // 60} minutes to start."
+    )
+    future.add_done_callback(log_background_failure(f"send a waitlist invite to {user}"))
+
+# One session per user; per-guild concurrency cap, start rate and waitlist for the Verify button
+admission = AdmissionController(
+    invite_from_waitlist,
+    max_concurrent=config.get('verification_max_concurrent_per_guild', 50),
+    start_burst=config.get('verification_start_burst', 10),
+    start_rate=config.get('verification_start_rate_per_second', 1.0),
+    invite_seconds=config.get('verification_waitlist_invite_seconds', 120),
+    rejection_ttl=config.get('account_age_rejection_cache_seconds', 300)
+)
+
+def on_raid_change(transition):
+    """Tighten or relax a guild's verification as it enters or leaves raid lockdown, and tell its moderators"""
+    locked = transition.state == LOCKDOWN
+    admission.set_limit(transition.guild_id, lockdown_max_concurrent if locked else None)
+    if not locked:
+        # Users turned away by the raised age floor may try again straight away
+        admission.forget_rejections(transition.guild_id)
+    metrics.raid_lockdown_transitions.inc(state=transition.state, trigger="manual" if transition.manual else "automatic")
+
+    guild = bot.get_guild(transition.guild_id)
+    if guild is None:
+        return
+    settings = guild_config.for_guild(guild)
+    channel = settings.review_channel
+    if channel is None:
+        return
+    if locked:
+        embed = discord.Embed(title="🚨 Raid Lockdown", description=f"Verification is locked down: {transition.reason}", color=0xe74c3c)
+        embed.add_field(
+            name="Until It Lifts",
+            value=f"• Minimum account age: {settings.account_age_floor(True)} days\n"
+                  "• A screenshot is required\n"
+                  f"• At most {lockdown_max_concurrent} verifications at a time; everyone else waits in line",
+            inline=False
+        )
+        embed.set_footer(text="Lifts by itself once activity is back to normal (unless locked by hand), or with /raid lift")
+    else:
+        embed = discord.Embed(title="✅ Raid Lockdown Lifted", description=f"Verification is back to normal: {transition.reason}", color=0x2ecc71)
+    future = scheduler.run(f"channel:{channel.id}", lambda: channel.send(embed=embed))
+    future.add_done_callback(log_background_failure(f"post the raid lockdown change in guild {guild.id}"))
+
+# Sliding-window raid detection; a guild in lockdown gets a higher age floor, required screenshots and a lower session cap
+lockdown_max_concurrent = config.get('lockdown_max_concurrent_per_guild', 5)
+raid = RaidDetector(
+    on_raid_change,
+    window=config.get('raid_window_seconds', 60),
+    join_threshold=config.get('raid_join_threshold', 30),
+    click_threshold=config.get('raid_click_threshold', 20),
+    cluster_threshold=config.get('raid_cluster_threshold', 15),
+    cluster_span=config.get('raid_cluster_span_hours', 24) * 3600,
+    calm_seconds=config.get('raid_calm_seconds', 300)
+)
+
 async def handle_verification_start(interaction):
     """Handle the initial verification button click"""
     user = interaction.user
+    settings = guild_config.for_guild(interaction.guild)
 
-    # Anti-alt check
+    if draining:
+        await interaction.response.send_message("🔄 The bot is restarting. Please click the button again in a minute.", ephemeral=True)
+        logger.info(f"Verification click from {user} turned away while draining", extra=log_context(user, interaction.guild, step='draining'))
+        return
+
+    if not settings.configured:
+        await interaction.response.send_message("❌ Verification is not set up for this server yet. Please contact an administrator.", ephemeral=True)
+        logger.error(f"Review channel or verified role not configured for guild {interaction.guild.id}")
+        return
+
+    # Repeat clicks from a too-new account get the same answer without re-checking or logging
+    rejection = admission.cached_rejection(interaction.guild.id, user.id)
+    if rejection is not None:
+        await interaction.response.send_message(rejection, ephemeral=True)
+        metrics.verification_clicks.inc(outcome="rejected_cached")
+        return
+
+    locked = raid.is_locked(interaction.guild.id)
+
+    # Anti-alt check, stricter during a raid lockdown
     account_age_days = (discord.utils.utcnow() - user.created_at).days
-    if account_age_days < config['min_account_age_days']:
+    min_age_days = settings.account_age_floor(locked)
+    if account_age_days < min_age_days:
+        rejection = (
+            f"❌ Your account is too new to verify. Account must be at least {min_age_days} days old.\n"
+            f"Your account age: {account_age_days} days"
+        )
+        if account_age_days >= settings.min_account_age_days:
+            rejection += "\n\n🚨 The minimum is raised while the server is under a raid lockdown. Please try again later."
+        if settings.raid_detection:
+            raid.record_click(interaction.guild.id, user.id, user.created_at.timestamp())
+        admission.remember_rejection(interaction.guild.id, user.id, rejection)
+        await interaction.response.send_message(rejection, ephemeral=True)
+        logger.info(f"Verification denied for {user} - account too new ({account_age_days} days)", extra=log_context(user, interaction.guild, step='account_age'))
+        funnel.stage(interaction.guild.id, CLICKED)
+        record_dropoff(interaction.guild, "account_age", "too_new" if account_age_days < settings.min_account_age_days else "too_new_lockdown")
+        metrics.verification_clicks.inc(outcome="rejected")
+        return
+
+    # Checkpointed sessions from before a restart are in the session store until they resume
+    result = admission.admit(user, interaction.guild.id) if user.id not in session_store else None
+    metrics.verification_clicks.inc(outcome=result.outcome if result else DEDUPLICATED)
+    # Repeat clicks from someone already verifying or waiting aren't new activity
+    if settings.raid_detection and result is not None and result.outcome != DEDUPLICATED:
+        raid.record_click(interaction.guild.id, user.id, user.created_at.timestamp())
+
+    if result is None or result.outcome == DEDUPLICATED:
+        form = open_forms.get(user.id)
+        if result is not None and form is not None and form.guild_id == interaction.guild.id:
+            # The form was closed without submitting; bring it back under the same admission
+            form.stop()
+            await show_verification_form(interaction, form.hold, locked or form.screenshot_required)
+            logger.info(f"Verification form shown again to {user}", extra=log_context(user, interaction.guild, step='modal'))
+            return
+        if result is not None and result.position is not None:
+            message = f"⏳ You're already on the waitlist at position #{result.position}. I'll DM you when it's your turn."
+        elif result is None or user.id in dm_router:
+            message = "⏳ You already have a verification in progress. Please check your direct messages."
+        else:
+            message = "⏳ You already have a verification in progress."
+        await interaction.response.send_message(message, ephemeral=True)
+        logger.info(f"Duplicate verification click from {user} ignored", extra=log_context(user, interaction.guild, step='duplicate'))
+        return
+
+    if result.outcome == WAITLISTED:
         await interaction.response.send_message(
-            f"❌ Your account is too new to verify. Account must be at least {config['min_account_age_days']} days old.\n"
-            f"Your account age: {account_age_days} days", 
+            ("🚨 **Verification is slowed down during a raid lockdown.**\n\n" if locked else "⏳ **Verification is busy right now.**\n\n") +
+            f"You're #{result.position} in line. I'll DM you when a slot opens up, "
+            "so keep your DMs open.",
             ephemeral=True
         )
-        logger.info(f"Verification denied for {user} - account too new ({account_age_days} days)")
+        logger.info(f"{user} waitlisted at position {result.position}", extra=log_context(user, interaction.guild, step='waitlist'))
         return
 
+    if result.outcome == THROTTLED:
+        await interaction.response.send_message(
+            f"⏳ Lots of people are verifying right now. Please try again in {max(1, round(result.retry_after))} seconds.",
+            ephemeral=True
+        )
+        return
+
+    funnel.stage(interaction.guild.id, CLICKED)
+    if verification_flow(settings) == 'modal':
+        await show_verification_form(interaction, result.hold, locked)
+        metrics.verifications_started.inc(flow="modal")
+        funnel.stage(interaction.guild.id, STARTED)
+        logger.info(f"Verification form shown to {user}", extra=log_context(user, interaction.guild, step='modal'))
+        return
+
+    dm_router.open(user.id)
+    session_store.create(user.id, interaction.guild.id)
+    metrics.verifications_started.inc(flow="dm")
+    funnel.stage(interaction.guild.id, STARTED)
+
     try:
         # Send initial response
         await interaction.response.send_message(
@@ -281,7 +1281,7 @@ async def handle_verification_start(interaction):
         )
 
         # Start DM verification process
-        await user.send(
+        await scheduler.send(user,
             "🔞 **NSFW Verification Process**\n\n"
             "Hello! Let's get you verified for NSFW content access.\n"
             "Please answer the following questions honestly and completely.\n"
@@ -289,6 +1289,196 @@ async def handle_verification_start(interaction):
             "**Let's begin:**"
         )
 
+    except discord.Forbidden:
+        dm_router.close(user.id)
+        session_store.finish(user.id)
+        admission.release(user.id)
+        await interaction.followup.send(
+            "❌ I couldn't send you a DM. Please:\n"
+            "1. Enable DMs from server members\n"
+            "2. Make sure you haven't blocked the bot\n"
+            "3. Try again after adjusting your privacy settings", 
+            ephemeral=True
+        )
+        logger.info(f"Could not DM {user} for verification", extra=log_context(user, interaction.guild, step='intro'))
+        record_dropoff(interaction.guild, "intro", "dm_closed")
+        return
+
+    start_questionnaire(user, interaction.guild)
+
+# user_id -> the verification form they were shown and haven't submitted yet
+open_forms = {}
+
+async def show_verification_form(interaction, hold, screenshot_required):
+    """Show the modal form under the admission `hold`, releasing it if the form can't be shown"""
+    user = interaction.user
+    form = VerificationModal(user, hold, screenshot_required=screenshot_required, screenshot_dm=receives_dms)
+    try:
+        await interaction.response.send_modal(form)
+    except discord.HTTPException:
+        admission.release(user.id, hold)
+        raise
+    open_forms[user.id] = form
+
+class VerificationModal(Modal, title="🔞 NSFW Verification"):
+    """Single-submission verification form used when verification_flow is set to modal"""
+
+    def __init__(self, user, hold, screenshot_required=False, screenshot_dm=True):
+        super().__init__(timeout=600)
+        self.user_id = user.id
+        # The admission the click that opened this form acquired; the form only ever releases that one
+        self.hold = hold
+        self.guild_id = user.guild.id
+        self.screenshot_required = screenshot_required
+        self.username = TextInput(label="Discord username and ID", default=f"{user.name} ({user.id})", max_length=100)
+        self.age = TextInput(label="How old are you? (Must be 18 or older)", placeholder="e.g. 21", max_length=3)
+        self.consent = TextInput(label="Do you consent to seeing NSFW content?", placeholder="Yes or No", max_length=3)
+        self.rules = TextInput(label="Have you read and agreed to the NSFW rules?", placeholder="Yes or No", max_length=3)
+        if not screenshot_dm:
+            # The upload would be a DM this process never receives
+            self.screenshot = None
+        elif screenshot_required:
+            self.screenshot = TextInput(
+                label="Upload an age screenshot by DM? (required now)",
+                placeholder="A screenshot is required during a raid lockdown",
+                default="Yes",
+                required=False,
+                max_length=3
+            )
+        else:
+            self.screenshot = TextInput(
+                label="Upload an age screenshot by DM? (optional)",
+                placeholder="Type 'Yes' to upload one, or leave blank",
+                required=False,
+                max_length=3
+            )
+        for item in (self.username, self.age, self.consent, self.rules, self.screenshot):
+            if item is not None:
+                self.add_item(item)
+
+    def forget(self):
+        if open_forms.get(self.user_id) is self:
+            del open_forms[self.user_id]
+
+    async def on_submit(self, interaction):
+        self.forget()
+        user = interaction.user
+
+        # Validate critical answers
+        try:
+            age = int(self.age.value.strip())
+        except ValueError:
+            await interaction.response.send_message("❌ Please provide a valid age number. Verification cancelled.", ephemeral=True)
+            logger.info(f"Verification cancelled for {user} - invalid age format", extra=log_context(user, interaction.guild, step='modal'))
+            record_dropoff(interaction.guild, "modal", "invalid_age")
+            admission.release(user.id, self.hold)
+            return
+        if age < 18:
+            await interaction.response.send_message("❌ You must be 18 or older to access NSFW content. Verification cancelled.", ephemeral=True)
+            logger.info(f"Verification cancelled for {user} - under 18 (claimed age: {age})", extra=log_context(user, interaction.guild, step='modal'))
+            record_dropoff(interaction.guild, "modal", "under_18")
+            admission.release(user.id, self.hold)
+            return
+        if self.consent.value.strip().lower() not in ['yes', 'y'] or self.rules.value.strip().lower() not in ['yes', 'y']:
+            await interaction.response.send_message("❌ You must consent and agree to the rules to access NSFW content. Verification cancelled.", ephemeral=True)
+            logger.info(f"Verification cancelled for {user} - did not consent/agree", extra=log_context(user, interaction.guild, step='modal'))
+            record_dropoff(interaction.guild, "modal", "no_consent")
+            admission.release(user.id, self.hold)
+            return
+
+        if user.id in session_store or dm_router.open(user.id) is None:
+            # Another session runs under its own admission; only give back this form's
+            await interaction.response.send_message("⏳ You already have a verification in progress.", ephemeral=True)
+            admission.release(user.id, self.hold)
+            return
+        funnel.stage(interaction.guild.id, ANSWERED)
+
+        answers = [self.username.value.strip(), str(age), self.consent.value.strip(), self.rules.value.strip()]
+
+        # During a raid lockdown the screenshot is collected whatever the answer
+        wants_screenshot = self.screenshot is not None and (
+            self.screenshot_required or raid.is_locked(interaction.guild.id)
+            or self.screenshot.value.strip().lower() in ['yes', 'y']
+        )
+        if not wants_screenshot:
+            dm_router.close(user.id)
+            admission.release(user.id, self.hold)
+            # Posting the review waits its turn in the send queue, which can outlast the
+            # three seconds an interaction has to be answered
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            note = "No screenshot provided (skipped by user)" if self.screenshot is not None else "No screenshot (uploads aren't available on this cluster)"
+            if not await submit_for_review(user, interaction.guild, answers, note, notify=False):
+                record_dropoff(interaction.guild, "modal", "not_submitted")
+                await interaction.followup.send(
+                    "❌ Your verification could not be submitted. Please contact an administrator.",
+                    ephemeral=True
+                )
+                return
+            await interaction.followup.send(
+                "✅ **Verification submitted successfully!**\n\n"
+                "Your verification request has been sent to the moderation team for review.\n"
+                "You will receive a DM with the result once it's processed.",
+                ephemeral=True
+            )
+            return
+
+        # Only the optional screenshot needs the DM flow; it picks up after the answered questions
+        session_store.create(user.id, interaction.guild.id)
+        for answer in answers:
+            session_store.record_answer(user.id, answer)
+
+        await interaction.response.send_message(
+            "✅ Answers received. I've sent you a DM to upload your screenshot.\n"
+            "If it doesn't arrive, enable DMs from server members and try again.",
+            ephemeral=True
+        )
+        start_questionnaire(user, interaction.guild)
+
+    async def on_timeout(self):
+        # The form was closed without submitting; free the slot it was holding
+        self.forget()
+        admission.release(self.user_id, self.hold)
+
+    async def on_error(self, interaction, error):
+        self.forget()
+        logger.error(f"Error in verification form for {interaction.user}: {error}", extra=log_context(interaction.user, interaction.guild, step='modal'))
+        dm_router.close(interaction.user.id)
+        session_store.finish(interaction.user.id)
+        admission.release(interaction.user.id, self.hold)
+        message = "An error occurred while processing your request. Please try again later."
+        if not interaction.response.is_done():
+            await interaction.response.send_message(message, ephemeral=True)
+        else:
+            # Answers the deferred "thinking" reply of a form that was being submitted
+            await interaction.followup.send(message, ephemeral=True)
+
+def record_dropoff(guild, step, reason):
+    """Count a verification that ended before it was submitted"""
+    metrics.verifications_cancelled.inc(step=step, reason=reason)
+    funnel.drop(guild.id, step, reason)
+
+def record_step_time(guild, step, seconds):
+    """Record how long a user took to answer a questionnaire step"""
+    metrics.verification_step_seconds.observe(seconds, step=step)
+    funnel.duration(guild.id, step, seconds)
+
+def step_label(step):
+    """Metric label for the questionnaire step a session is on"""
+    return f"question_{step + 1}" if step < 4 else "screenshot"
+
+def start_questionnaire(user, guild):
+    """Run the questionnaire in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(run_questionnaire(user, guild))
+    questionnaire_tasks.add(task)
+    task.add_done_callback(questionnaire_tasks.discard)
+    return task
+
+async def run_questionnaire(user, guild):
+    """Walk the user through the DM questionnaire from their checkpointed step"""
+    session = session_store.get(user.id)
+    keep_checkpoint = False
+
+    try:
         questions = [
             "**1.** What is your Discord username and ID? (You can copy this: `{}`#{})".format(user.name, user.discriminator),
             "**2.** How old are you? (Must be 18 or older)",
@@ -296,254 +1486,711 @@ async def handle_verification_start(interaction):
             "**4.** Have you read and agreed to the server's NSFW rules? (Type 'Yes' or 'No')"
         ]
 
-        answers = []
-
-        # Ask text questions with timeout
+        # Ask text questions with timeout, starting after the last checkpointed answer
         for i, question in enumerate(questions, 1):
-            await user.send(f"{question}")
+            if i <= session.step:
+                continue
+
+            await scheduler.send(user, f"{question}")
+            step_started = time.monotonic()
 
             try:
                 def check(m):
-                    return (m.author == user and 
-                           isinstance(m.channel, discord.DMChannel) and 
-                           len(m.content.strip()) > 0)
+                    return len(m.content.strip()) > 0
 
-                msg = await bot.wait_for('message', timeout=300, check=check)  # 5 minutes
-                answers.append(msg.content.strip())
+                msg = await dm_router.wait_for_message(user.id, timeout=300, check=check)  # 5 minutes
+                record_step_time(guild, f"question_{i}", time.monotonic() - step_started)
 
                 # Validate critical answers
                 if i == 2:  # Age question
                     try:
                         age = int(msg.content.strip())
                         if age < 18:
-                            await user.send("❌ You must be 18 or older to access NSFW content. Verification cancelled.")
-                            logger.info(f"Verification cancelled for {user} - under 18 (claimed age: {age})")
+                            await scheduler.send(user, "❌ You must be 18 or older to access NSFW content. Verification cancelled.")
+                            logger.info(f"Verification cancelled for {user} - under 18 (claimed age: {age})", extra=log_context(user, guild, step=i))
+                            record_dropoff(guild, f"question_{i}", "under_18")
                             return
                     except ValueError:
-                        await user.send("❌ Please provide a valid age number. Verification cancelled.")
-                        logger.info(f"Verification cancelled for {user} - invalid age format")
+                        await scheduler.send(user, "❌ Please provide a valid age number. Verification cancelled.")
+                        logger.info(f"Verification cancelled for {user} - invalid age format", extra=log_context(user, guild, step=i))
+                        record_dropoff(guild, f"question_{i}", "invalid_age")
                         return
                 elif i in [3, 4]:  # Consent questions
                     if msg.content.strip().lower() not in ['yes', 'y']:
-                        await user.send("❌ You must consent and agree to the rules to access NSFW content. Verification cancelled.")
-                        logger.info(f"Verification cancelled for {user} - did not consent/agree")
+                        await scheduler.send(user, "❌ You must consent and agree to the rules to access NSFW content. Verification cancelled.")
+                        logger.info(f"Verification cancelled for {user} - did not consent/agree", extra=log_context(user, guild, step=i))
+                        record_dropoff(guild, f"question_{i}", "no_consent")
                         return
 
-                await user.send("✅ Answer recorded.")
+                session_store.record_answer(user.id, msg.content.strip())
+                scheduler.send(user, "✅ Answer recorded.", ack=True)
+                if i == len(questions):
+                    funnel.stage(guild.id, ANSWERED)
 
             except asyncio.TimeoutError:
-                await user.send("⏰ Verification timed out. Please start over by clicking the verification button again.")
-                logger.info(f"Verification timed out for {user} at question {i}")
+                await scheduler.send(user, "⏰ Verification timed out. Please start over by clicking the verification button again.")
+                logger.info(f"Verification timed out for {user} at question {i}", extra=log_context(user, guild, step=i))
+                record_dropoff(guild, f"question_{i}", "timeout")
                 return
 
-        # Ask for screenshot (now optional)
-        await user.send(
-            "**5.** Please upload a screenshot showing your age verification, or type 'skip' to proceed without one.\n"
-            "This could be:\n"
-            "• Government ID (blur out sensitive info, keep age/DOB visible)\n"
-            "• Birth certificate (blur sensitive info)\n"
-            "• Any official document showing your date of birth\n\n"
-            "**Important:** Blur out all personal information except your age/date of birth.\n"
-            "**Note:** You can type 'skip' if you prefer not to upload a screenshot."
-        )
+        if session.step == len(questions):
+            # Ask for screenshot (optional, except during a raid lockdown)
+            required = raid.is_locked(guild.id)
+            await scheduler.send(user,
+                ("**5.** Please upload a screenshot showing your age verification.\n" if required else
+                 "**5.** Please upload a screenshot showing your age verification, or type 'skip' to proceed without one.\n") +
+                "This could be:\n"
+                "• Government ID (blur out sensitive info, keep age/DOB visible)\n"
+                "• Birth certificate (blur sensitive info)\n"
+                "• Any official document showing your date of birth\n\n"
+                "**Important:** Blur out all personal information except your age/date of birth.\n" +
+                ("**Note:** The server is under a raid lockdown, so a screenshot is required right now." if required else
+                 "**Note:** You can type 'skip' if you prefer not to upload a screenshot.")
+            )
+            step_started = time.monotonic()
 
-        image_url = None
-        try:
-            def check_image_or_skip(m):
-                return (m.author == user and 
-                       isinstance(m.channel, discord.DMChannel) and 
-                       (len(m.attachments) > 0 or m.content.strip().lower() in ['skip', 's']))
+            try:
+                def check_image_or_skip(m):
+                    return len(m.attachments) > 0 or (not required and m.content.strip().lower() in ['skip', 's'])
 
-            img_msg = await bot.wait_for('message', timeout=600, check=check_image_or_skip)  # 10 minutes for upload
+                img_msg = await dm_router.wait_for_message(user.id, timeout=600, check=check_image_or_skip)  # 10 minutes for upload
+                record_step_time(guild, "screenshot", time.monotonic() - step_started)
 
-            if img_msg.content.strip().lower() in ['skip', 's']:
-                image_url = "No screenshot provided (skipped by user)"
-                await user.send("✅ Screenshot skipped. Proceeding with verification.")
-            else:
-                image_url = img_msg.attachments[0].url
-                await user.send("✅ Screenshot received.")
+                if not required and img_msg.content.strip().lower() in ['skip', 's']:
+                    session_store.record_image(user.id, "No screenshot provided (skipped by user)")
+                    scheduler.send(user, "✅ Screenshot skipped. Proceeding with verification.", ack=True)
+                else:
+                    session_store.record_image(user.id, img_msg.attachments[0].url)
+                    start_screenshot_download(user, guild, img_msg.attachments[0].url)
+                    scheduler.send(user, "✅ Screenshot received.", ack=True)
 
-        except asyncio.TimeoutError:
-            await user.send("⏰ Image upload timed out. Please start over by clicking the verification button again.")
-            logger.info(f"Image upload timed out for {user}")
-            return
+            except asyncio.TimeoutError:
+                await scheduler.send(user, "⏰ Image upload timed out. Please start over by clicking the verification button again.")
+                logger.info(f"Image upload timed out for {user}", extra=log_context(user, guild, step='screenshot'))
+                record_dropoff(guild, "screenshot", "timeout")
+                return
 
-        # Send to review channel
-        guild = interaction.guild
-        review_channel_id = config['review_channel_id']
+        await submit_for_review(user, guild, session.answers, session.image_url)
 
-        if review_channel_id == "REPLACE_WITH_YOUR_REVIEW_CHANNEL_ID":
-            await user.send("❌ Bot configuration error. Please contact an administrator.")
-            logger.error("Review channel ID not configured properly")
-            return
+    except asyncio.CancelledError:
+        # The bot is shutting down; keep the checkpoint so the session resumes on restart
+        keep_checkpoint = True
+        raise
+    except discord.Forbidden:
+        logger.info(f"Could not DM {user} during verification", extra=log_context(user, guild))
+        record_dropoff(guild, step_label(session.step), "dm_closed")
+    except Exception as e:
+        logger.error(f"Error in verification process for {user}: {e}", extra=log_context(user, guild))
+        record_dropoff(guild, step_label(session.step), "error")
+        await scheduler.send(user, "❌ An error occurred during verification. Please try again or contact an administrator.")
+    finally:
+        dm_router.close(user.id)
+        if not keep_checkpoint:
+            session_store.finish(user.id)
+            admission.release(user.id)
+
+def start_screenshot_download(user, guild, url):
+    """Store the screenshot in the background while the user carries on"""
+    screenshot_jobs[user.id] = asyncio.create_task(screenshot_store.ingest(url, user.id, guild.id))
+
+async def collect_screenshot(user, guild, url):
+    """Wait briefly for the stored screenshot; None if it isn't available"""
+    task = screenshot_jobs.pop(user.id, None)
+    if task is None:
+        # Resumed session: the download didn't survive the restart
+        task = asyncio.create_task(screenshot_store.ingest(url, user.id, guild.id))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=config.get('screenshot_wait_seconds', 15))
+    except asyncio.TimeoutError:
+        logger.warning(f"Screenshot from {user} is still downloading; posting the link instead", extra=log_context(user, guild, step='screenshot'))
+    except ScreenshotError as e:
+        logger.warning(f"Could not store screenshot from {user}: {e}", extra=log_context(user, guild, step='screenshot'))
+    return None
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def submit_for_review(user, guild, answers, image_url, notify=True):
+    """Post a completed questionnaire to the review channel. Returns whether it was posted.
+    With `notify` the user is DMed the outcome; otherwise the caller tells them."""
+    settings = guild_config.for_guild(guild)
+
+    if settings.review_channel_id is None:
+        if notify:
+            await scheduler.send(user, "❌ Bot configuration error. Please contact an administrator.")
+        logger.error(f"Review channel ID not configured properly for guild {guild.id}")
+        return False
+
+    vr_channel = settings.review_channel
+    if vr_channel is None:
+        if notify:
+            await scheduler.send(user, "❌ Review channel not found. Please contact an administrator.")
+        logger.error(f"Review channel {settings.review_channel_id} not found or bot lacks access")
+        return False
 
-        # Extract actual ID from mention format if needed
-        clean_channel_id = extract_id(review_channel_id)
-        vr_channel = guild.get_channel(int(clean_channel_id))
-        if vr_channel is None:
-            await user.send("❌ Review channel not found. Please contact an administrator.")
-            logger.error(f"Review channel {review_channel_id} not found or bot lacks access")
-            return
+    account_age_days = (discord.utils.utcnow() - user.created_at).days
 
-        # Create review embed
-        review_embed = discord.Embed(
-            title="🔞 NSFW Verification Request",
-            color=0xffa500,
-            timestamp=discord.utils.utcnow()
-        )
-        review_embed.add_field(name="👤 User", value=f"{user.mention} ({user})", inline=False)
-        review_embed.add_field(name="🆔 Username & ID", value=answers[0], inline=False)
-        review_embed.add_field(name="🎂 Age", value=answers[1], inline=True)
-        review_embed.add_field(name="✅ Consent", value=answers[2], inline=True)
-        review_embed.add_field(name="📜 Agreed to Rules", value=answers[3], inline=True)
-        review_embed.add_field(name="📅 Account Created", value=user.created_at.strftime("%Y-%m-%d"), inline=True)
-        review_embed.add_field(name="⏰ Account Age", value=f"{account_age_days} days", inline=True)
+    # Create review embed
+    review_embed = discord.Embed(
+        title="🔞 NSFW Verification Request",
+        color=0xffa500,
+        timestamp=discord.utils.utcnow()
+    )
+    review_embed.add_field(name="👤 User", value=f"{user.mention} ({user})", inline=False)
+    review_embed.add_field(name="🆔 Username & ID", value=answers[0], inline=False)
+    review_embed.add_field(name="🎂 Age", value=answers[1], inline=True)
+    review_embed.add_field(name="✅ Consent", value=answers[2], inline=True)
+    review_embed.add_field(name="📜 Agreed to Rules", value=answers[3], inline=True)
+    review_embed.add_field(name="📅 Account Created", value=user.created_at.strftime("%Y-%m-%d"), inline=True)
+    review_embed.add_field(name="⏰ Account Age", value=f"{account_age_days} days", inline=True)
+    screenshot = await collect_screenshot(user, guild, image_url) if image_url.startswith('http') else None
+    files = {}
+    if screenshot is not None and screenshot.review_path is not None:
+        # Attach the cleaned, downscaled copy; the CDN link in the user's DM expires
+        image_bytes = await asyncio.to_thread(read_file, screenshot.review_path)
+        files['file'] = discord.File(io.BytesIO(image_bytes), filename="screenshot.jpg")
+        review_embed.add_field(name="🖼️ Age Verification", value=f"Stored copy below (`{screenshot.sha256[:12]}`)", inline=False)
+        review_embed.set_image(url="attachment://screenshot.jpg")
+    else:
         review_embed.add_field(name="🖼️ Age Verification", value=f"[View Screenshot]({image_url})", inline=False)
-        review_embed.set_thumbnail(url=user.display_avatar.url)
-
-        view = View(timeout=None)
-        view.add_item(Button(
-            label="✅ Approve", 
-            style=discord.ButtonStyle.success, 
-            custom_id=f"approve_{user.id}"
-        ))
-        view.add_item(Button(
-            label="❌ Reject", 
-            style=discord.ButtonStyle.danger, 
-            custom_id=f"reject_{user.id}"
-        ))
-
-        await vr_channel.send(embed=review_embed, view=view)
-        await user.send(
+    if screenshot is not None and screenshot.matches:
+        review_embed.add_field(
+            name="⚠️ Possibly Reused Screenshot",
+            value="\n".join(
+                f"<@{other_id}> - {'identical image' if distance == 0 else f'similar image ({distance}/64 bits differ)'}"
+                for other_id, _, distance in screenshot.matches[:5]
+            ),
+            inline=False
+        )
+        logger.warning(f"Screenshot from {user} matches {len(screenshot.matches)} earlier submissions", extra=log_context(user, guild, step='screenshot'))
+        metrics.screenshot_reuse.inc(kind="identical" if screenshot.matches[0][2] == 0 else "similar")
+    review_embed.set_thumbnail(url=user.display_avatar.url)
+
+    view = View(timeout=None)
+    view.add_item(ReviewDecisionButton(True, user.id))
+    view.add_item(ReviewDecisionButton(False, user.id))
+
+    review_message = await scheduler.send(vr_channel, embed=review_embed, view=view, priority=PRIORITY_MODERATION, **files)
+    review_queue.add(ReviewEntry(
+        guild_id=guild.id,
+        user_id=user.id,
+        channel_id=vr_channel.id,
+        message_id=review_message.id,
+        display_name=str(user),
+        answers=list(answers),
+        image_url=image_url,
+        has_screenshot=image_url.startswith('http'),
+        account_created_at=user.created_at.timestamp()
+    ))
+    # Keep the member at hand for the moderator's decision
+    members.put(user)
+    if notify:
+        await scheduler.send(user,
             "✅ **Verification submitted successfully!**\n\n"
             "Your verification request has been sent to the moderation team for review.\n"
             "You will receive a DM with the result once it's processed.\n\n"
             "Thank you for your patience! 🙏"
         )
 
-        logger.info(f"Verification request submitted for {user}")
+    logger.info(f"Verification request submitted for {user}", extra=log_context(user, guild, step='submitted'))
+    metrics.verifications_completed.inc()
+    funnel.stage(guild.id, SUBMITTED)
+    return True
 
-    except discord.Forbidden:
-        await interaction.response.send_message(
-            "❌ I couldn't send you a DM. Please:\n"
-            "1. Enable DMs from server members\n"
-            "2. Make sure you haven't blocked the bot\n"
-            "3. Try again after adjusting your privacy settings", 
-            ephemeral=True
-        )
-        logger.info(f"Could not DM {user} for verification")
-    except Exception as e:
-        logger.error(f"Error in verification process for {user}: {e}")
-        await user.send("❌ An error occurred during verification. Please try again or contact an administrator.")
-
-def extract_id(id_string):
-    """Extract ID from mention format or return as-is if already an ID"""
-    if isinstance(id_string, str):
-        # Remove role mention format <@&123456789> -> 123456789
-        if id_string.startswith('<@&') and id_string.endswith('>'):
-            return id_string[3:-1]
-        # Remove channel mention format <#123456789> -> 123456789
-        elif id_string.startswith('<#') and id_string.endswith('>'):
-            return id_string[2:-1]
-        # Remove user mention format <@123456789> -> 123456789
-        elif id_string.startswith('<@') and id_string.endswith('>'):
-            return id_string[2:-1]
-    return str(id_string)
-
-async def handle_approval(interaction, custom_id):
-    """Handle verification approval"""
-    user_id = int(custom_id.split("_")[1])
-    guild = interaction.guild
-    user = guild.get_member(user_id)
-
-    if not user:
-        await interaction.response.send_message("❌ User not found in server.", ephemeral=True)
-        return
-
-    verified_role_id = config['verified_role_id']
-    if verified_role_id == "REPLACE_WITH_YOUR_VERIFIED_ROLE_ID":
-        await interaction.response.send_message("❌ Verified role not configured.", ephemeral=True)
-        logger.error("Verified role ID not configured properly")
-        return
+async def resume_sessions(sessions):
+    """Pick checkpointed questionnaires back up after a restart"""
+    for session in sessions:
+        guild = bot.get_guild(session.guild_id)
+        try:
+            user = await members.resolve(guild, session.user_id) if guild else None
+        except discord.HTTPException as e:
+            logger.error(f"Could not fetch member {session.user_id} to resume verification: {e}")
+            session_store.finish(session.user_id)
+            admission.release(session.user_id)
+            continue
+        if user is None:
+            session_store.finish(session.user_id)
+            admission.release(session.user_id)
+            logger.info(f"Dropped checkpointed session for {session.user_id} - user or guild no longer available")
+            continue
+
+        if dm_router.open(user.id) is None:
+            continue
 
-    # Extract actual ID from mention format if needed
-    clean_role_id = extract_id(verified_role_id)
-    role = guild.get_role(int(clean_role_id))
-    if not role:
-        await interaction.response.send_message("❌ Verified role not found.", ephemeral=True)
-        logger.error(f"Verified role {verified_role_id} not found")
-        return
+        try:
+            await scheduler.send(user,
+                "🔄 **Verification resumed**\n\n"
+                "The bot restarted while you were verifying. Let's continue where you left off."
+            )
+        except discord.Forbidden:
+            dm_router.close(user.id)
+            session_store.finish(user.id)
+            admission.release(user.id)
+            logger.info(f"Could not DM {user} to resume verification")
+            continue
+
+        start_questionnaire(user, guild)
+        logger.info(f"Resumed verification for {user} at step {session.step + 1}", extra=log_context(user, guild, step=session.step + 1))
+
+        # Spread the resume DMs out instead of sending them all at once
+        await asyncio.sleep(config.get('session_resume_interval_seconds', 0.5))
+
+APPROVAL_DM = (
+    "🎉 **Verification Approved!**\n\n"
+    "Congratulations! You have been approved for NSFW access.\n"
+    "You can now access all NSFW channels and content in the server.\n\n"
+    "Please remember to follow all server rules and guidelines. Enjoy! ✨"
+)
 
-    try:
-        await user.add_roles(role, reason=f"NSFW verification approved by {interaction.user}")
-        await interaction.response.send_message(f"✅ **Approved** {user.mention} for NSFW access.", ephemeral=True)
+REJECTION_DM = (
+    "❌ **Verification Rejected**\n\n"
+    "Unfortunately, your NSFW verification request has been rejected.\n\n"
+    "This could be due to:\n"
+    "• Insufficient age verification\n"
+    "• Incomplete or unclear responses\n"
+    "• Not meeting server requirements\n\n"
+    "If you believe this was an error, please contact a moderator directly."
+)
 
-        # Update the original message
-        embed = interaction.message.embeds[0]
+def mark_decided(embed, approved, moderator):
+    """Restyle a review embed to show the moderator's decision"""
+    if approved:
         embed.color = 0x00ff00  # Green
         embed.title = "✅ NSFW Verification - APPROVED"
-        embed.add_field(name="📋 Action", value=f"Approved by {interaction.user.mention}", inline=False)
+        embed.add_field(name="📋 Action", value=f"Approved by {moderator.mention}", inline=False)
+    else:
+        embed.color = 0xff0000  # Red
+        embed.title = "❌ NSFW Verification - REJECTED"
+        embed.add_field(name="📋 Action", value=f"Rejected by {moderator.mention}", inline=False)
+    return embed
+
+# Review posts decided in this process that the review queue didn't know about
+decided_untracked_posts = set()
+
+def untracked_review_entry(interaction, user_id, status):
+    """Entry for a review post the queue doesn't know, e.g. one posted before it existed.
+
+    None if the post already shows a decision.
+    """
+    message = interaction.message
+    if message is None or message.id in decided_untracked_posts:
+        return None
+    if message.embeds and (message.embeds[0].title or "").endswith(("APPROVED", "REJECTED")):
+        return None
+    decided_untracked_posts.add(message.id)
+    member = interaction.guild.get_member(user_id)
+    return ReviewEntry(
+        guild_id=interaction.guild.id,
+        user_id=user_id,
+        channel_id=message.channel.id,
+        message_id=message.id,
+        display_name=str(member) if member is not None else str(user_id),
+        answers=[],
+        image_url=None,
+        has_screenshot=False,
+        account_created_at=discord.utils.snowflake_time(user_id).timestamp(),
+        submitted_at=message.created_at.timestamp(),
+        status=status
+    )
 
-        await interaction.edit_original_response(embed=embed, view=None)
+async def handle_review_decision(interaction, user_id, approved):
+    """Handle an Approve or Reject click on a review post"""
+    # Acknowledge first; the role grant, DM and embed edit happen in the review worker
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    # Claiming the entry makes a second click, or a second moderator, a no-op
+    status = APPROVED if approved else REJECTED
+    entry = review_queue.resolve(interaction.guild.id, user_id, status, interaction.user.id)
+    if entry is None:
+        entry = untracked_review_entry(interaction, user_id, status)
+    if entry is None:
+        await interaction.followup.send("⚠️ This request has already been decided.", ephemeral=True)
+        return
 
+    problem = await review_worker.submit(entry, approved, interaction.user, interaction.message)
+    if problem is not None:
+        await interaction.followup.send(f"❌ Could not {'approve' if approved else 'reject'} {problem}", ephemeral=True)
+    elif approved:
+        await interaction.followup.send(f"✅ **Approved** <@{user_id}> for NSFW access.", ephemeral=True)
+    else:
+        await interaction.followup.send(f"❌ **Rejected** <@{user_id}>'s verification request.", ephemeral=True)
+
+async def update_review_message(entry, approved, moderator, message=None):
+    """Restyle the original review post after a decision.
+
+    `message` is the post when the decision came from its buttons; decisions made from
+    /queue fetch it first.
+    """
+    if message is None:
+        channel = bot.get_channel(entry.channel_id) or await bot.fetch_channel(entry.channel_id)
+        message = await channel.fetch_message(entry.message_id)
+    # A copy, so a retried edit doesn't mark the embed twice
+    embed = mark_decided(message.embeds[0].copy(), approved, moderator)
+    await message.edit(embed=embed, view=None)
+
+async def retry_transient(factory, attempts=3, delay=1.0):
+    """Await `factory()`, retrying server errors and timeouts with backoff. Only for idempotent requests."""
+    for attempt in range(1, attempts + 1):
         try:
-            await user.send(
-                "🎉 **Verification Approved!**\n\n"
-                "Congratulations! You have been approved for NSFW access.\n"
-                "You can now access all NSFW channels and content in the server.\n\n"
-                "Please remember to follow all server rules and guidelines. Enjoy! ✨"
-            )
-        except discord.Forbidden:
-            logger.info(f"Could not DM approval notification to {user}")
-
-        logger.info(f"NSFW verification approved for {user} by {interaction.user}")
-
+            return await factory()
+        except (discord.DiscordServerError, asyncio.TimeoutError, OSError) as e:
+            # discord.py has already retried the request itself by the time these surface
+            if attempt == attempts:
+                raise
+            logger.warning(f"Retrying after a transient error ({attempt}/{attempts}): {e}")
+            await asyncio.sleep(delay * 2 ** (attempt - 1))
+
+def log_background_failure(description):
+    """Done-callback that logs a failed fire-and-forget scheduler job"""
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Could not {description}: {future.exception()}")
+    return callback
+
+def queue_review_update(decision, user):
+    """Mark the review post decided in the background; the moderator's summary doesn't wait on it"""
+    entry = decision.entry
+    update = asyncio.ensure_future(retry_transient(lambda: scheduler.run(
+        f"channel:{entry.channel_id}",
+        lambda: update_review_message(entry, decision.approved, decision.moderator, decision.message),
+        priority=PRIORITY_COSMETIC
+    )))
+    update.add_done_callback(log_background_failure(f"update the review message for {user}"))
+
+def record_absent_decision(decision, guild):
+    """Record a decision on someone who left before it was applied, so rejoining restores an approval"""
+    entry = decision.entry
+    decision_name = "approved" if decision.approved else "rejected"
+    ledger.record(entry.user_id, guild.id, decision_name, decision.moderator.id)
+    queue_review_update(decision, entry.display_name)
+    logger.info(f"NSFW verification {decision_name} for {entry.display_name}, who has left, by {decision.moderator}", extra=log_context(guild=guild))
+    metrics.verification_decisions.inc(decision=decision_name)
+    return f"{entry.display_name}: no longer in the server; the decision is recorded in case they rejoin"
+
+async def apply_review_decision(decision):
+    """Apply one queued decision. Returns None on success, or a short description of the problem."""
+    entry = decision.entry
+    guild = bot.get_guild(entry.guild_id)
+    if guild is None:
+        review_queue.reopen(entry)
+        return f"{entry.display_name}: server unavailable"
+
+    user = None
+    try:
+        user = await members.resolve(guild, entry.user_id)
+        if user is None:
+            return record_absent_decision(decision, guild)
+        if decision.approved:
+            role = guild_config.for_guild(guild).verified_role
+            if role is None:
+                review_queue.reopen(entry)
+                return f"{entry.display_name}: verified role not configured"
+            # Granting a role is idempotent, so it is safe to retry
+            if role not in user.roles:
+                await retry_transient(lambda: scheduler.run(
+                    f"roles:{guild.id}",
+                    lambda: user.add_roles(role, reason=f"NSFW verification approved by {decision.moderator}")
+                ))
     except discord.Forbidden:
-        await interaction.response.send_message("❌ I don't have permission to assign roles.", ephemeral=True)
-        logger.error(f"No permission to assign role to {user}")
+        logger.error(f"No permission to assign role to {user}", extra=log_context(user, guild))
+        review_queue.reopen(entry)
+        return f"{entry.display_name}: missing permission to assign roles"
     except Exception as e:
-        await interaction.response.send_message("❌ An error occurred while approving.", ephemeral=True)
-        logger.error(f"Error approving {user}: {e}")
-
-async def handle_rejection(interaction, custom_id):
-    """Handle verification rejection"""
-    user_id = int(custom_id.split("_")[1])
-    guild = interaction.guild
-    user = guild.get_member(user_id)
+        logger.error(f"Error applying the decision for {user or entry.display_name}: {e}", extra=log_context(user, guild))
+        review_queue.reopen(entry)
+        return f"{entry.display_name}: {e}"
+
+    # The moderator's summary doesn't wait on the DM or the embed edit
+    notification = scheduler.send(user, APPROVAL_DM if decision.approved else REJECTION_DM)
+    notification.add_done_callback(log_background_failure(f"DM the decision to {user}"))
+    queue_review_update(decision, user)
+
+    decision_name = "approved" if decision.approved else "rejected"
+    ledger.record(user.id, guild.id, decision_name, decision.moderator.id)
+    if decision.approved:
+        schedule_expiry(guild, user.id, time.time())
+    logger.info(f"NSFW verification {decision_name} for {user} by {decision.moderator}", extra=log_context(user, guild))
+    metrics.verification_decisions.inc(decision=decision_name)
+    funnel.stage(guild.id, decision_name)
+    funnel.duration(guild.id, REVIEW, time.time() - entry.submitted_at)
+    return None
+
+async def apply_review_batch(batch):
+    """Apply a batch of queued decisions concurrently; one result per decision"""
+    results = await asyncio.gather(*(apply_review_decision(decision) for decision in batch), return_exceptions=True)
+    # A decision that failed after its role change was applied isn't reopened, only reported
+    return [f"{decision.entry.display_name}: {result}" if isinstance(result, BaseException) else result
+            for decision, result in zip(batch, results)]
+
+review_worker = ReviewWorker(apply_review_batch)
+
+def next_reconcile_time(guild_id):
+    """The next nightly reconciliation, at reconcile_hour_utc plus a per-guild offset within the hour"""
+    now = time.time()
+    due = now // 86400 * 86400 + reconcile_hour_utc * 3600 + guild_id % 3600
+    return due if due > now else due + 86400
+
+def schedule_expiry(guild, user_id, approved_at):
+    """Schedule when an approval runs out, and the reminder before that. False if it never does."""
+    settings = guild_config.for_guild(guild)
+    if not settings.valid_days:
+        deadlines.cancel(EXPIRE, guild.id, user_id)
+        deadlines.cancel(REMIND, guild.id, user_id)
+        return False
+    expires_at = approved_at + settings.valid_days * 86400
+    deadlines.schedule(EXPIRE, guild.id, user_id, expires_at)
+    if settings.reminder_days:
+        deadlines.schedule(REMIND, guild.id, user_id, expires_at - settings.reminder_days * 86400)
+    return True
+
+def ensure_expiry(guild_id, user_id, decision):
+    """Give a role holder's approval an expiry if it has none, e.g. from before expiry was turned on"""
+    guild = bot.get_guild(guild_id)
+    settings = guild_config.for_guild(guild)
+    if not settings.valid_days or deadlines.get(EXPIRE, guild_id, user_id) is not None:
+        return False
+    # Approvals already past their expiry get the reminder period as notice
+    notice = max(settings.reminder_days, 1) * 86400
+    approved_at = max(decision.decided_at, time.time() + notice - settings.valid_days * 86400)
+    return schedule_expiry(guild, user_id, approved_at)
+
+async def remind_reverification(guild, user_id):
+    """DM a verified member that their verification runs out soon"""
+    settings = guild_config.for_guild(guild)
+    expires_at = deadlines.get(EXPIRE, guild.id, user_id)
+    if not settings.valid_days or expires_at is None or settings.verified_role is None:
+        return
+    member = await members.resolve(guild, user_id)
+    if member is None or settings.verified_role not in member.roles:
+        return
+    try:
+        await scheduler.send(member,
+            f"⏰ **Your NSFW verification in {guild.name} expires <t:{int(expires_at)}:R>.**\n\n"
+            "To keep access, click the 🔞 Verify Me button in the server again and complete the verification before then."
+        )
+    except discord.Forbidden:
+        logger.info(f"Could not DM {member} a re-verification reminder", extra=log_context(member, guild, step='reminder'))
+        return
+    metrics.verification_expiry.inc(event="reminded")
 
-    if not user:
-        await interaction.response.send_message("❌ User not found in server.", ephemeral=True)
+async def expire_verification(guild, user_id):
+    """Take the verified role away once an approval runs out"""
+    settings = guild_config.for_guild(guild)
+    if not settings.valid_days:
         return
+    role = settings.verified_role
+    member = await members.resolve(guild, user_id)
+    if member is not None and role is not None and role in member.roles:
+        try:
+            await retry_transient(lambda: scheduler.run(
+                f"roles:{guild.id}",
+                lambda: member.remove_roles(role, reason="NSFW verification expired")
+            ))
+        except discord.Forbidden:
+            logger.error(f"No permission to remove the expired verified role from {member}", extra=log_context(member, guild, step='expiry'))
+
+    # Recorded even if they left, so the role isn't restored when they rejoin
+    ledger.record(user_id, guild.id, EXPIRED, source=SOURCE_EXPIRY)
+    metrics.verification_expiry.inc(event="expired")
+    logger.info(f"NSFW verification expired for {member or user_id}", extra=log_context(member, guild, step='expiry'))
+    if member is not None:
+        notification = scheduler.send(member,
+            f"⌛ **Your NSFW verification in {guild.name} has expired.**\n\n"
+            "Click the 🔞 Verify Me button in the server to verify again."
+        )
+        notification.add_done_callback(log_background_failure(f"DM the expiry to {member}"))
 
-    try:
-        await interaction.response.send_message(f"❌ **Rejected** {user.mention}'s verification request.", ephemeral=True)
+async def fetch_member_page(guild_id, limit, after):
+    return await scheduler.run(
+        f"members:{guild_id}",
+        lambda: bot.http.get_members(guild_id, limit, after),
+        priority=PRIORITY_COSMETIC
+    )
 
-        # Update the original message
-        embed = interaction.message.embeds[0]
-        embed.color = 0xff0000  # Red
-        embed.title = "❌ NSFW Verification - REJECTED"
-        embed.add_field(name="📋 Action", value=f"Rejected by {interaction.user.mention}", inline=False)
+async def remove_unentitled_role(guild_id, user_id, role_id):
+    await retry_transient(lambda: scheduler.run(
+        f"roles:{guild_id}",
+        lambda: bot.http.remove_role(guild_id, user_id, role_id, reason="Verified role without a recorded approval"),
+        priority=PRIORITY_COSMETIC
+    ))
 
-        await interaction.edit_original_response(embed=embed, view=None)
+async def run_reconciliation(guild):
+    """Reconcile a guild's verified role holders with the ledger. Returns the report, or None if it's off."""
+    settings = guild_config.for_guild(guild)
+    if settings.verified_role_id is None or settings.reconcile == 'off':
+        return None
+    report = await reconciler.run(
+        guild.id,
+        settings.verified_role_id,
+        settings.trusted_guilds,
+        remove=settings.reconcile == 'remove'
+    )
+    metrics.verified_role_reconciled.inc(len(report.unentitled), result="unentitled")
+    metrics.verified_role_reconciled.inc(report.removed, result="removed")
+    metrics.verified_role_reconciled.inc(report.failed, result="failed")
+    return report
+
+async def handle_deadline(kind, guild_id, user_id):
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        # Unavailable for now; the scheduler retries (deadlines of guilds the bot left are cancelled)
+        raise RuntimeError(f"guild {guild_id} is not available")
+    if kind == REMIND:
+        await remind_reverification(guild, user_id)
+    elif kind == EXPIRE:
+        await expire_verification(guild, user_id)
+    elif kind == RECONCILE:
+        settings = guild_config.for_guild(guild)
+        if settings.verified_role_id is None or settings.reconcile == 'off':
+            return
+        # Book the next night first, so a failed run doesn't stop the schedule
+        deadlines.schedule(RECONCILE, guild_id, 0, next_reconcile_time(guild_id))
+        await run_reconciliation(guild)
+
+# Verification expiry, reminders and the nightly reconciliation, all from one persisted deadline heap
+reconcile_hour_utc = config.get('reconcile_hour_utc', 4)
+deadlines = DeadlineScheduler(db, handle_deadline)
+reconciler = RoleReconciler(
+    ledger,
+    fetch_member_page,
+    remove_unentitled_role,
+    ensure_expiry,
+    max_removals=config.get('reconcile_max_removals', 500)
+)
 
-        try:
-            await user.send(
-                "❌ **Verification Rejected**\n\n"
-                "Unfortunately, your NSFW verification request has been rejected.\n\n"
-                "This could be due to:\n"
-                "• Insufficient age verification\n"
-                "• Incomplete or unclear responses\n"
-                "• Not meeting server requirements\n\n"
-                "If you believe this was an error, please contact a moderator directly."
+class ReviewQueueView(View):
+    """Paginated, filterable view of the pending review queue with bulk actions"""
+
+    page_size = 10
+
+    def __init__(self, moderator, guild, filters):
+        super().__init__(timeout=900)
+        self.moderator = moderator
+        self.guild = guild
+        self.filters = filters
+        self.page = 0
+        self.selected = []
+        self.entries = []
+        self.refresh_entries()
+
+    def refresh_entries(self):
+        self.entries = review_queue.pending(self.guild.id, **self.filters)
+        self.page = min(self.page, max(0, (len(self.entries) - 1) // self.page_size))
+        self.selected = []
+        self.rebuild()
+
+    def page_entries(self):
+        start = self.page * self.page_size
+        return self.entries[start:start + self.page_size]
+
+    def rebuild(self):
+        self.clear_items()
+        entries = self.page_entries()
+        if entries:
+            select = discord.ui.Select(
+                placeholder="Select requests…",
+                min_values=1,
+                max_values=len(entries),
+                options=[
+                    discord.SelectOption(
+                        label=entry.display_name[:100],
+                        value=str(entry.user_id),
+                        description=f"Account {entry.account_age_days}d old • {'📸' if entry.has_screenshot else 'no screenshot'}"
+                    )
+                    for entry in entries
+                ],
+                row=0
             )
-        except discord.Forbidden:
-            logger.info(f"Could not DM rejection notification to {user}")
-
-        logger.info(f"NSFW verification rejected for {user} by {interaction.user}")
+            select.callback = self.on_select
+            self.add_item(select)
+
+        page_count = max(1, -(-len(self.entries) // self.page_size))
+        for label, style, callback, disabled in (
+            ("◀", discord.ButtonStyle.secondary, self.on_previous, self.page == 0),
+            ("▶", discord.ButtonStyle.secondary, self.on_next, self.page >= page_count - 1),
+            ("✅ Approve selected", discord.ButtonStyle.success, self.on_approve, not entries),
+            ("❌ Reject selected", discord.ButtonStyle.danger, self.on_reject, not entries),
+            ("🔁 Refresh", discord.ButtonStyle.secondary, self.on_refresh, False),
+        ):
+            button = Button(label=label, style=style, disabled=disabled, row=1)
+            button.callback = callback
+            self.add_item(button)
+
+    def render(self):
+        page_count = max(1, -(-len(self.entries) // self.page_size))
+        embed = discord.Embed(
+            title="📥 Verification Review Queue",
+            description=f"**{len(self.entries)}** pending request(s) • page {self.page + 1}/{page_count}",
+            color=0xff6b6b
+        )
+        for entry in self.page_entries():
+            waiting = int((time.time() - entry.submitted_at) // 60)
+            embed.add_field(
+                name=entry.display_name,
+                value=(
+                    f"<@{entry.user_id}> • account {entry.account_age_days}d old • waiting {waiting}m\n"
+                    f"{'📸 Screenshot' if entry.has_screenshot else '🚫 No screenshot'} • [View request]({entry.jump_url})"
+                ),
+                inline=False
+            )
+        active_filters = [f"{key}={value}" for key, value in self.filters.items() if value is not None]
+        if active_filters:
+            embed.set_footer(text=f"Filters: {', '.join(active_filters)}")
+        return embed
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.moderator.id
+
+    async def on_select(self, interaction):
+        self.selected = [int(value) for value in interaction.data.get('values', [])]
+        await interaction.response.defer()
+
+    async def on_previous(self, interaction):
+        self.page = max(0, self.page - 1)
+        self.selected = []
+        self.rebuild()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def on_next(self, interaction):
+        self.page += 1
+        self.selected = []
+        self.rebuild()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def on_refresh(self, interaction):
+        self.refresh_entries()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def on_approve(self, interaction):
+        await self.decide(interaction, True)
+
+    async def on_reject(self, interaction):
+        await self.decide(interaction, False)
+
+    async def decide(self, interaction, approved):
+        if not self.selected:
+            await interaction.response.send_message("❌ Select one or more requests first.", ephemeral=True)
+            return
 
-    except Exception as e:
-        await interaction.response.send_message("❌ An error occurred while rejecting.", ephemeral=True)
-        logger.error(f"Error rejecting {user}: {e}")
+        status = APPROVED if approved else REJECTED
+        futures = []
+        for user_id in self.selected:
+            # Entries decided elsewhere in the meantime come back as None
+            entry = review_queue.resolve(self.guild.id, user_id, status, interaction.user.id)
+            if entry is not None:
+                futures.append(review_worker.submit(entry, approved, interaction.user))
+
+        # Show the updated page right away; the worker applies the decisions in the background
+        self.refresh_entries()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+        problems = [problem for problem in await asyncio.gather(*futures) if problem is not None]
+        action = "Approved" if approved else "Rejected"
+        summary = f"{'✅' if approved else '❌'} {action} {len(futures) - len(problems)} of {len(futures)} request(s)."
+        if problems:
+            summary += "\n" + "\n".join(f"• {problem}" for problem in problems[:10])
+        await interaction.followup.send(summary, ephemeral=True)
 
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -558,8 +2205,14 @@ if __name__ == "__main__":
         exit(1)
 
     try:
-        bot.run(token)
+        # log_handler=None keeps discord.py from attaching its own synchronous handler to the root logger
+        bot.run(token, log_handler=None)
     except discord.LoginFailure:
         logger.error("Invalid bot token")
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
+    finally:
+        if traffic_recorder is not None:
+            traffic_recorder.close()
+        funnel.flush()
+        db.close()
@@ -0,0 +1,85 @@
+"""
+Member Cache
+Small TTL/LRU cache of guild members for the "lean" cache profile, where discord.py
+keeps no member cache of its own. Only the members the bot actually touches (users
+verifying and users being approved or rejected) are held, and only for a while. A member
+is dropped as soon as the gateway reports them updated or gone, so their roles and
+membership are never older than the last event about them.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class MemberCache:
+    """Resolves members from the guild cache, then this cache, then the REST API"""
+
+    def __init__(self, max_size=1024, ttl=900):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, member):
+        """Remember a member the bot has just seen, e.g. from an interaction payload"""
+        if not isinstance(member, discord.Member):
+            return
+        key = (member.guild.id, member.id)
+        self._entries[key] = (time.monotonic() + self.ttl, member)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, guild_id, user_id):
+        self._entries.pop((guild_id, user_id), None)
+
+    def install(self, state):
+        """Evict members on GUILD_MEMBER_UPDATE and GUILD_MEMBER_REMOVE; call before connecting.
+
+        The parsers are wrapped rather than listened to because discord.py only dispatches
+        member_update, and member_remove, for members in its own cache.
+        """
+        for event in ('GUILD_MEMBER_UPDATE', 'GUILD_MEMBER_REMOVE'):
+            state.parsers[event] = self._evicting(state.parsers[event])
+
+    def _evicting(self, parser):
+        def parse(data):
+            self.invalidate(int(data['guild_id']), int(data['user']['id']))
+            return parser(data)
+        return parse
+
+    def get(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, member = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return member
+
+    async def resolve(self, guild, user_id):
+        """Return the member, fetching it over REST if needed; None if they left the guild"""
+        member = guild.get_member(user_id) or self.get(guild.id, user_id)
+        if member is not None:
+            self.hits += 1
+            return member
+
+        self.misses += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        self.put(member)
+        return member
@@ -0,0 +1,220 @@
+"""
+Metrics and Health Endpoint
+Prometheus-style counters, gauges and histograms, plus a small aiohttp server that
+runs on the bot's own event loop and serves /metrics and /health.
+"""
+
+import bisect
+import json
+import logging
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STEP_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.function is not None:
+            # Labelled gauges take a mapping of label-value tuples to values
+            value = self.function()
+            self._values = dict(value) if self.labelnames else {(): value}
+        return super()._samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket counts (last slot is +Inf), then sum
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+verifications_started = REGISTRY.register(Counter(
+    "verifications_started_total", "Verification flows started", ["flow"]))
+verification_clicks = REGISTRY.register(Counter(
+    "verification_clicks_total", "Verify button clicks by admission outcome", ["outcome"]))
+verifications_completed = REGISTRY.register(Counter(
+    "verifications_completed_total", "Verifications submitted for review"))
+verifications_cancelled = REGISTRY.register(Counter(
+    "verifications_cancelled_total", "Verifications that ended before submission", ["step", "reason"]))
+verification_decisions = REGISTRY.register(Counter(
+    "verification_decisions_total", "Moderator decisions on verification requests", ["decision"]))
+verification_step_seconds = REGISTRY.register(Histogram(
+    "verification_step_seconds", "Time users spend on each questionnaire step", ["step"], buckets=STEP_BUCKETS))
+interaction_handler_seconds = REGISTRY.register(Histogram(
+    "interaction_handler_seconds", "Interaction handler latency", ["handler"]))
+verified_role_restored = REGISTRY.register(Counter(
+    "verified_role_restored_total", "Verified roles given back on join from an earlier approval", ["source"]))
+verification_expiry = REGISTRY.register(Counter(
+    "verification_expiry_total", "Re-verification reminders sent and verifications expired", ["event"]))
+verified_role_reconciled = REGISTRY.register(Counter(
+    "verified_role_reconciled_total", "Verified role holders found without an approval, and what was done", ["result"]))
+raid_lockdown_transitions = REGISTRY.register(Counter(
+    "raid_lockdown_transitions_total", "Guilds entering and leaving raid lockdown", ["state", "trigger"]))
+slow_callbacks = REGISTRY.register(Counter(
+    "event_loop_slow_callbacks_total", "Event-loop callbacks that ran longer than slow_callback_ms"))
+event_loop_lag = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+rest_rate_limited = REGISTRY.register(Counter(
+    "discord_rest_rate_limited_total", "REST requests that came back 429"))
+active_sessions = REGISTRY.register(Gauge(
+    "verification_active_sessions", "Verification sessions in progress"))
+startup_first_interaction_seconds = REGISTRY.register(Gauge(
+    "startup_first_interaction_seconds", "Time from process start to the first interaction", ["connect"]))
+startup_phase_seconds = REGISTRY.register(Gauge(
+    "startup_phase_seconds", "Time from process start to the end of each startup phase", ["phase"]))
+gateway_latency = REGISTRY.register(Gauge(
+    "discord_gateway_latency_seconds", "Gateway heartbeat round-trip time", ["shard"]))
+send_queue_depth = REGISTRY.register(Gauge(
+    "send_queue_depth", "Outbound requests waiting in the send scheduler"))
+guilds_in_lockdown = REGISTRY.register(Gauge(
+    "raid_guilds_in_lockdown", "Guilds currently in raid lockdown"))
+screenshot_reuse = REGISTRY.register(Counter(
+    "verification_screenshot_reuse_total", "Screenshots matching another user's earlier submission", ["kind"]))
+
+
+class RateLimitCounter(logging.Filter):
+    """Counts 429 responses from the warnings discord.http logs for them"""
+
+    def filter(self, record):
+        if "responded with 429" in record.getMessage():
+            rest_rate_limited.inc()
+        return True
+
+
+def install_rate_limit_counter():
+    logging.getLogger("discord.http").addFilter(RateLimitCounter())
+
+
+class MetricsServer:
+    """Serves /metrics and /health from the bot's event loop"""
+
+    def __init__(self, health_check, host="0.0.0.0", port=8080):
+        self.health_check = health_check
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        app.router.add_get("/health", self._health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics server listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics(self, request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    async def _health(self, request):
+        healthy, details = self.health_check()
+        details["status"] = "ok" if healthy else "unhealthy"
+        details["checked_at"] = time.time()
+        return web.Response(
+            text=json.dumps(details),
+            content_type="application/json",
+            status=200 if healthy else 503
+        )
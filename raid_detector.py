@@ -0,0 +1,297 @@
+"""
+Raid Detection
+Watches each guild for the signs of a raid: a burst of joins, a burst of Verify clicks,
+or many of the accounts involved having been created around the same time, which is
+how batches of bought or farmed accounts give themselves away even when they are old
+enough to pass the account age check.
+
+Joins and clicks are counted in sliding windows made of a fixed ring of time slots, and
+the creation times of the most recent accounts seen are kept in a fixed-size sample,
+so a guild costs the same memory during a raid as on a quiet day. Clicks and the cluster
+sample count each account once per window: one impatient user clicking Verify over and
+over, or a join followed by a click, is a single account, not a burst. When a signal crosses
+its threshold the guild goes into lockdown. The lockdown lifts by itself once every
+signal has stayed below half its threshold for a while. Admins can also lock and lift
+a guild by hand; a manual lockdown only lifts by hand.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+NORMAL = 'normal'
+LOCKDOWN = 'lockdown'
+
+# Signals, in the order they are reported
+JOINS = 'joins'
+CLICKS = 'clicks'
+CLUSTER = 'cluster'
+SIGNALS = (JOINS, CLICKS, CLUSTER)
+
+# A lockdown lifts once every signal is below this share of its threshold
+LIFT_RATIO = 0.5
+
+
+class SlidingWindow:
+    """Events in the last `window` seconds, counted in a fixed ring of time slots"""
+
+    __slots__ = ('slot_seconds', 'counts', 'slots')
+
+    def __init__(self, window, slots=12):
+        self.slot_seconds = window / slots
+        self.counts = [0] * slots
+        # Which time slot each position currently counts for
+        self.slots = [-1] * slots
+
+    def add(self, now, amount=1):
+        slot = int(now // self.slot_seconds)
+        index = slot % len(self.counts)
+        if self.slots[index] != slot:
+            self.slots[index] = slot
+            self.counts[index] = 0
+        self.counts[index] += amount
+
+    def total(self, now):
+        oldest = int(now // self.slot_seconds) - len(self.counts) + 1
+        return sum(count for count, slot in zip(self.counts, self.slots) if slot >= oldest)
+
+
+class Transition:
+    """A guild entering or leaving lockdown"""
+
+    __slots__ = ('at', 'guild_id', 'state', 'reason', 'manual')
+
+    def __init__(self, at, guild_id, state, reason, manual):
+        self.at = at
+        self.guild_id = guild_id
+        self.state = state
+        self.reason = reason
+        self.manual = manual
+
+
+class GuildActivity:
+    """One guild's counters and lockdown state"""
+
+    __slots__ = ('joins', 'clicks', 'clickers', 'created', 'cluster', 'cluster_at', 'state', 'since', 'reason',
+                 'manual', 'calm_since', 'last_event')
+
+    def __init__(self, window):
+        self.joins = SlidingWindow(window)
+        self.clicks = SlidingWindow(window)
+        # user ID -> (counted_at, None) of the accounts whose click is in the window, oldest first
+        self.clickers = {}
+        # user ID -> (seen_at, account created_at) of the latest accounts seen, oldest first
+        self.created = {}
+        # Largest creation-time cluster, recomputed at most once a second
+        self.cluster = 0
+        self.cluster_at = 0.0
+        self.state = NORMAL
+        self.since = time.time()
+        self.reason = None
+        self.manual = False
+        # When every signal last dropped below the lift level, while in lockdown
+        self.calm_since = None
+        self.last_event = 0.0
+
+
+class RaidStatus:
+    """Snapshot of a guild's lockdown state and signals"""
+
+    __slots__ = ('state', 'since', 'reason', 'manual', 'signals', 'thresholds')
+
+    def __init__(self, state, since, reason, manual, signals, thresholds):
+        self.state = state
+        self.since = since
+        self.reason = reason
+        self.manual = manual
+        # signal -> current value, and signal -> threshold (0 when the signal is off)
+        self.signals = signals
+        self.thresholds = thresholds
+
+    @property
+    def locked(self):
+        return self.state == LOCKDOWN
+
+
+class RaidDetector:
+    """Per-guild sliding-window raid detection with automatic lockdown.
+
+    `on_change(transition)` is called whenever a guild enters or leaves lockdown. A
+    threshold of 0 turns that signal off. The cluster signal counts accounts seen in the
+    window that were created within `cluster_span` seconds of each other. Up to
+    `max_clickers` accounts per guild are remembered to count each one's clicks once.
+    """
+
+    def __init__(self, on_change, window=60, join_threshold=30, click_threshold=20, cluster_threshold=15,
+                 cluster_span=86400, cluster_sample=100, calm_seconds=300, history=50, max_clickers=1000):
+        self.on_change = on_change
+        self.window = window
+        self.thresholds = {JOINS: join_threshold, CLICKS: click_threshold, CLUSTER: cluster_threshold}
+        self.cluster_span = cluster_span
+        self.cluster_sample = cluster_sample
+        self.max_clickers = max_clickers
+        self.calm_seconds = calm_seconds
+        self._guilds = {}
+        self.transitions = deque(maxlen=history)
+
+    def _activity(self, guild_id):
+        activity = self._guilds.get(guild_id)
+        if activity is None:
+            activity = self._guilds[guild_id] = GuildActivity(self.window)
+        return activity
+
+    def is_locked(self, guild_id):
+        activity = self._guilds.get(guild_id)
+        return activity is not None and activity.state == LOCKDOWN
+
+    def locked_guilds(self):
+        return [guild_id for guild_id, activity in self._guilds.items() if activity.state == LOCKDOWN]
+
+    def record_join(self, guild_id, user_id, created_at, now=None):
+        """Count a member joining; `created_at` is their account's creation time (Unix seconds)"""
+        now = time.time() if now is None else now
+        activity = self._activity(guild_id)
+        activity.joins.add(now)
+        self._record(guild_id, activity, user_id, created_at, now)
+
+    def record_click(self, guild_id, user_id, created_at, now=None):
+        """Count a Verify click, once per account in the window; `created_at` is the account's
+        creation time (Unix seconds)"""
+        now = time.time() if now is None else now
+        activity = self._activity(guild_id)
+        if self._note(activity.clickers, user_id, None, now, self.max_clickers):
+            activity.clicks.add(now)
+        self._record(guild_id, activity, user_id, created_at, now)
+
+    def _record(self, guild_id, activity, user_id, created_at, now):
+        self._note(activity.created, user_id, created_at, now, self.cluster_sample)
+        activity.last_event = now
+        self._evaluate(guild_id, activity, now)
+
+    def _note(self, seen, user_id, value, now, limit):
+        """Remember `user_id` in `seen`, dropping entries older than the window and the oldest
+        beyond `limit`. False if the user was already there."""
+        while seen:
+            oldest = next(iter(seen))
+            if now - seen[oldest][0] <= self.window:
+                break
+            del seen[oldest]
+        if user_id in seen:
+            return False
+        if len(seen) >= limit:
+            del seen[next(iter(seen))]
+        seen[user_id] = (now, value)
+        return True
+
+    def _largest_cluster(self, activity, now):
+        """Most accounts seen in the window whose creation times fit within cluster_span"""
+        if 0 <= now - activity.cluster_at < 1.0:
+            return activity.cluster
+        created = sorted(created_at for seen_at, created_at in activity.created.values() if now - seen_at <= self.window)
+        largest = 0
+        start = 0
+        for end, created_at in enumerate(created):
+            while created_at - created[start] > self.cluster_span:
+                start += 1
+            largest = max(largest, end - start + 1)
+        activity.cluster = largest
+        activity.cluster_at = now
+        return largest
+
+    def _signals(self, activity, now):
+        return {
+            JOINS: activity.joins.total(now),
+            CLICKS: activity.clicks.total(now),
+            CLUSTER: self._largest_cluster(activity, now) if self.thresholds[CLUSTER] else 0,
+        }
+
+    def _evaluate(self, guild_id, activity, now):
+        signals = self._signals(activity, now)
+        if activity.state == NORMAL:
+            tripped = [name for name in SIGNALS if self.thresholds[name] and signals[name] >= self.thresholds[name]]
+            if tripped:
+                reason = ", ".join(f"{signals[name]} {name} (threshold {self.thresholds[name]})" for name in tripped)
+                self._transition(guild_id, activity, LOCKDOWN, f"{reason} in {self.window}s", False, now)
+            return
+
+        if activity.manual:
+            return
+        if any(self.thresholds[name] and signals[name] >= self.thresholds[name] * LIFT_RATIO for name in SIGNALS):
+            activity.calm_since = None
+        elif activity.calm_since is None:
+            activity.calm_since = now
+        elif now - activity.calm_since >= self.calm_seconds:
+            self._transition(guild_id, activity, NORMAL, f"activity back to normal for {self.calm_seconds}s", False, now)
+
+    def _transition(self, guild_id, activity, state, reason, manual, now):
+        activity.state = state
+        activity.since = now
+        activity.reason = reason
+        activity.manual = manual and state == LOCKDOWN
+        activity.calm_since = None
+        transition = Transition(now, guild_id, state, reason, manual)
+        self.transitions.append(transition)
+        if state == LOCKDOWN:
+            logger.warning(f"Guild {guild_id} entered raid lockdown: {reason}")
+        else:
+            logger.info(f"Guild {guild_id} left raid lockdown: {reason}")
+        try:
+            self.on_change(transition)
+        except Exception as e:
+            logger.error(f"Raid lockdown change handler failed for guild {guild_id}: {e}")
+
+    def lock(self, guild_id, reason):
+        """Put a guild into lockdown by hand; it stays until lifted by hand. False if already locked."""
+        activity = self._activity(guild_id)
+        if activity.state == LOCKDOWN:
+            if activity.manual:
+                return False
+            # Keep an automatic lockdown going until someone lifts it
+            activity.manual = True
+            return True
+        self._transition(guild_id, activity, LOCKDOWN, reason, True, time.time())
+        return True
+
+    def lift(self, guild_id, reason):
+        """End a guild's lockdown now. False if it wasn't locked."""
+        activity = self._guilds.get(guild_id)
+        if activity is None or activity.state != LOCKDOWN:
+            return False
+        self._transition(guild_id, activity, NORMAL, reason, True, time.time())
+        return True
+
+    def forget(self, guild_id):
+        """Drop a guild's state, e.g. after the bot left it"""
+        self._guilds.pop(guild_id, None)
+
+    def status(self, guild_id):
+        now = time.time()
+        activity = self._guilds.get(guild_id)
+        if activity is None:
+            return RaidStatus(NORMAL, None, None, False, dict.fromkeys(SIGNALS, 0), dict(self.thresholds))
+        return RaidStatus(activity.state, activity.since, activity.reason, activity.manual,
+                          self._signals(activity, now), dict(self.thresholds))
+
+    def history(self, guild_id):
+        """A guild's recent transitions, newest first"""
+        return [transition for transition in reversed(self.transitions) if transition.guild_id == guild_id]
+
+    def tick(self, now=None):
+        """Re-check locked guilds, which may see no events at all once a raid stops, and drop idle ones"""
+        now = time.time() if now is None else now
+        for guild_id, activity in list(self._guilds.items()):
+            if activity.state == LOCKDOWN:
+                self._evaluate(guild_id, activity, now)
+            elif now - activity.last_event > 2 * self.window:
+                del self._guilds[guild_id]
+
+    async def run_monitor(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Raid detector check failed: {e}")
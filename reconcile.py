@@ -0,0 +1,131 @@
+"""
+Verified Role Reconciliation
+Checks that everyone holding a guild's verified role is entitled to it, catching roles
+handed out by hand and roles whose approval was rejected or has expired since.
+
+The guild's member list is walked over REST a page (up to 1000 members) at a time, and
+only the role IDs in the raw payloads are looked at, so no member objects are built and
+the member cache isn't needed. Holders are compared with the guild's latest decisions,
+read from the ledger in one query. Only holders without a decision in this guild cost a
+query of their own, to check the trusted guilds. Removals are queued through the send
+scheduler, which paces them, and capped per run.
+
+A guild's first run takes the role holders with no decision at all as the baseline and
+records an approval for them, since they were verified before the ledger existed; only
+later runs flag (and may remove) holders without an approval.
+"""
+
+import asyncio
+import logging
+import time
+
+from ledger import APPROVED
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+class ReconcileReport:
+    """Outcome of one guild's reconciliation"""
+
+    __slots__ = ('guild_id', 'scanned', 'holders', 'unentitled', 'backfilled', 'removed', 'failed',
+                 'expiries_scheduled', 'duration')
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.scanned = 0
+        self.holders = 0
+        # User IDs holding the role without an approval behind it
+        self.unentitled = []
+        # Holders from before the ledger, recorded as approved on the guild's first run
+        self.backfilled = 0
+        self.removed = 0
+        self.failed = 0
+        self.expiries_scheduled = 0
+        self.duration = 0.0
+
+    def describe(self):
+        return (f"{self.scanned} members scanned, {self.holders} with the verified role, "
+                f"{len(self.unentitled)} without an approval, {self.removed} removed"
+                f"{f', {self.backfilled} recorded as verified before the ledger' if self.backfilled else ''}"
+                f"{f', {self.failed} failed' if self.failed else ''}, "
+                f"{self.expiries_scheduled} expiries scheduled, in {self.duration:.1f}s")
+
+
+class RoleReconciler:
+    """Compares verified role holders with the decision ledger.
+
+    `fetch_page(guild_id, limit, after)` returns a page of raw member payloads ordered by
+    user ID, `remove_role(guild_id, user_id, role_id)` takes the role away, and
+    `ensure_expiry(guild_id, user_id, decision)` schedules an approval's expiry, returning
+    True if it had to.
+    """
+
+    def __init__(self, ledger, fetch_page, remove_role, ensure_expiry, max_removals=500):
+        self.ledger = ledger
+        self.fetch_page = fetch_page
+        self.remove_role = remove_role
+        self.ensure_expiry = ensure_expiry
+        self.max_removals = max_removals
+
+    async def scan(self, guild_id, role_id, report):
+        """IDs of the non-bot members holding the role"""
+        role = str(role_id)
+        holders = []
+        after = None
+        while True:
+            page = await self.fetch_page(guild_id, PAGE_SIZE, after)
+            report.scanned += len(page)
+            for data in page:
+                if role in data['roles'] and not data['user'].get('bot', False):
+                    holders.append(int(data['user']['id']))
+            if len(page) < PAGE_SIZE:
+                return holders
+            after = page[-1]['user']['id']
+
+    async def run(self, guild_id, role_id, trusted_guilds=(), remove=False):
+        """Reconcile one guild. Holders without an approval lose the role only if `remove`."""
+        started = time.monotonic()
+        report = ReconcileReport(guild_id)
+        holders = await self.scan(guild_id, role_id, report)
+        report.holders = len(holders)
+
+        latest = await self.ledger.latest_in_guild(guild_id)
+        backfill = not await self.ledger.backfilled(guild_id)
+        undecided = []
+        for user_id in holders:
+            decision = latest.get(user_id)
+            if decision is None and trusted_guilds:
+                decision = await self.ledger.standing(user_id, guild_id, trusted_guilds)
+            if decision is not None and decision.decision == APPROVED:
+                if self.ensure_expiry(guild_id, user_id, decision):
+                    report.expiries_scheduled += 1
+            elif backfill and decision is None:
+                undecided.append(user_id)
+            else:
+                report.unentitled.append(user_id)
+
+        if backfill:
+            # Their expiries are scheduled by the next run, which sees the new approvals
+            self.ledger.backfill(guild_id, undecided)
+            report.backfilled = len(undecided)
+            logger.info(f"Guild {guild_id}: recorded {len(undecided)} verified role holders from before the ledger as approved")
+
+        if remove and report.unentitled:
+            batch = report.unentitled[:self.max_removals]
+            if len(batch) < len(report.unentitled):
+                logger.warning(f"Guild {guild_id}: {len(report.unentitled)} members hold the verified role without "
+                               f"an approval; removing it from the first {len(batch)} only")
+            results = await asyncio.gather(*(self.remove_role(guild_id, user_id, role_id) for user_id in batch),
+                                           return_exceptions=True)
+            for user_id, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    report.failed += 1
+                    logger.warning(f"Could not remove the verified role from {user_id} in guild {guild_id}: {result}")
+                else:
+                    report.removed += 1
+
+        report.duration = time.monotonic() - started
+        logger.info(f"Reconciled verified role in guild {guild_id}: {report.describe()}")
+        return report
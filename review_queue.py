@@ -0,0 +1,210 @@
+"""
+Moderator Review Queue
+Durable backlog of verification requests awaiting a decision. Pending entries are held
+in a per-guild in-memory index for fast filtering and pagination, and persisted to SQLite
+so the backlog survives restarts. Decisions are applied in batches by a small pool of
+background workers.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_entries (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    display_name TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    image_url TEXT,
+    has_screenshot INTEGER NOT NULL,
+    account_created_at REAL NOT NULL,
+    submitted_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    decided_by INTEGER,
+    decided_at REAL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS review_entries_status ON review_entries (status, guild_id, submitted_at);
+"""
+
+PENDING = 'pending'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+
+
+class ReviewEntry:
+    """One verification request waiting for (or past) a moderator decision"""
+
+    __slots__ = ('guild_id', 'user_id', 'channel_id', 'message_id', 'display_name', 'answers', 'image_url',
+                 'has_screenshot', 'account_created_at', 'submitted_at', 'status')
+
+    def __init__(self, guild_id, user_id, channel_id, message_id, display_name, answers, image_url,
+                 has_screenshot, account_created_at, submitted_at=None, status=PENDING):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.display_name = display_name
+        self.answers = answers
+        self.image_url = image_url
+        self.has_screenshot = has_screenshot
+        self.account_created_at = account_created_at
+        self.submitted_at = submitted_at if submitted_at is not None else time.time()
+        self.status = status
+
+    @property
+    def account_age_days(self):
+        return int((time.time() - self.account_created_at) // 86400)
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.message_id}"
+
+
+class ReviewQueue:
+    """Pending review entries, indexed per guild in memory and persisted in SQLite"""
+
+    def __init__(self, db):
+        self.db = db
+        self._pending = {}
+        db.ensure_schema(SCHEMA)
+
+    def load(self, owns_guild=None):
+        """Load pending entries into the index. Blocking; call during startup only."""
+        rows = self.db.fetchall_sync(
+            "SELECT guild_id, user_id, channel_id, message_id, display_name, answers, image_url, "
+            "has_screenshot, account_created_at, submitted_at FROM review_entries WHERE status = ?",
+            (PENDING,)
+        )
+        loaded = 0
+        for row in rows:
+            if owns_guild is not None and not owns_guild(row[0]):
+                continue
+            entry = ReviewEntry(*row[:5], json.loads(row[5]), row[6], bool(row[7]), row[8], row[9])
+            self._pending.setdefault(entry.guild_id, {})[entry.user_id] = entry
+            loaded += 1
+        logger.info(f"Loaded {loaded} pending review entries")
+
+    def pending_count(self, guild_id):
+        return len(self._pending.get(guild_id, {}))
+
+    def get(self, guild_id, user_id):
+        return self._pending.get(guild_id, {}).get(user_id)
+
+    def add(self, entry):
+        """Record a new submission, replacing any earlier one from the same user"""
+        self._pending.setdefault(entry.guild_id, {})[entry.user_id] = entry
+        self.db.execute(
+            "INSERT OR REPLACE INTO review_entries "
+            "(guild_id, user_id, channel_id, message_id, display_name, answers, image_url, has_screenshot, "
+            "account_created_at, submitted_at, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry.guild_id, entry.user_id, entry.channel_id, entry.message_id, entry.display_name,
+             json.dumps(entry.answers), entry.image_url, int(entry.has_screenshot), entry.account_created_at,
+             entry.submitted_at, PENDING)
+        )
+
+    def pending(self, guild_id, screenshot=None, min_account_age_days=None, max_account_age_days=None):
+        """Pending entries for a guild, oldest first, optionally filtered"""
+        entries = []
+        for entry in self._pending.get(guild_id, {}).values():
+            if screenshot is not None and entry.has_screenshot != screenshot:
+                continue
+            age = entry.account_age_days
+            if min_account_age_days is not None and age < min_account_age_days:
+                continue
+            if max_account_age_days is not None and age > max_account_age_days:
+                continue
+            entries.append(entry)
+        entries.sort(key=lambda e: e.submitted_at)
+        return entries
+
+    def reopen(self, entry):
+        """Put a decided entry back in the pending set, e.g. after its decision failed to apply"""
+        entry.status = PENDING
+        self.add(entry)
+
+    def resolve(self, guild_id, user_id, status, moderator_id):
+        """Take an entry out of the pending set. Returns it, or None if it was already decided."""
+        entry = self._pending.get(guild_id, {}).pop(user_id, None)
+        self.db.execute(
+            "UPDATE review_entries SET status = ?, decided_by = ?, decided_at = ? "
+            "WHERE guild_id = ? AND user_id = ? AND status = ?",
+            (status, moderator_id, time.time(), guild_id, user_id, PENDING)
+        )
+        if entry is not None:
+            entry.status = status
+        return entry
+
+
+class ReviewDecision:
+    """A moderator's approve/reject decision waiting to be applied"""
+
+    __slots__ = ('entry', 'approved', 'moderator', 'future', 'message')
+
+    def __init__(self, entry, approved, moderator, future, message=None):
+        self.entry = entry
+        self.approved = approved
+        self.moderator = moderator
+        self.future = future
+        # The review post, when the decision came from its buttons
+        self.message = message
+
+
+class ReviewWorker:
+    """Applies queued decisions in batches through `apply_batch(decisions)`.
+
+    `apply_batch` returns one result per decision, in order; each decision's future
+    resolves to its result. Up to `workers` batches are applied at once, so a single
+    button click isn't stuck behind a large bulk decision.
+    """
+
+    def __init__(self, apply_batch, batch_size=25, workers=4):
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+        self._applying = 0
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def idle(self):
+        return self.depth == 0 and not self._applying
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    def submit(self, entry, approved, moderator, message=None):
+        """Queue a decision. Returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(ReviewDecision(entry, approved, moderator, future, message))
+        return future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            self._applying += 1
+            try:
+                results = await self.apply_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to apply a batch of {len(batch)} review decisions: {e}")
+                results = [e] * len(batch)
+            finally:
+                self._applying -= 1
+
+            for decision, result in zip(batch, results):
+                if not decision.future.done():
+                    decision.future.set_result(result)
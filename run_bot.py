@@ -2,106 +2,324 @@
 """
 Discord Bot Runner with Auto-Restart and 24/7 Operation
 This script ensures the bot stays running continuously with automatic restarts.
+
+The bot process logs to its own file, writes a heartbeat file while its event loop is
+responsive, and is restarted with exponential backoff if it crashes or its heartbeat goes
+stale. On SIGTERM the bot stops taking new verifications and drains before exiting.
+
+Run with `--clusters N` (or CLUSTER_COUNT=N) to split the bot's shards across N worker
+processes. Each cluster is restarted independently, and their health checks are combined
+into one /health endpoint on METRICS_PORT.
 """
 
+import argparse
+import json
+import random
+import signal
 import subprocess
 import sys
+import threading
 import time
 import logging
 import os
+import urllib.error
+import urllib.request
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_setup import setup_logging
 
 # Set up logging for the runner
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [RUNNER] - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot_runner.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('bot_runner.log', '%(asctime)s - [RUNNER] - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class BotRunner:
-    def __init__(self):
+    def __init__(self, name="BOT", env=None):
+        self.name = name
+        self.env = env or {}
         self.restart_count = 0
         self.max_restarts_per_hour = 10
         self.restart_times = []
-        
+        self.process = None
+        self.stopping = False
+        self._wakeup = threading.Event()
+
+        # The bot logs to its own file; its stdout only catches crashes and stray prints
+        slug = name.lower().replace(' ', '_')
+        self.output_file = f'{slug}_output.log'
+        self.heartbeat_file = os.path.join('data', f'{slug}.heartbeat')
+
+        # Restart backoff: base * 2^(failures - 1), capped, with jitter; reset after a stable run
+        self.consecutive_failures = 0
+        self.backoff_base = 5
+        self.backoff_max = 300
+        self.stable_seconds = 600
+
+        # Liveness: restart the bot when its heartbeat goes stale
+        self.heartbeat_timeout = float(os.environ.get('HEARTBEAT_TIMEOUT', 90))
+        self.startup_grace = float(os.environ.get('HEARTBEAT_STARTUP_GRACE', 120))
+        self.drain_timeout = float(os.environ.get('SHUTDOWN_DRAIN_SECONDS', 60))
+
     def clean_old_restart_times(self):
         """Remove restart times older than 1 hour"""
         current_time = time.time()
         self.restart_times = [t for t in self.restart_times if current_time - t < 3600]
-    
+
     def can_restart(self):
         """Check if we can restart (not too many restarts in the last hour)"""
         self.clean_old_restart_times()
         return len(self.restart_times) < self.max_restarts_per_hour
-    
+
+    def backoff(self):
+        """Seconds to wait before the next restart"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def heartbeat_age(self, started):
+        try:
+            return time.time() - os.stat(self.heartbeat_file).st_mtime
+        except FileNotFoundError:
+            return time.time() - started
+
+    def stop(self, wait=True):
+        """Stop restarting and ask the bot process to drain and exit"""
+        self.stopping = True
+        self._wakeup.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            logger.info(f"🔄 Asking {self.name} to drain and exit...")
+            process.terminate()
+            if wait:
+                self.wait_for_exit(process)
+
+    def wait_for_exit(self, process):
+        """Give a terminated process its drain time, then kill it"""
+        try:
+            process.wait(timeout=self.drain_timeout + 15)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"⚠️ {self.name} did not exit after SIGTERM; killing it")
+            process.kill()
+            process.wait()
+
+    def supervise(self, process, started):
+        """Wait for the process to exit. Returns True if it was killed for a stale heartbeat."""
+        while True:
+            try:
+                process.wait(timeout=5)
+                return False
+            except subprocess.TimeoutExpired:
+                pass
+            if self.stopping or time.time() - started < self.startup_grace:
+                continue
+            age = self.heartbeat_age(started)
+            if age > self.heartbeat_timeout:
+                logger.error(f"💔 No heartbeat from {self.name} for {age:.0f}s; restarting it")
+                process.terminate()
+                self.wait_for_exit(process)
+                return True
+
     def run_bot(self):
         """Run the bot with automatic restart capability"""
-        logger.info("🚀 Starting Discord Bot Runner for 24/7 operation")
+        logger.info(f"🚀 Starting Discord Bot Runner for 24/7 operation ({self.name})")
         logger.info(f"📁 Working directory: {os.getcwd()}")
-        
-        while True:
+        os.makedirs(os.path.dirname(self.heartbeat_file), exist_ok=True)
+
+        while not self.stopping:
             try:
                 if not self.can_restart():
-                    logger.error(f"❌ Too many restarts ({len(self.restart_times)}) in the last hour. Waiting 10 minutes...")
-                    time.sleep(600)  # Wait 10 minutes
+                    logger.error(f"❌ Too many restarts ({len(self.restart_times)}) of {self.name} in the last hour. Waiting 10 minutes...")
+                    self._wakeup.wait(600)  # Wait 10 minutes
                     continue
-                
+
                 self.restart_count += 1
                 self.restart_times.append(time.time())
-                
-                logger.info(f"🔄 Starting bot (Attempt #{self.restart_count})")
+
+                logger.info(f"🔄 Starting {self.name} (Attempt #{self.restart_count})")
                 logger.info(f"📊 Restarts in last hour: {len(self.restart_times)}")
-                
+
+                # A heartbeat left over from the previous process must not count for this one
+                try:
+                    os.remove(self.heartbeat_file)
+                except FileNotFoundError:
+                    pass
+
                 # Start the bot process
-                process = subprocess.Popen(
-                    [sys.executable, 'main.py'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1
-                )
-                
-                logger.info(f"✅ Bot process started with PID: {process.pid}")
-                
-                # Monitor the process and log output
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        # Log bot output with timestamp
-                        print(f"[BOT] {output.strip()}")
-                
+                started = time.time()
+                with open(self.output_file, 'a') as output:
+                    self.process = process = subprocess.Popen(
+                        [sys.executable, 'main.py'],
+                        stdout=output,
+                        stderr=subprocess.STDOUT,
+                        env={
+                            **os.environ,
+                            'LOG_CONSOLE': '0',
+                            'HEARTBEAT_FILE': self.heartbeat_file,
+                            'SHUTDOWN_DRAIN_SECONDS': str(self.drain_timeout),
+                            **self.env
+                        }
+                    )
+
+                logger.info(f"✅ {self.name} process started with PID: {process.pid} (output in {self.output_file})")
+
+                hung = self.supervise(process, started)
+
                 # Process has ended
-                return_code = process.poll()
-                logger.warning(f"⚠️ Bot process ended with return code: {return_code}")
-                
-                if return_code == 0:
-                    logger.info("✅ Bot shut down gracefully")
+                return_code = process.returncode
+                if self.stopping:
+                    break
+                logger.warning(f"⚠️ {self.name} process ended with return code: {return_code}")
+
+                if return_code == 0 and not hung:
+                    logger.info(f"✅ {self.name} shut down gracefully")
                     break
-                else:
-                    logger.error(f"❌ Bot crashed with code {return_code}")
-                
+                elif not hung:
+                    logger.error(f"❌ {self.name} crashed with code {return_code}; see {self.output_file}")
+
+                if time.time() - started >= self.stable_seconds:
+                    self.consecutive_failures = 0
+                self.consecutive_failures += 1
+
                 # Wait before restarting
-                wait_time = min(30 * len(self.restart_times), 300)  # Max 5 minutes
-                logger.info(f"⏰ Waiting {wait_time} seconds before restart...")
-                time.sleep(wait_time)
-                
+                wait_time = self.backoff()
+                logger.info(f"⏰ Waiting {wait_time:.0f} seconds before restart...")
+                self._wakeup.wait(wait_time)
+
             except KeyboardInterrupt:
                 logger.info("🛑 Received shutdown signal")
-                if 'process' in locals():
-                    logger.info("🔄 Terminating bot process...")
-                    process.terminate()
-                    process.wait()
+                self.stop()
                 break
             except Exception as e:
                 logger.error(f"💥 Runner error: {e}")
-                time.sleep(60)  # Wait 1 minute on runner errors
+                self._wakeup.wait(60)  # Wait 1 minute on runner errors
+
+def recommended_shard_count(token):
+    """Ask Discord how many shards the bot should run"""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot (run_bot.py, 1.0)"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+def split_shards(shard_count, cluster_count):
+    """Split shard IDs into contiguous ranges, one per cluster"""
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for cluster in range(cluster_count):
+        size = per_cluster + (1 if cluster < extra else 0)
+        ranges.append(range(start, start + size))
+        start += size
+    return [r for r in ranges if len(r) > 0]
+
+class ClusterLauncher:
+    """Runs one BotRunner per cluster and serves their combined health"""
+
+    def __init__(self, cluster_count, shard_count, health_port=8080):
+        self.health_port = health_port
+        self.runners = []
+        for cluster_id, shards in enumerate(split_shards(shard_count, cluster_count)):
+            env = {
+                'CLUSTER_ID': str(cluster_id),
+                'SHARD_COUNT': str(shard_count),
+                'SHARD_IDS': f"{shards.start}-{shards.stop - 1}",
+                'METRICS_PORT': str(health_port + 1 + cluster_id),
+            }
+            self.runners.append(BotRunner(name=f"CLUSTER {cluster_id}", env=env))
+
+    def cluster_health(self):
+        """Fetch every cluster's /health and combine them"""
+        healthy = True
+        clusters = {}
+        for cluster_id, runner in enumerate(self.runners):
+            url = f"http://127.0.0.1:{runner.env['METRICS_PORT']}/health"
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    clusters[cluster_id] = json.load(response)
+            except urllib.error.HTTPError as e:
+                try:
+                    clusters[cluster_id] = json.load(e)
+                except ValueError:
+                    clusters[cluster_id] = {'status': f'http {e.code}'}
+                healthy = False
+            except (OSError, ValueError) as e:
+                clusters[cluster_id] = {'status': 'unreachable', 'error': str(e)}
+                healthy = False
+            clusters[cluster_id]['shard_ids'] = runner.env['SHARD_IDS']
+            clusters[cluster_id]['restarts_last_hour'] = len(runner.restart_times)
+        return healthy, {'status': 'ok' if healthy else 'unhealthy', 'clusters': clusters}
+
+    def serve_health(self):
+        launcher = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/health':
+                    self.send_error(404)
+                    return
+                healthy, details = launcher.cluster_health()
+                body = json.dumps(details).encode()
+                self.send_response(200 if healthy else 503)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('0.0.0.0', self.health_port), HealthHandler)
+        threading.Thread(target=server.serve_forever, name="cluster-health", daemon=True).start()
+        logger.info(f"🩺 Combined cluster health on port {self.health_port}")
+
+    def run(self):
+        logger.info(f"🧩 Launching {len(self.runners)} clusters")
+        self.serve_health()
+
+        threads = []
+        for runner in self.runners:
+            thread = threading.Thread(target=runner.run_bot, name=runner.name, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("🛑 Received shutdown signal")
+            # Let every cluster drain at the same time
+            for runner in self.runners:
+                runner.stop(wait=False)
+            for runner in self.runners:
+                if runner.process is not None:
+                    runner.wait_for_exit(runner.process)
+
+def handle_sigterm(signum, frame):
+    """Treat SIGTERM (docker stop, systemctl stop) like Ctrl+C so the bot gets to drain"""
+    raise KeyboardInterrupt
 
 if __name__ == "__main__":
-    runner = BotRunner()
-    runner.run_bot()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    parser = argparse.ArgumentParser(description="Run the bot with automatic restarts")
+    parser.add_argument('--clusters', type=int, default=int(os.environ.get('CLUSTER_COUNT', 1)),
+                        help="number of worker processes to spread shards across")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SHARD_COUNT', 0)),
+                        help="total shard count (default: Discord's recommendation)")
+    args = parser.parse_args()
+
+    if args.clusters > 1:
+        shard_count = args.shards
+        if not shard_count:
+            token = os.environ.get('DISCORD_BOT_TOKEN')
+            if not token:
+                logger.error("DISCORD_BOT_TOKEN environment variable not set")
+                sys.exit(1)
+            shard_count = recommended_shard_count(token)
+            logger.info(f"📡 Discord recommends {shard_count} shards")
+
+        launcher = ClusterLauncher(args.clusters, shard_count, int(os.environ.get('METRICS_PORT', 8080)))
+        launcher.run()
+    else:
+        runner = BotRunner()
+        runner.run_bot()
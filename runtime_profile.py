@@ -0,0 +1,78 @@
+"""
+Runtime Profile
+Selects the event loop and JSON codec the bot runs on. The "default" profile leaves
+asyncio and discord.py's own choices alone. The "speed" profile installs uvloop's event
+loop and makes discord.py decode gateway events and REST responses with orjson. Either
+package may be missing; the profile then falls back to the standard library for that
+part and says so in the log.
+
+Gateway transport compression needs no switch: discord.py always requests a compressed
+stream, zstd-stream when the zstandard package (or Python 3.14's compression.zstd) is
+available and zlib-stream otherwise. The active one is reported with the profile.
+"""
+
+import asyncio
+import json
+import logging
+
+from discord import utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT = 'default'
+SPEED = 'speed'
+PROFILES = (DEFAULT, SPEED)
+
+
+class RuntimeProfile:
+    """What a profile ended up using"""
+
+    __slots__ = ('name', 'event_loop', 'json_codec', 'gateway_compression')
+
+    def __init__(self, name, event_loop, json_codec, gateway_compression):
+        self.name = name
+        self.event_loop = event_loop
+        self.json_codec = json_codec
+        self.gateway_compression = gateway_compression
+
+    def describe(self):
+        return f"{self.name} (loop: {self.event_loop}, JSON: {self.json_codec}, gateway: {self.gateway_compression})"
+
+
+def _install_uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop is not installed; the speed profile keeps asyncio's event loop")
+        return 'asyncio'
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
+
+
+def _install_orjson():
+    try:
+        import orjson
+    except ImportError:
+        logger.info("orjson is not installed; the speed profile keeps the standard json module")
+        return 'json'
+    # discord.py looks these up on its utils module at call time
+    utils._from_json = orjson.loads
+    utils._to_json = lambda obj: orjson.dumps(obj).decode('utf-8')
+    return 'orjson'
+
+
+def apply(name):
+    """Apply a runtime profile. Call before the event loop is created. Returns a RuntimeProfile."""
+    name = (name or DEFAULT).strip().lower()
+    if name not in PROFILES:
+        logger.warning(f"Unknown runtime profile {name!r}; expected one of {', '.join(PROFILES)}. Using {DEFAULT}.")
+        name = DEFAULT
+
+    if name == SPEED:
+        event_loop = _install_uvloop()
+        json_codec = _install_orjson()
+    else:
+        event_loop = 'asyncio'
+        json_codec = 'orjson' if utils._from_json is not json.loads else 'json'
+
+    return RuntimeProfile(name, event_loop, json_codec, utils._ActiveDecompressionContext.COMPRESSION_TYPE)
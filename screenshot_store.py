@@ -0,0 +1,358 @@
+"""
+Screenshot Store
+Local, content-addressed copies of age-verification screenshots. Discord CDN links
+expire, so each attachment is streamed to disk in bounded chunks while it is hashed
+(SHA-256), and the review post carries a cleaned copy instead of the link.
+
+Image work (EXIF stripping, downscaling, perceptual hashing) runs in a process pool.
+Perceptual hashes go into an in-memory index that finds near-duplicates, i.e. the same
+ID photo re-used across accounts, with a handful of dict lookups. A sweeper deletes
+screenshots once they are older than the retention period.
+
+Pillow is optional. Without it screenshots are still stored and exact duplicates are
+still detected, but no cleaned copy or perceptual hash is produced.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+# Pillow is only imported by the image workers; the bot process just checks that it's there
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS screenshots (
+    sha256 TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    phash TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (sha256, user_id)
+);
+CREATE INDEX IF NOT EXISTS screenshots_stored_at ON screenshots (stored_at);
+"""
+
+ALLOWED_HOSTS = ('cdn.discordapp.com', 'media.discordapp.net')
+HASH_BITS = 64
+
+
+class ScreenshotError(Exception):
+    """A screenshot could not be downloaded or stored"""
+
+
+def process_image(source_path, review_path, max_dimension):
+    """Write an EXIF-free, downscaled JPEG of the image and return its 64-bit dHash.
+
+    Runs in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = 50_000_000
+    with Image.open(source_path) as image:
+        # Let JPEG decode at reduced size; a no-op for other formats
+        image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        image.thumbnail((max_dimension, max_dimension))
+
+        # A fresh image carries pixels only: no EXIF, GPS or other metadata
+        clean = Image.new('RGB', image.size)
+        clean.paste(image)
+        clean.save(review_path, 'JPEG', quality=85, optimize=True)
+
+        # Difference hash: compare neighbouring pixels of a 9x8 grayscale thumbnail
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    phash = 0
+    for row in range(8):
+        for column in range(8):
+            phash = (phash << 1) | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return phash
+
+
+class PerceptualIndex:
+    """Finds hashes within a Hamming distance of a query.
+
+    The 64-bit hash is split into `threshold + 1` bands. Two hashes that differ in at most
+    `threshold` bits must agree exactly on at least one band, so only hashes sharing a band
+    with the query need comparing.
+    """
+
+    def __init__(self, threshold=6):
+        self.threshold = threshold
+        bands = threshold + 1
+        width, extra = divmod(HASH_BITS, bands)
+        self._bands = []
+        shift = HASH_BITS
+        for band in range(bands):
+            size = width + (1 if band < extra else 0)
+            shift -= size
+            self._bands.append((shift, (1 << size) - 1))
+        self._buckets = [{} for _ in self._bands]
+
+    def _keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._bands]
+
+    def add(self, phash, key):
+        for buckets, band in zip(self._buckets, self._keys(phash)):
+            buckets.setdefault(band, {})[key] = phash
+
+    def remove(self, phash, key):
+        for buckets, band in zip(self._buckets, self._keys(phash)):
+            entries = buckets.get(band)
+            if entries is not None:
+                entries.pop(key, None)
+                if not entries:
+                    del buckets[band]
+
+    def query(self, phash):
+        """{key: distance} for every indexed hash within the threshold"""
+        matches = {}
+        for buckets, band in zip(self._buckets, self._keys(phash)):
+            for key, other in buckets.get(band, {}).items():
+                if key not in matches:
+                    distance = (phash ^ other).bit_count()
+                    if distance <= self.threshold:
+                        matches[key] = distance
+        return matches
+
+
+class ScreenshotResult:
+    """A stored screenshot and the earlier submissions it resembles"""
+
+    __slots__ = ('sha256', 'size', 'review_path', 'phash', 'matches')
+
+    def __init__(self, sha256, size, review_path, phash, matches):
+        self.sha256 = sha256
+        self.size = size
+        self.review_path = review_path
+        self.phash = phash
+        # [(user_id, guild_id, distance)], closest first; distance 0 for identical files
+        self.matches = matches
+
+
+def _exit_with_parent(parent_pid):
+    """Pool worker initializer: exit once the bot process is gone, however it ended"""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+def start_image_pool(workers=2):
+    """Fork the image workers. None without Pillow.
+
+    Call before the process starts any thread: a child forked from a multithreaded
+    process can hang on a lock another thread was holding. The workers are forked rather
+    than spawned, because spawned workers would run the bot's main script again.
+    """
+    if not HAVE_PILLOW or workers < 1:
+        return None
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+        initializer=_exit_with_parent, initargs=(os.getpid(),)
+    )
+    # A fork pool starts all of its workers on the first submit
+    pool.submit(os.getpid).result()
+    return pool
+
+
+class ScreenshotStore:
+    """Content-addressed screenshot files plus the duplicate index, backed by SQLite"""
+
+    def __init__(self, db, root, max_bytes=10 * 1024 * 1024, chunk_size=64 * 1024, max_dimension=1024,
+                 retention_days=30, duplicate_threshold=6, pool=None):
+        self.db = db
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_dimension = max_dimension
+        self.retention_days = retention_days
+        self.index = PerceptualIndex(duplicate_threshold)
+        # sha256 -> {user_id: (guild_id, phash, stored_at)}
+        self._submissions = {}
+        self._session = None
+        # Process pool from start_image_pool(); without one, images are processed on a thread
+        self._pool = pool
+        db.ensure_schema(SCHEMA)
+        if not HAVE_PILLOW:
+            logger.warning("Pillow is not installed; screenshots will not be cleaned, downscaled or checked for near-duplicates")
+
+    async def load(self):
+        """Rebuild the duplicate index from the database"""
+        cutoff = time.time() - self.retention_days * 86400
+        rows = await self.db.fetchall(
+            "SELECT sha256, user_id, guild_id, phash, stored_at FROM screenshots WHERE stored_at >= ?", (cutoff,)
+        )
+        for sha256, user_id, guild_id, phash, stored_at in rows:
+            # Screenshots stored while this was loading are already indexed
+            if user_id not in self._submissions.get(sha256, ()):
+                self._remember(sha256, user_id, guild_id, int(phash, 16) if phash else None, stored_at)
+        logger.info(f"Loaded {len(rows)} stored screenshots")
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def review_path(self, sha256):
+        return os.path.join(self.root, 'review', sha256[:2], f"{sha256}.jpg")
+
+    def _remember(self, sha256, user_id, guild_id, phash, stored_at):
+        self._submissions.setdefault(sha256, {})[user_id] = (guild_id, phash, stored_at)
+        if phash is not None:
+            self.index.add(phash, (sha256, user_id))
+
+    def _forget(self, sha256, user_id):
+        guild_id, phash, stored_at = self._submissions[sha256].pop(user_id)
+        if not self._submissions[sha256]:
+            del self._submissions[sha256]
+        if phash is not None:
+            self.index.remove(phash, (sha256, user_id))
+
+    def find_matches(self, sha256, phash, user_id):
+        """Other users who submitted this file, or a perceptually similar one"""
+        matches = {}
+        for other_id, (guild_id, _, _) in self._submissions.get(sha256, {}).items():
+            if other_id != user_id:
+                matches[other_id] = (guild_id, 0)
+        if phash is not None:
+            for (other_sha, other_id), distance in self.index.query(phash).items():
+                if other_id != user_id and (other_id not in matches or distance < matches[other_id][1]):
+                    matches[other_id] = (self._submissions[other_sha][other_id][0], distance)
+        return sorted(((other_id, guild_id, distance) for other_id, (guild_id, distance) in matches.items()),
+                      key=lambda match: match[2])
+
+    async def _download(self, url):
+        """Stream a CDN attachment into a temporary file, hashing it on the way. Returns (sha256, size, path)."""
+        if urlparse(url).hostname not in ALLOWED_HOSTS:
+            raise ScreenshotError(f"not a Discord attachment URL: {url}")
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+
+        incoming = os.path.join(self.root, 'incoming')
+        await asyncio.to_thread(os.makedirs, incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async with self._session.get(url) as response:
+                    if response.status != 200:
+                        raise ScreenshotError(f"download failed with HTTP {response.status}")
+                    if not response.content_type.startswith('image/'):
+                        raise ScreenshotError(f"not an image ({response.content_type})")
+                    if (response.content_length or 0) > self.max_bytes:
+                        raise ScreenshotError(f"image is larger than {self.max_bytes} bytes")
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ScreenshotError(f"image is larger than {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return digest.hexdigest(), size, tmp_path
+
+    @staticmethod
+    def _commit_file(tmp_path, path):
+        """Move a download into place; identical content may already be stored"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+    async def ingest(self, url, user_id, guild_id):
+        """Download, store and analyse a screenshot. Raises ScreenshotError if it can't be stored."""
+        try:
+            sha256, size, tmp_path = await self._download(url)
+        except aiohttp.ClientError as e:
+            raise ScreenshotError(f"download failed: {e}") from e
+        object_path = self.object_path(sha256)
+        await asyncio.to_thread(self._commit_file, tmp_path, object_path)
+
+        review_path = None
+        phash = None
+        if HAVE_PILLOW:
+            review_path = self.review_path(sha256)
+            await asyncio.to_thread(os.makedirs, os.path.dirname(review_path), exist_ok=True)
+            try:
+                phash = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, process_image, object_path, review_path, self.max_dimension
+                )
+            except Exception as e:
+                # Not a decodable image; keep the file for the record but show nothing
+                logger.warning(f"Could not process screenshot {sha256[:12]}: {e}")
+                review_path = None
+
+        matches = self.find_matches(sha256, phash, user_id)
+        stored_at = time.time()
+        self._remember(sha256, user_id, guild_id, phash, stored_at)
+        self.db.execute(
+            "INSERT OR REPLACE INTO screenshots (sha256, user_id, guild_id, phash, size, stored_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (sha256, user_id, guild_id, f"{phash:016x}" if phash is not None else None, size, stored_at)
+        )
+        return ScreenshotResult(sha256, size, review_path, phash, matches)
+
+    async def sweep(self):
+        """Delete screenshots older than the retention period. Returns how many were removed."""
+        cutoff = time.time() - self.retention_days * 86400
+        # Expired rows come from the database, not the index, which is loaded after startup
+        await self.db.flush()
+        expired = await self.db.fetchall("SELECT sha256, user_id FROM screenshots WHERE stored_at < ?", (cutoff,))
+        for sha256, user_id in expired:
+            if user_id in self._submissions.get(sha256, ()):
+                self._forget(sha256, user_id)
+        self.db.execute("DELETE FROM screenshots WHERE stored_at < ?", (cutoff,))
+        await self.db.flush()
+
+        # Files are shared by every submission with the same content
+        hashes = sorted({sha256 for sha256, _ in expired} - self._submissions.keys())
+        in_use = set()
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = await self.db.fetchall(
+                f"SELECT DISTINCT sha256 FROM screenshots WHERE sha256 IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            in_use.update(sha256 for sha256, in rows)
+        orphaned = set(hashes) - in_use
+        await asyncio.to_thread(self._delete_files, orphaned)
+        if expired:
+            logger.info(f"Retention sweep removed {len(expired)} screenshot submissions and {len(orphaned)} files")
+        return len(expired)
+
+    def _delete_files(self, hashes):
+        for sha256 in hashes:
+            for path in (self.object_path(sha256), self.review_path(sha256)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    async def run_sweeper(self, interval=3600):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Screenshot retention sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,326 @@
+"""
+Outbound Send Scheduler
+Central queue for REST calls the bot makes on its own initiative: DMs, review posts,
+role grants and review embed edits.
+
+Each route (a DM channel, a guild channel, a guild's role endpoint) has its own token
+bucket, with a global bucket on top, so bursts are paced here instead of stalling inside
+discord.py's 429 handling. Moderator-facing work is served before user DMs, which are
+served before cosmetic acks. Queued acks are merged into the next message to the same
+user, and dropped outright while the queue is under pressure.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from collections import deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_MODERATION = 0
+PRIORITY_USER = 1
+PRIORITY_COSMETIC = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_MODERATION: "moderation",
+    PRIORITY_USER: "user",
+    PRIORITY_COSMETIC: "cosmetic",
+}
+
+# (requests, per seconds) for each route kind
+DEFAULT_ROUTE_LIMITS = {
+    'dm': (5, 5.0),
+    'channel': (5, 5.0),
+    'roles': (10, 10.0),
+    'interaction': (5, 2.0),
+    'members': (5, 5.0),
+}
+
+# Most workers started when the count is derived from the global limit
+MAX_DEFAULT_WORKERS = 64
+
+
+class TokenBucket:
+    """Classic token bucket; refills continuously at `rate` tokens per second"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, capacity, per, now):
+        self.rate = capacity / per
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ('route', 'priority', 'factory', 'destination', 'content', 'kwargs', 'ack',
+                 'future', 'submitted', 'cancelled')
+
+    def __init__(self, route, priority, future, submitted, factory=None, destination=None,
+                 content=None, kwargs=None, ack=False):
+        self.route = route
+        self.priority = priority
+        self.future = future
+        self.submitted = submitted
+        self.factory = factory
+        self.destination = destination
+        self.content = content
+        self.kwargs = kwargs or {}
+        self.ack = ack
+        self.cancelled = False
+
+    async def execute(self):
+        if self.factory is not None:
+            return await self.factory()
+        return await self.destination.send(self.content, **self.kwargs)
+
+
+class SendScheduler:
+    """Rate-limit-aware, prioritised outbound request queue.
+
+    Each worker has one request in flight at a time. By default there is one worker per
+    request the global limit allows each second, so requests that take up to a second
+    still use the whole limit.
+    """
+
+    def __init__(self, workers=None, global_limit=(45, 1.0), route_limits=None, pressure_depth=500,
+                 max_buckets=10000):
+        if workers is None:
+            workers = min(MAX_DEFAULT_WORKERS, math.ceil(global_limit[0] / global_limit[1]))
+        self.worker_count = workers
+        self.global_limit = global_limit
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS, **(route_limits or {}))
+        self.pressure_depth = pressure_depth
+        self.max_buckets = max_buckets
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._pending_acks = {}
+        self._busy_routes = set()
+        self._buckets = {}
+        self._global_bucket = None
+        # Futures of the workers waiting for a job; each push wakes one of them
+        self._idle = deque()
+        self._workers = []
+
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the worker tasks. Must be called from the running event loop."""
+        loop = asyncio.get_running_loop()
+        self._global_bucket = TokenBucket(*self.global_limit, loop.time())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        logger.info(f"Send scheduler started with {self.worker_count} workers")
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def depth(self):
+        return sum(self._depth.values())
+
+    @property
+    def idle(self):
+        """True when nothing is queued or in flight"""
+        return self.depth == 0 and not self._busy_routes
+
+    def send(self, destination, content=None, *, priority=PRIORITY_USER, ack=False, **kwargs):
+        """Queue `destination.send(content, **kwargs)`. Returns a future for the sent message.
+
+        Acks are cosmetic: they are merged into the next message to the same destination
+        if still queued, dropped under pressure, and their failures are only logged. Their
+        future resolves to None when they were merged or dropped.
+        """
+        loop = asyncio.get_running_loop()
+        route = self._route_for(destination)
+
+        if ack:
+            priority = PRIORITY_COSMETIC
+            if self.depth >= self.pressure_depth:
+                self.dropped += 1
+                future = loop.create_future()
+                future.set_result(None)
+                return future
+
+        previous_ack = self._pending_acks.pop(route, None)
+        if previous_ack is not None and not previous_ack.cancelled:
+            # Fold the queued ack into this message rather than sending both
+            self._cancel(previous_ack)
+            self.merged += 1
+            if not ack:
+                content = previous_ack.content if content is None else f"{previous_ack.content}\n\n{content}"
+
+        job = _Job(route, priority, loop.create_future(), loop.time(), destination=destination,
+                   content=content, kwargs=kwargs, ack=ack)
+        if ack:
+            self._pending_acks[route] = job
+        self._push(job)
+        return job.future
+
+    def run(self, route, factory, *, priority=PRIORITY_MODERATION):
+        """Queue an arbitrary REST call. `factory` is a zero-argument callable returning a coroutine."""
+        loop = asyncio.get_running_loop()
+        job = _Job(route, priority, loop.create_future(), loop.time(), factory=factory)
+        self._push(job)
+        return job.future
+
+    def stats(self):
+        """Queue depth per priority, merge/drop counters and recent queue wait times"""
+        waits = sorted(self._waits)
+        return {
+            'depth': self.depth,
+            'depth_by_priority': {PRIORITY_NAMES[p]: n for p, n in self._depth.items()},
+            'busy_routes': len(self._busy_routes),
+            'sent': self.sent,
+            'failed': self.failed,
+            'merged': self.merged,
+            'dropped': self.dropped,
+            'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+            'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0,
+        }
+
+    def _route_for(self, destination):
+        if isinstance(destination, discord.abc.User):
+            return f"dm:{destination.id}"
+        return f"channel:{destination.id}"
+
+    def _bucket(self, route, now):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                # Idle routes have full buckets; forgetting them loses nothing
+                self._buckets = {key: b for key, b in self._buckets.items() if not b.is_full(now)}
+            kind = route.split(':', 1)[0]
+            bucket = TokenBucket(*self.route_limits.get(kind, (5, 5.0)), now)
+            self._buckets[route] = bucket
+        return bucket
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.priority, next(self._counter), job))
+        self._depth[job.priority] += 1
+        self._wake()
+
+    def _wake(self):
+        """Wake one idle worker; waking them all would have every one of them scan the queue"""
+        while self._idle:
+            waiter = self._idle.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _cancel(self, job):
+        job.cancelled = True
+        self._depth[job.priority] -= 1
+        if not job.future.done():
+            job.future.set_result(None)
+
+    async def _next_job(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            wait = None
+
+            global_delay = self._global_bucket.delay(now)
+            if global_delay > 0:
+                wait = global_delay
+            else:
+                skipped = []
+                chosen = None
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    job = entry[2]
+                    if job.cancelled:
+                        continue
+                    if job.route in self._busy_routes:
+                        # One request in flight per route keeps each destination's messages in order
+                        skipped.append(entry)
+                        continue
+                    delay = self._bucket(job.route, now).delay(now)
+                    if delay > 0:
+                        skipped.append(entry)
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    chosen = job
+                    break
+
+                for entry in skipped:
+                    heapq.heappush(self._heap, entry)
+
+                if chosen is not None:
+                    self._global_bucket.take(now)
+                    self._bucket(chosen.route, now).take(now)
+                    self._busy_routes.add(chosen.route)
+                    self._depth[chosen.priority] -= 1
+                    if self._pending_acks.get(chosen.route) is chosen:
+                        del self._pending_acks[chosen.route]
+                    self._waits.append(now - chosen.submitted)
+                    if self._heap:
+                        # Pass the wakeup on while there is work left
+                        self._wake()
+                    return chosen
+
+            waiter = loop.create_future()
+            self._idle.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=wait)
+            except asyncio.TimeoutError:
+                try:
+                    self._idle.remove(waiter)
+                except ValueError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            try:
+                result = await job.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                if job.ack:
+                    logger.debug(f"Dropped failed ack on {job.route}: {e}")
+                    if not job.future.done():
+                        job.future.set_result(None)
+                elif not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                self.sent += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._busy_routes.discard(job.route)
+                # A job held back behind this route may be free to go now
+                self._wake()
@@ -0,0 +1,123 @@
+"""
+Verification Session Store
+Checkpoints each questionnaire answer to SQLite so in-progress verifications survive
+a crash or restart, and keeps an in-memory index of active sessions for O(1) lookups.
+"""
+
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verification_sessions (
+    user_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    answers TEXT NOT NULL,
+    image_url TEXT,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SessionRecord:
+    """Checkpointed state of one user's questionnaire"""
+
+    __slots__ = ('user_id', 'guild_id', 'step', 'answers', 'image_url', 'started_at', 'updated_at')
+
+    def __init__(self, user_id, guild_id, step=0, answers=None, image_url=None, started_at=None, updated_at=None):
+        now = time.time()
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.step = step
+        self.answers = answers if answers is not None else []
+        self.image_url = image_url
+        self.started_at = started_at if started_at is not None else now
+        self.updated_at = updated_at if updated_at is not None else now
+
+
+class SessionStore:
+    """Active verification sessions, indexed in memory and persisted in SQLite"""
+
+    def __init__(self, db):
+        self.db = db
+        self._index = {}
+        db.ensure_schema(SCHEMA)
+
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(list(self._index.values()))
+
+    def get(self, user_id):
+        return self._index.get(user_id)
+
+    def load(self, max_idle_seconds, owns_guild=None):
+        """Load persisted sessions into the index, discarding any idle longer than `max_idle_seconds`.
+
+        In cluster mode `owns_guild` filters out sessions that belong to another process's shards.
+        Blocking; call during startup only. Returns the sessions that should be resumed.
+        """
+        cutoff = time.time() - max_idle_seconds
+        rows = self.db.fetchall_sync(
+            "SELECT user_id, guild_id, step, answers, image_url, started_at, updated_at "
+            "FROM verification_sessions"
+        )
+
+        resumable = []
+        for user_id, guild_id, step, answers, image_url, started_at, updated_at in rows:
+            if owns_guild is not None and not owns_guild(guild_id):
+                continue
+            if updated_at < cutoff:
+                self.db.execute("DELETE FROM verification_sessions WHERE user_id = ?", (user_id,))
+                continue
+            record = SessionRecord(user_id, guild_id, step, json.loads(answers), image_url, started_at, updated_at)
+            self._index[user_id] = record
+            resumable.append(record)
+
+        logger.info(f"Loaded {len(resumable)} resumable sessions")
+        return resumable
+
+    def create(self, user_id, guild_id):
+        """Start a new session, replacing any previous one for the user"""
+        record = SessionRecord(user_id, guild_id)
+        self._index[user_id] = record
+        self._write(record)
+        return record
+
+    def record_answer(self, user_id, answer):
+        """Checkpoint an answer and advance to the next step"""
+        record = self._index[user_id]
+        record.answers.append(answer)
+        record.step += 1
+        record.updated_at = time.time()
+        self._write(record)
+
+    def record_image(self, user_id, image_url):
+        """Checkpoint the screenshot step and advance past it"""
+        record = self._index[user_id]
+        record.image_url = image_url
+        record.step += 1
+        record.updated_at = time.time()
+        self._write(record)
+
+    def finish(self, user_id):
+        """Drop a session that was submitted, cancelled or timed out"""
+        if self._index.pop(user_id, None) is not None:
+            self.db.execute("DELETE FROM verification_sessions WHERE user_id = ?", (user_id,))
+
+    def _write(self, record):
+        self.db.execute(
+            "INSERT OR REPLACE INTO verification_sessions "
+            "(user_id, guild_id, step, answers, image_url, started_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record.user_id, record.guild_id, record.step, json.dumps(record.answers),
+             record.image_url, record.started_at, record.updated_at)
+        )
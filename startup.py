@@ -0,0 +1,103 @@
+"""
+Startup Timeline
+Times each phase of a process start (imports, config, login, setup, gateway ready, first
+interaction) from the moment main.py began executing, and holds back work the bot
+doesn't need for answering interactions (command sync, member cache warm-up, index
+loads) until it is serving.
+
+Deferred work is released by the first interaction or, if none arrives, a few seconds
+after the gateway is ready, and then runs one item at a time in the background. Work
+deferred after that runs straight away.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Phases, in the order they normally complete
+IMPORTS = 'imports'
+CONFIG = 'config'
+LOGIN = 'login'
+SETUP = 'setup'
+READY = 'ready'
+FIRST_INTERACTION = 'first_interaction'
+# Every item deferred before release has finished
+WARM = 'warm'
+
+
+class StartupTimeline:
+    """Phase timings for one process start, plus the work deferred until the bot is serving.
+
+    `on_mark(phase, seconds)` is called as each phase completes.
+    """
+
+    def __init__(self, started, on_mark=None):
+        self.started = started
+        self.on_mark = on_mark
+        # phase -> seconds since start, in the order they were marked
+        self.phases = {}
+        # [(name, factory)] waiting for release
+        self._deferred = []
+        self._released = False
+        self._runner = None
+
+    def mark(self, phase):
+        """Record that a phase has completed. Only the first mark counts; returns whether this was it."""
+        if phase in self.phases:
+            return False
+        elapsed = time.monotonic() - self.started
+        previous = max(self.phases.values(), default=0.0)
+        self.phases[phase] = elapsed
+        logger.info(f"Startup: {phase} after {elapsed:.2f}s (+{elapsed - previous:.2f}s)")
+        if self.on_mark is not None:
+            self.on_mark(phase, elapsed)
+        return True
+
+    def elapsed(self, phase):
+        """Seconds from start to a phase, or None if it hasn't completed"""
+        return self.phases.get(phase)
+
+    @property
+    def pending(self):
+        return len(self._deferred)
+
+    def defer(self, name, factory):
+        """Run `factory()`, a zero-argument callable returning a coroutine, once the bot is serving"""
+        self._deferred.append((name, factory))
+        if self._released and (self._runner is None or self._runner.done()):
+            self._runner = asyncio.create_task(self._run_deferred())
+
+    def release(self):
+        """Start the deferred work; later calls do nothing"""
+        if self._released:
+            return
+        self._released = True
+        self._runner = asyncio.create_task(self._run_deferred())
+
+    async def release_after(self, delay):
+        await asyncio.sleep(delay)
+        self.release()
+
+    async def _run_deferred(self):
+        while self._deferred:
+            name, factory = self._deferred.pop(0)
+            started = time.monotonic()
+            try:
+                await factory()
+            except Exception as e:
+                logger.error(f"Deferred startup work '{name}' failed: {e}")
+                continue
+            logger.info(f"Deferred startup work '{name}' done in {time.monotonic() - started:.2f}s")
+        self.mark(WARM)
+
+    def describe(self):
+        lines = []
+        previous = 0.0
+        for phase, elapsed in self.phases.items():
+            lines.append(f"{phase}: {elapsed:.2f}s (+{elapsed - previous:.2f}s)")
+            previous = elapsed
+        if self._deferred:
+            lines.append(f"{len(self._deferred)} deferred item(s) waiting")
+        return "\n".join(lines)
@@ -0,0 +1,136 @@
+"""
+SQLite Storage
+Shared local database for bot state. Runs in WAL mode so reads never block on the
+writer, and batches writes on a background thread so the event loop never waits on disk.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Database:
+    """SQLite database with a batched background writer"""
+
+    def __init__(self, path, batch_size=200, flush_interval=0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._writes = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._reader = None
+        self._writer = None
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """Open the database and start the writer thread"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._writer = self._connect()
+        self._reader = self._connect()
+        self._thread = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Database opened at {self.path}")
+
+    def ensure_schema(self, script):
+        """Create tables and indexes. Blocking; call during startup only."""
+        with self._read_lock:
+            self._reader.executescript(script)
+
+    def execute(self, sql, params=()):
+        """Queue a write. Returns immediately; the write lands with the next batch."""
+        self._writes.put((sql, params, None))
+
+    async def flush(self):
+        """Wait until every write queued so far has been committed"""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self._writes.put((None, None, (loop, done)))
+        await done
+
+    def fetchall_sync(self, sql, params=()):
+        """Run a read query on the calling thread"""
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    async def fetchall(self, sql, params=()):
+        """Run a read query off the event loop"""
+        return await asyncio.to_thread(self.fetchall_sync, sql, params)
+
+    def close(self):
+        """Commit outstanding writes and close the database"""
+        if self._thread is None:
+            return
+        self._writes.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        self._writer.close()
+        self._reader.close()
+        logger.info("Database closed")
+
+    def _write_loop(self):
+        while True:
+            item = self._writes.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+
+            while item is not _STOP and len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+            if batch[-1] is _STOP:
+                return
+
+    def _commit(self, batch):
+        writes = []
+        waiters = []
+        for item in batch:
+            if item is _STOP:
+                continue
+            sql, params, waiter = item
+            if waiter is not None:
+                waiters.append(waiter)
+            else:
+                writes.append((sql, params))
+
+        try:
+            with self._writer:
+                for sql, params in writes:
+                    self._writer.execute(sql, params)
+        except sqlite3.Error as e:
+            # One bad statement shouldn't cost the rest of the batch
+            logger.error(f"Database write batch of {len(writes)} failed, retrying individually: {e}")
+            for sql, params in writes:
+                try:
+                    with self._writer:
+                        self._writer.execute(sql, params)
+                except sqlite3.Error as e:
+                    logger.error(f"Database write failed: {e} ({sql})")
+
+        for loop, done in waiters:
+            loop.call_soon_threadsafe(_resolve, done)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,25 @@
+from admission import ADMITTED, DEDUPLICATED, AdmissionController
+
+GUILD_ID = 1
+
+
+class User:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def test_release_with_a_hold_leaves_a_newer_admission_alone():
+    admission = AdmissionController(lambda user, guild_id: None)
+    first = admission.admit(User(100), GUILD_ID)
+    assert first.outcome == ADMITTED
+    admission.release(100)
+    second = admission.admit(User(100), GUILD_ID)
+
+    admission.release(100, first.hold)
+
+    assert 100 in admission
+    assert admission.active_count(GUILD_ID) == 1
+    assert admission.admit(User(100), GUILD_ID).outcome == DEDUPLICATED
+    admission.release(100, second.hold)
+    assert 100 not in admission
+    assert admission.active_count(GUILD_ID) == 0
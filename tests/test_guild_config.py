@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from guild_config import GuildConfig
+
+BASE = {'min_account_age_days': 7, 'review_channel_id': '111111111111111111', 'verified_role_id': '222222222222222222'}
+
+
+def load(tmp_path, **values):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({**BASE, **values}))
+    config = GuildConfig(str(path))
+    config.load()
+    return config
+
+
+def test_settings_outside_a_guild_are_the_defaults(tmp_path):
+    settings = load(tmp_path, min_account_age_days=14).for_guild(None)
+
+    assert settings.guild_id is None
+    assert settings.min_account_age_days == 14
+    assert settings.review_channel is None
+
+
+def test_unknown_verification_flow_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="verification_flow"):
+        load(tmp_path, verification_flow='modl')
+    with pytest.raises(ValueError, match="verification_flow"):
+        load(tmp_path, guilds={'333333333333333333': {'verification_flow': 'DM'}})
+    assert load(tmp_path, verification_flow='modal').for_guild(None).verification_flow == 'modal'
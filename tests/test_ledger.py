@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import pytest
+
+from ledger import APPROVED, SOURCE_REVIEW, DecisionLedger
+from storage import Database
+
+GUILD_ID = 1
+TRUSTED_ID = 2
+USER_ID = 100
+DAY = 86400
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    db = Database(str(tmp_path / 'ledger.db'))
+    db.start()
+    yield DecisionLedger(db)
+    db.close()
+
+
+def standing(ledger, *args, **kwargs):
+    async def run():
+        await ledger.db.flush()
+        return await ledger.standing(USER_ID, *args, **kwargs)
+    return asyncio.run(run())
+
+
+def test_expired_approval_is_not_standing(ledger):
+    ledger.record(USER_ID, GUILD_ID, APPROVED, source=SOURCE_REVIEW, decided_at=time.time() - 40 * DAY)
+
+    assert standing(ledger, GUILD_ID) is not None
+    assert standing(ledger, GUILD_ID, valid_days=30) is None
+    assert standing(ledger, GUILD_ID, valid_days=60) is not None
+
+
+def test_expired_trusted_approval_is_not_standing(ledger):
+    ledger.record(USER_ID, TRUSTED_ID, APPROVED, decided_at=time.time() - 40 * DAY)
+
+    assert standing(ledger, GUILD_ID, {TRUSTED_ID}) is not None
+    assert standing(ledger, GUILD_ID, {TRUSTED_ID}, valid_days=30) is None
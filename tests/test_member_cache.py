@@ -0,0 +1,47 @@
+import discord
+
+from member_cache import MemberCache
+
+GUILD_ID = 1
+
+
+class Member(discord.Member):
+    """Just enough of a member for the cache"""
+
+    def __init__(self, user_id):
+        self._user = discord.Object(user_id)
+        self.guild = discord.Object(GUILD_ID)
+
+    @property
+    def id(self):
+        return self._user.id
+
+
+class State:
+    def __init__(self):
+        self.parsed = []
+        self.parsers = {
+            'GUILD_MEMBER_UPDATE': self.parsed.append,
+            'GUILD_MEMBER_REMOVE': self.parsed.append,
+        }
+
+
+def event(user_id):
+    return {'guild_id': str(GUILD_ID), 'user': {'id': str(user_id)}}
+
+
+def test_member_events_evict_cached_members():
+    cache = MemberCache()
+    state = State()
+    cache.install(state)
+    for user_id in (100, 101, 102):
+        cache.put(Member(user_id))
+
+    state.parsers['GUILD_MEMBER_UPDATE'](event(100))
+    state.parsers['GUILD_MEMBER_REMOVE'](event(101))
+
+    assert cache.get(GUILD_ID, 100) is None
+    assert cache.get(GUILD_ID, 101) is None
+    assert cache.get(GUILD_ID, 102) is not None
+    # discord.py still parses the events
+    assert len(state.parsed) == 2
@@ -0,0 +1,53 @@
+import time
+
+from raid_detector import CLICKS, CLUSTER, RaidDetector
+
+GUILD_ID = 1
+CREATED_AT = 1_600_000_000
+
+
+def detector(**kwargs):
+    transitions = []
+    return RaidDetector(transitions.append, **kwargs), transitions
+
+
+def test_repeat_clicks_from_one_account_count_once():
+    raid, transitions = detector()
+    start = time.time() - 50
+    for second in range(15):
+        raid.record_click(GUILD_ID, 100, CREATED_AT, now=start + second * 3)
+
+    status = raid.status(GUILD_ID)
+    assert not status.locked
+    assert transitions == []
+    assert status.signals[CLICKS] == 1
+    assert status.signals[CLUSTER] == 1
+
+
+def test_join_then_click_counts_each_account_once():
+    raid, transitions = detector()
+    for user_id in range(8):
+        raid.record_join(GUILD_ID, user_id, CREATED_AT + user_id, now=1000 + user_id)
+        raid.record_click(GUILD_ID, user_id, CREATED_AT + user_id, now=1000.5 + user_id)
+
+    assert not raid.is_locked(GUILD_ID)
+    assert transitions == []
+    assert raid._largest_cluster(raid._activity(GUILD_ID), 1010) == 8
+
+
+def test_distinct_accounts_still_trip_the_cluster_signal():
+    raid, transitions = detector()
+    for user_id in range(15):
+        raid.record_click(GUILD_ID, user_id, CREATED_AT + user_id, now=1000 + user_id)
+
+    assert raid.is_locked(GUILD_ID)
+    assert "15 cluster" in transitions[-1].reason
+
+
+def test_an_account_counts_again_once_its_click_leaves_the_window():
+    raid, _ = detector(window=60)
+    raid.record_click(GUILD_ID, 100, CREATED_AT, now=1000)
+    raid.record_click(GUILD_ID, 100, CREATED_AT, now=1100)
+
+    assert raid._activity(GUILD_ID).clicks.total(1100) == 1
+    assert len(raid._activity(GUILD_ID).clickers) == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from ledger import REJECTED, DecisionLedger
+from reconcile import RoleReconciler
+from storage import Database
+
+GUILD_ID = 1
+ROLE_ID = 10
+
+
+def member(user_id, *roles):
+    return {'user': {'id': str(user_id)}, 'roles': [str(role) for role in roles]}
+
+
+class Guild:
+    """A guild's member list and the roles taken away from it"""
+
+    def __init__(self, members):
+        self.members = members
+        self.removed = []
+
+    async def fetch_page(self, guild_id, limit, after):
+        start = 0 if after is None else next(i for i, data in enumerate(self.members) if data['user']['id'] == after) + 1
+        return self.members[start:start + limit]
+
+    async def remove_role(self, guild_id, user_id, role_id):
+        self.removed.append(user_id)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    db = Database(str(tmp_path / 'ledger.db'))
+    db.start()
+    yield DecisionLedger(db)
+    db.close()
+
+
+def reconcile(ledger, guild):
+    async def run():
+        await ledger.db.flush()
+        reconciler = RoleReconciler(ledger, guild.fetch_page, guild.remove_role, lambda *args: False)
+        report = await reconciler.run(GUILD_ID, ROLE_ID, remove=True)
+        await ledger.db.flush()
+        return report
+    return asyncio.run(run())
+
+
+def test_first_run_on_an_empty_ledger_removes_nobody(ledger):
+    guild = Guild([member(user_id, ROLE_ID) for user_id in range(100, 110)] + [member(200)])
+
+    report = reconcile(ledger, guild)
+
+    assert guild.removed == []
+    assert report.unentitled == []
+    assert report.backfilled == 10
+    # The backfilled holders are approved from now on
+    assert reconcile(ledger, guild).unentitled == []
+    assert guild.removed == []
+
+
+def test_later_runs_remove_holders_without_an_approval(ledger):
+    guild = Guild([member(100, ROLE_ID), member(101, ROLE_ID)])
+    ledger.record(101, GUILD_ID, REJECTED)
+    report = reconcile(ledger, guild)
+    assert report.backfilled == 1
+    assert guild.removed == [101]
+
+    guild.members.append(member(102, ROLE_ID))
+    report = reconcile(ledger, guild)
+
+    assert report.backfilled == 0
+    assert report.unentitled == [101, 102]
+    assert guild.removed == [101, 101, 102]
@@ -0,0 +1,37 @@
+import asyncio
+
+from send_scheduler import MAX_DEFAULT_WORKERS, SendScheduler
+
+
+def test_worker_count_follows_the_global_limit():
+    assert SendScheduler().worker_count == 45
+    assert SendScheduler(global_limit=(10, 2.0)).worker_count == 5
+    assert SendScheduler(global_limit=(1000, 1.0)).worker_count == MAX_DEFAULT_WORKERS
+    assert SendScheduler(workers=3).worker_count == 3
+
+
+def test_queued_calls_run_concurrently_up_to_the_worker_count():
+    async def run():
+        scheduler = SendScheduler(workers=8, global_limit=(1000, 1.0))
+        scheduler.start()
+        running = 0
+        peak = 0
+
+        async def call(n):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return n
+
+        try:
+            futures = [scheduler.run(f'route-{n}', lambda n=n: call(n)) for n in range(20)]
+            results = await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        finally:
+            await scheduler.close()
+        return results, peak
+
+    results, peak = asyncio.run(run())
+    assert results == list(range(20))
+    assert peak == 8
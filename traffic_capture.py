@@ -0,0 +1,227 @@
+"""
+Traffic Capture
+Opt-in recording of the gateway events the bot receives, so a production event mix can
+be replayed offline (bench/replay_bench.py). Every dispatch discord.py parses is
+recorded, INTERACTION_CREATE included, with its time since the capture started.
+
+Events are written as gzipped newline-delimited JSON. The event loop only serialises the
+payload; anonymising, compressing and writing happen on a background thread. A capture
+stops by itself once it reaches its size limit.
+
+Anonymisation is consistent within a capture: every snowflake ID is replaced through a
+keyed hash, so the same user, guild or message gets the same stand-in ID everywhere,
+including inside custom IDs and URLs. Stand-in IDs keep the original's creation day,
+so account ages still come out right. Names, message text, answers and secrets are
+replaced as well. The key is random and never stored, so a capture can't be mapped back.
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+
+from discord import utils
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_VERSION = 1
+
+_STOP = object()
+
+SNOWFLAKE = re.compile(r'\d{17,20}')
+# Questionnaire answers short enough to keep: ages, yes/no, skip
+SHORT_ANSWER = re.compile(r'\d{1,3}|yes|no|y|n|skip|s', re.IGNORECASE)
+DAY_MS = 86_400_000
+
+# Replaced with a placeholder
+SECRET_KEYS = frozenset(('token', 'session_id', 'resume_gateway_url'))
+# Dropped
+PRIVATE_KEYS = frozenset(('email', 'phone', 'bio'))
+# Set to null; discord.py expects these keys to be present
+IMAGE_KEYS = frozenset(('avatar', 'banner', 'avatar_decoration_data'))
+# Personal names, replaced with a stand-in derived from the hash
+NAME_KEYS = frozenset(('username', 'global_name', 'nick'))
+# Free text, blanked out except for short questionnaire answers
+TEXT_KEYS = frozenset(('content', 'value', 'description', 'text'))
+
+
+class Anonymizer:
+    """Consistent, keyed replacement of IDs, names and text in gateway payloads"""
+
+    def __init__(self, key=None, max_cached=100_000):
+        self.key = key or secrets.token_bytes(32)
+        self.max_cached = max_cached
+        self._ids = {}
+
+    def _digest(self, value):
+        return int.from_bytes(hmac.new(self.key, value.encode(), hashlib.sha256).digest()[:8], 'big')
+
+    def snowflake(self, value):
+        """Stand-in for a snowflake ID (as a string) with the same creation day"""
+        replaced = self._ids.get(value)
+        if replaced is None:
+            noise = self._digest(value)
+            day = (int(value) >> 22) // DAY_MS * DAY_MS
+            replaced = str(((day + noise % DAY_MS) << 22) | (noise >> 42))
+            if len(self._ids) >= self.max_cached:
+                self._ids.clear()
+            self._ids[value] = replaced
+        return replaced
+
+    def ids(self, text):
+        return SNOWFLAKE.sub(lambda match: self.snowflake(match.group()), text)
+
+    def text(self, text):
+        if SNOWFLAKE.fullmatch(text):
+            # Slash command options carry users and channels as bare IDs
+            return self.snowflake(text)
+        if SHORT_ANSWER.fullmatch(text.strip()):
+            return text
+        return 'x' * len(text)
+
+    def url(self, url):
+        """Anonymise the IDs in an attachment URL and drop its file name and signature"""
+        base, _, name = url.split('?', 1)[0].rpartition('/')
+        return f"{self.ids(base)}/file{os.path.splitext(name)[1]}"
+
+    def anonymize(self, value, key=None, parent=None):
+        if key in IMAGE_KEYS:
+            return None
+        if isinstance(value, dict):
+            return {
+                self.snowflake(k) if SNOWFLAKE.fullmatch(k) else k: self.anonymize(v, k, key)
+                for k, v in value.items() if k not in PRIVATE_KEYS
+            }
+        if isinstance(value, list):
+            return [self.anonymize(item, key, parent) for item in value]
+        if isinstance(value, int) and value >= 10 ** 16:
+            # Config files may give IDs as numbers
+            return int(self.snowflake(str(value)))
+        if not isinstance(value, str):
+            return value
+        if key in SECRET_KEYS:
+            return 'redacted'
+        if key in NAME_KEYS or (key == 'name' and parent == 'author'):
+            return f"user{self._digest(value) % 10 ** 8}"
+        if key in TEXT_KEYS:
+            return self.text(value)
+        if key == 'filename':
+            return f"file{os.path.splitext(value)[1]}"
+        if key in ('url', 'proxy_url') and '/attachments/' in value:
+            return self.url(value)
+        return self.ids(value)
+
+
+class TrafficRecorder:
+    """Records the gateway events discord.py parses to a gzipped, anonymised NDJSON file.
+
+    The first line is a header with the capture version, start time and the bot's
+    configuration (anonymised, without file paths); every other line is
+    {"t": seconds since start, "e": event name, "d": payload}.
+    """
+
+    def __init__(self, path, config=None, events=None, max_bytes=512 * 1024 * 1024, key=None):
+        self.path = path
+        self.config = config or {}
+        # Event names to record; None records all
+        self.events = frozenset(events) if events else None
+        self.max_bytes = max_bytes
+        self.anonymizer = Anonymizer(key)
+        self.recorded = 0
+        self.written = 0
+        self.started = time.monotonic()
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._thread = None
+
+    def install(self, state):
+        """Wrap the connection state's event parsers; call before connecting"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+        # The gateway looks parsers up in this dict for every dispatch
+        for event, parser in list(state.parsers.items()):
+            if self.events is None or event in self.events:
+                state.parsers[event] = self._recording(event, parser)
+        logger.info(f"Capturing gateway traffic to {self.path}")
+
+    def _recording(self, event, parser):
+        def parse(data):
+            self.record(event, data)
+            return parser(data)
+        return parse
+
+    def record(self, event, data):
+        if self._stopped:
+            return
+        # Serialise now: parsers may modify the payload after this returns
+        self._queue.put((time.monotonic() - self.started, event, utils._to_json(data)))
+        self.recorded += 1
+
+    def header(self):
+        config = {key: value for key, value in self.config.items() if not key.endswith(('_path', '_dir'))}
+        return {
+            'capture': CAPTURE_VERSION,
+            'started_at': time.time(),
+            'config': self.anonymizer.anonymize(config),
+        }
+
+    def _write_loop(self):
+        try:
+            with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+                f.write(json.dumps(self.header(), separators=(',', ':')) + '\n')
+                while True:
+                    item = self._queue.get()
+                    if item is _STOP:
+                        break
+                    elapsed, event, raw = item
+                    line = json.dumps(
+                        {'t': round(elapsed, 4), 'e': event, 'd': self.anonymizer.anonymize(json.loads(raw))},
+                        separators=(',', ':'), ensure_ascii=False
+                    )
+                    f.write(line + '\n')
+                    self.written += len(line) + 1
+                    if self.written >= self.max_bytes and not self._stopped:
+                        self._stopped = True
+                        logger.warning(f"Traffic capture {self.path} reached {self.max_bytes // 2 ** 20} MiB; stopped recording")
+        except Exception as e:
+            self._stopped = True
+            logger.error(f"Traffic capture {self.path} failed: {e}")
+
+    def close(self):
+        """Write out queued events and close the file"""
+        self._stopped = True
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"Traffic capture {self.path} closed after {self.recorded} events")
+
+
+def read_capture(path):
+    """Header and an iterator of (seconds, event, payload) from a capture file"""
+    f = gzip.open(path, 'rt', encoding='utf-8')
+    header = json.loads(f.readline())
+    if header.get('capture') != CAPTURE_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a version {CAPTURE_VERSION} traffic capture")
+
+    def events():
+        with f:
+            for line in f:
+                record = json.loads(line)
+                yield record['t'], record['e'], record['d']
+
+    return header, events()